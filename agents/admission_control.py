@@ -0,0 +1,293 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import math
+import time
+import asyncio
+import collections
+import logging
+import threading
+from functools import wraps
+from flask import request, jsonify
+
+
+logger = logging.getLogger(__name__)
+
+# Per-client rate limit: pipelines per minute, and how many can be started in a burst
+RATE_PER_MINUTE = float(os.getenv('ADMISSION_RATE_PER_MINUTE', 2))
+BURST = int(os.getenv('ADMISSION_BURST', 3))
+# Global cap on pipelines running at the same time, and on requests waiting for a slot
+MAX_ACTIVE = int(os.getenv('ADMISSION_MAX_ACTIVE', 4))
+MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 16))
+# Longest time (seconds) a request may wait for a slot before being rejected
+QUEUE_DEADLINE = float(os.getenv('ADMISSION_QUEUE_DEADLINE', 60))
+# Initial guess of a pipeline duration (seconds), refined from observed runs
+INITIAL_PIPELINE_SECONDS = float(os.getenv('ADMISSION_INITIAL_PIPELINE_SECONDS', 90))
+# Trust the first X-Forwarded-For address (only behind a reverse proxy)
+TRUST_PROXY = os.getenv('ADMISSION_TRUST_PROXY', '0') == '1'
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be served in time; carries the suggested retry delay.
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, at most `capacity` stored.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now=None):
+        """
+        Take one token.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class AdmissionController:
+    """
+    Admission control in front of the LLM pipelines.
+
+    - Each client has a token bucket limiting how often it can start a pipeline.
+    - At most `max_active` pipelines run at once; others wait in a bounded queue.
+    - A request whose estimated wait exceeds the deadline is rejected right away,
+      instead of tying up a worker until it times out.
+    """
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=BURST, max_active=MAX_ACTIVE,
+                 max_queue=MAX_QUEUE, deadline=QUEUE_DEADLINE):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.deadline = deadline
+
+        self.active = 0
+        self.waiting = 0
+        self.avg_duration = INITIAL_PIPELINE_SECONDS
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+
+    def estimated_wait(self, position=None):
+        """
+        Estimated seconds before a request at the given queue position gets a slot.
+        """
+        with self._lock:
+            return self._estimated_wait(self.waiting if position is None else position)
+
+    def _estimated_wait(self, position):
+        if self.active < self.max_active and position == 0:
+            return 0.0
+        # Slots free up roughly every avg_duration / max_active seconds
+        return (position + 1) * self.avg_duration / self.max_active
+
+    def _bucket(self, client_id, now):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            # Drop buckets of idle clients (full again) so the table stays small
+            if len(self._buckets) > 10000:
+                self._buckets = {k: b for k, b in self._buckets.items()
+                                 if (now - b.updated) * self.rate + b.tokens < b.capacity}
+            bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def acquire(self, client_id):
+        """
+        Admit a request, waiting in the queue if all slots are busy.
+
+        Raises:
+            AdmissionRejected: If the client is over its rate limit, the queue is full,
+                or the request cannot get a slot before the deadline.
+        """
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(client_id, now)
+            retry_after = bucket.take(now)
+            if retry_after > 0:
+                raise AdmissionRejected("Rate limit exceeded.", retry_after)
+
+            if self.active < self.max_active and self.waiting == 0:
+                self.active += 1
+                return
+
+            estimate = self._estimated_wait(self.waiting)
+            if self.waiting >= self.max_queue or estimate > self.deadline:
+                bucket.give_back()
+                raise AdmissionRejected("Server busy.", estimate)
+
+            logger.info(f"Queueing request from {client_id}, estimated wait {estimate:.0f}s.")
+            self.waiting += 1
+            try:
+                deadline = now + self.deadline
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        bucket.give_back()
+                        raise AdmissionRejected("Server busy.", self._estimated_wait(self.waiting - 1))
+                    self._slot_freed.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, duration):
+        """
+        Free a slot and update the running estimate of pipeline duration.
+        """
+        with self._lock:
+            self.active -= 1
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+            self._slot_freed.notify()
+
+    @staticmethod
+    def client_id():
+        """
+        Identify the client of the current Flask request.
+        """
+        if TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+            return request.headers['X-Forwarded-For'].split(',')[0].strip()
+        return request.remote_addr or 'unknown'
+
+    def limit(self, view):
+        """
+        Decorator applying admission control to the POST requests of a Flask view.
+        Rejected requests get a 429 response with a Retry-After header.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'POST':
+                return view(*args, **kwargs)
+
+            try:
+                self.acquire(self.client_id())
+            except AdmissionRejected as e:
+                retry_after = max(1, math.ceil(e.retry_after)) if math.isfinite(e.retry_after) else 3600
+                response = jsonify({"error": e.reason, "retry_after": retry_after})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.release(time.monotonic() - started)
+        return wrapper
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    AdmissionController for an asyncio server (asgi.py).
+
+    Same rate limits, slots, queue and deadline, but queued requests wait on a
+    future in the event loop instead of holding a thread, and a freed slot is
+    handed to the first request still waiting. A request cancelled while queued
+    (e.g. the client disconnected) leaves the queue, passing on a slot it was
+    just handed. `acquire` and `release` must be awaited from the event loop.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._queue = collections.deque()
+
+    async def acquire(self, client_id):
+        """
+        Admit a request, waiting in the queue if all slots are busy.
+
+        Raises:
+            AdmissionRejected: If the client is over its rate limit, the queue is full,
+                or the request cannot get a slot before the deadline.
+        """
+        now = time.monotonic()
+        bucket = self._bucket(client_id, now)
+        retry_after = bucket.take(now)
+        if retry_after > 0:
+            raise AdmissionRejected("Rate limit exceeded.", retry_after)
+
+        if self.active < self.max_active and self.waiting == 0:
+            self.active += 1
+            return
+
+        estimate = self._estimated_wait(self.waiting)
+        if self.waiting >= self.max_queue or estimate > self.deadline:
+            bucket.give_back()
+            raise AdmissionRejected("Server busy.", estimate)
+
+        logger.info(f"Queueing request from {client_id}, estimated wait {estimate:.0f}s.")
+        slot = asyncio.get_running_loop().create_future()
+        self._queue.append(slot)
+        self.waiting += 1
+        try:
+            # Resolved by _hand_over, which counts the slot as taken
+            await asyncio.wait_for(slot, self.deadline)
+        except BaseException as e:
+            if not slot.done():
+                slot.cancel()
+            if slot.cancelled():
+                if slot in self._queue:
+                    self._queue.remove(slot)
+            else:
+                # Handed a slot, but timed out or cancelled before using it
+                await self.release(None)
+            if isinstance(e, asyncio.TimeoutError):
+                bucket.give_back()
+                raise AdmissionRejected("Server busy.", self._estimated_wait(self.waiting - 1)) from None
+            raise
+        finally:
+            self.waiting -= 1
+
+    def _hand_over(self):
+        while self._queue and self.active < self.max_active:
+            slot = self._queue.popleft()
+            if not slot.done():
+                self.active += 1
+                slot.set_result(None)
+
+    async def release(self, duration):
+        """
+        Free a slot (to the next request waiting) and update the running estimate
+        of pipeline duration (`duration` None leaves it unchanged). Never suspends,
+        so it completes even in a cancelled task.
+        """
+        self.active -= 1
+        if duration is not None:
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+        self._hand_over()
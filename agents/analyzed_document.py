@@ -0,0 +1,249 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import re
+import math
+from functools import lru_cache
+import numpy as np
+import textstat
+
+
+# Tokenization rules of textstat, so readability scores stay identical to textstat's
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s")
+_SENTENCE_RE = re.compile(r"\b[^.!?]+[.!?]*", re.UNICODE)
+_DIFFICULT_WORD_RE = re.compile(r"[\w\='‘’]+")
+
+# Syllable threshold of difficult words for the Gunning Fog index (textstat's English setting)
+FOG_SYLLABLE_THRESHOLD = 3
+
+
+@lru_cache(maxsize=65536)
+def _syllables(word):
+    """
+    Syllables of a single word, as counted by textstat (pyphen hyphenation).
+    """
+    return textstat.syllable_count(word)
+
+
+@lru_cache(maxsize=65536)
+def _is_difficult(word, syllable_threshold):
+    return textstat.is_difficult_word(word, syllable_threshold)
+
+
+def _round(number, points=0):
+    # textstat's rounding (half away from zero)
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+
+def _lexicon_count(text):
+    return len(_PUNCT_RE.sub('', text).split())
+
+
+def _sentence_count(text):
+    sentences = _SENTENCE_RE.findall(text)
+    ignored = sum(1 for sentence in sentences if _lexicon_count(sentence) <= 2)
+    return max(1, len(sentences) - ignored)
+
+
+class AnalyzedDocument:
+    """
+    A text parsed once and shared by every feedback analyzer.
+
+    Holds, in compact array form:
+    - textstat-compatible word counts, per-word syllable counts and sentence counts
+      (readability formulas are computed from them, no re-tokenization);
+    - the spaCy tokens of the text as hash ids (lowercase form, lemma, POS) with
+      their character offsets, and the sentence boundaries as token indices.
+      Lemma and POS ids are 0 when the pipeline has no lemmatizer / tagger
+      (see agents.nlp_profiles).
+    """
+
+    __slots__ = (
+        'text', 'syllables', 'word_count', 'sentence_count', 'char_count',
+        'letter_count', 'difficult_words', 'fog_difficult_words', 'linsear_easy',
+        'linsear_difficult', 'linsear_sentences', 'vocab', 'lower', 'lemma', 'pos',
+        'idx', 'sent_starts', 'sent_ends'
+    )
+
+    @classmethod
+    def build(cls, text, nlp=None, parsed=None):
+        """
+        Analyze a text.
+
+        Args:
+            text (str): The resume or cover letter.
+            nlp (spacy.Language): Optional spaCy pipeline for tokens, sentences, lemmas and POS tags.
+            parsed (spacy.tokens.Doc): The text already parsed by `nlp` (e.g. by nlp.pipe over a batch).
+
+        Returns:
+            AnalyzedDocument: The analyzed document.
+        """
+        doc = cls()
+        doc.text = text
+
+        # Words as textstat sees them (punctuation removed, whitespace split)
+        words = _PUNCT_RE.sub('', text.lower()).split()
+        doc.syllables = np.fromiter((_syllables(word) for word in words), dtype=np.uint8, count=len(words))
+        doc.word_count = len(words)
+        doc.sentence_count = _sentence_count(text)
+        no_space = _SPACE_RE.sub('', text)
+        doc.char_count = len(no_space)
+        doc.letter_count = len(_PUNCT_RE.sub('', no_space))
+
+        # Difficult words: unique words outside the Dale-Chall easy list
+        unique_words = set(_DIFFICULT_WORD_RE.findall(text.lower()))
+        doc.difficult_words = sum(1 for word in unique_words if _is_difficult(word, 0))
+        doc.fog_difficult_words = sum(1 for word in unique_words if _is_difficult(word, FOG_SYLLABLE_THRESHOLD))
+
+        # Linsear Write only looks at the first 100 raw words
+        first_words = text.split()[:100]
+        first_syllables = [_syllables(word) for word in first_words]
+        doc.linsear_easy = sum(1 for count in first_syllables if count < 3)
+        doc.linsear_difficult = len(first_syllables) - doc.linsear_easy
+        doc.linsear_sentences = _sentence_count(' '.join(first_words))
+
+        doc.vocab = None
+        doc.lower = doc.lemma = doc.pos = doc.idx = None
+        doc.sent_starts = doc.sent_ends = None
+        if nlp is not None or parsed is not None:
+            doc._add_spacy_annotations(nlp, parsed)
+        return doc
+
+    def _add_spacy_annotations(self, nlp, parsed=None):
+        from spacy.attrs import LOWER, LEMMA, POS, IDX, SENT_START
+
+        if parsed is None:
+            parsed = nlp(self.text)
+        annotations = parsed.to_array([LOWER, LEMMA, POS, IDX, SENT_START])
+        self.vocab = parsed.vocab
+        self.lower = annotations[:, 0].copy()
+        self.lemma = annotations[:, 1].copy()
+        self.pos = annotations[:, 2].copy()
+        self.idx = annotations[:, 3].astype(np.uint32)
+
+        n_tokens = len(parsed)
+        # SENT_START is 1 on the first token of a sentence (stored as uint64, -1 wraps around)
+        starts = np.flatnonzero(annotations[:, 4] == 1).astype(np.uint32)
+        if n_tokens and (len(starts) == 0 or starts[0] != 0):
+            starts = np.concatenate([np.zeros(1, dtype=np.uint32), starts])
+        self.sent_starts = starts
+        self.sent_ends = np.append(starts[1:], np.uint32(n_tokens)).astype(np.uint32)
+
+    def sentences(self):
+        """
+        Yield the lowercase tokens of each sentence.
+        """
+        if self.lower is None:
+            raise ValueError("The document was analyzed without a spaCy pipeline.")
+        strings = self.vocab.strings
+        for start, end in zip(self.sent_starts, self.sent_ends):
+            yield [strings[int(token)] for token in self.lower[start:end]]
+
+    def sentence_texts(self):
+        """
+        Yield the text of each sentence.
+        """
+        if self.idx is None:
+            raise ValueError("The document was analyzed without a spaCy pipeline.")
+        for start, end in zip(self.sent_starts, self.sent_ends):
+            text_end = int(self.idx[end]) if end < len(self.idx) else len(self.text)
+            yield self.text[int(self.idx[start]):text_end].strip()
+
+    def readability(self):
+        """
+        Readability scores, identical to the corresponding textstat functions.
+
+        Returns:
+            dict: Flesch reading ease, Flesch-Kincaid grade, Gunning Fog, SMOG,
+                  ARI, Coleman-Liau, Linsear Write and Dale-Chall scores.
+        """
+        words = self.word_count
+        sentences = self.sentence_count
+        syllables = int(self.syllables.sum())
+        polysyllables = int(np.count_nonzero(self.syllables >= 3))
+
+        if words:
+            asl = _round(words / sentences, 1)
+            asw = _round(syllables / words, 1)
+            letters = _round(_round(self.letter_count / words, 2) * 100, 2)
+            sentences_per_100 = _round(_round(sentences / words, 2) * 100, 2)
+            ari = _round(4.71 * _round(self.char_count / words, 2) + 0.5 * _round(words / sentences, 2) - 21.43, 1)
+            per_difficult = 100 - (words - self.difficult_words) / words * 100
+            dale_chall = 0.1579 * per_difficult + 0.0496 * asl
+            if per_difficult > 5:
+                dale_chall += 3.6365
+            dale_chall = _round(dale_chall, 2)
+            gunning_fog = _round(0.4 * (asl + self.fog_difficult_words / words * 100), 2)
+        else:
+            asl = asw = letters = sentences_per_100 = 0.0
+            ari = dale_chall = gunning_fog = 0.0
+
+        smog = _round(1.043 * (30 * (polysyllables / sentences)) ** .5 + 3.1291, 1) if sentences >= 3 else 0.0
+
+        linsear = (self.linsear_easy + self.linsear_difficult * 3) / self.linsear_sentences
+        if linsear <= 20:
+            linsear -= 2
+
+        return {
+            'flesch_reading_ease': _round(206.835 - 1.015 * asl - 84.6 * asw, 2),
+            'flesch_kincaid_grade': _round(0.39 * asl + 11.8 * asw - 15.59, 1),
+            'gunning_fog': gunning_fog,
+            'smog_index': smog,
+            'automated_readability_index': ari,
+            'coleman_liau_index': _round(0.058 * letters - 0.296 * sentences_per_100 - 15.8, 2),
+            'linsear_write_formula': linsear / 2,
+            'dale_chall_readability_score': dale_chall
+        }
+
+
+if __name__ == '__main__':
+    # Parse cost and memory: eight textstat calls vs. one AnalyzedDocument
+    import os
+    import sys
+    import time
+    import tracemalloc
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'salima_live.txt')
+    with open(path, encoding='utf-8') as f:
+        sample = f.read()
+
+    def with_textstat(text):
+        textstat.textstat._cache_clear()
+        return {
+            'flesch_reading_ease': textstat.flesch_reading_ease(text),
+            'flesch_kincaid_grade': textstat.flesch_kincaid_grade(text),
+            'gunning_fog': textstat.gunning_fog(text),
+            'smog_index': textstat.smog_index(text),
+            'automated_readability_index': textstat.automated_readability_index(text),
+            'coleman_liau_index': textstat.coleman_liau_index(text),
+            'linsear_write_formula': textstat.linsear_write_formula(text),
+            'dale_chall_readability_score': textstat.dale_chall_readability_score(text)
+        }
+
+    def with_document(text):
+        _syllables.cache_clear()
+        _is_difficult.cache_clear()
+        return AnalyzedDocument.build(text).readability()
+
+    for name, function in (('textstat', with_textstat), ('AnalyzedDocument', with_document)):
+        started = time.perf_counter()
+        scores = function(sample)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        function(sample)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: {elapsed * 1000:.1f} ms, peak memory {peak / 1024:.0f} KiB")
+    assert with_textstat(sample) == with_document(sample), "Readability scores differ from textstat."
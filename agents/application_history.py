@@ -0,0 +1,383 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+from contextlib import closing, contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SQLite database of every generation and refinement round; empty to disable the history
+HISTORY_DB = os.getenv('HISTORY_DB', os.path.join(ROOT_DIR, 'data', 'history.db'))
+# Skill matching results of the same candidate for the same job posting are reused
+# for this long (seconds); 0 disables warm starts
+WARM_START_MAX_AGE = float(os.getenv('HISTORY_WARM_START_MAX_AGE', 7 * 24 * 3600))
+
+# Inputs identifying a candidate (see candidate_hash)
+CANDIDATE_FIELDS = ('name', 'edu', 'work_experience', 'user_writeup', 'user_website')
+# Columns a score range can be applied to
+SCORE_FIELDS = ('resume_score', 'cover_score', 'skill_matching_score')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT,
+    created_at REAL NOT NULL,
+    job_posting_url TEXT,
+    candidate_hash TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    skill_matching TEXT,
+    skill_matching_score REAL
+);
+CREATE INDEX IF NOT EXISTS generations_job ON generations (job_posting_url, created_at);
+CREATE INDEX IF NOT EXISTS generations_candidate ON generations (candidate_hash, job_posting_url, created_at);
+CREATE INDEX IF NOT EXISTS generations_session ON generations (session_id);
+CREATE INDEX IF NOT EXISTS generations_skill_score ON generations (skill_matching_score);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    generation_id INTEGER NOT NULL REFERENCES generations (id),
+    round INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    user_feedback TEXT,
+    compiled_feedback TEXT,
+    resume TEXT,
+    cover_letter TEXT,
+    resume_hash TEXT,
+    cover_hash TEXT,
+    resume_feedback TEXT,
+    cover_feedback TEXT,
+    resume_score REAL,
+    cover_score REAL,
+    timings TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS rounds_generation ON rounds (generation_id, round);
+CREATE INDEX IF NOT EXISTS rounds_resume_score ON rounds (resume_score);
+CREATE INDEX IF NOT EXISTS rounds_cover_score ON rounds (cover_score);
+"""
+
+# Full-text index over the documents of each round (rowid = rounds.id)
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS rounds_fts USING fts5 (
+    resume, cover_letter, content='rounds', content_rowid='id'
+);
+"""
+
+
+def content_hash(text):
+    """
+    SHA-256 of a text, whitespace-normalized.
+    """
+    return hashlib.sha256(_WHITESPACE_RE.sub(' ', text or '').strip().encode('utf-8')).hexdigest()
+
+
+def candidate_hash(inputs):
+    """
+    Identify a candidate by the inputs describing them.
+
+    Args:
+        inputs (dict): Form inputs, keyed as in CANDIDATE_FIELDS.
+    """
+    return content_hash('\x1f'.join(str(inputs.get(field) or '') for field in CANDIDATE_FIELDS))
+
+
+def _fts_query(keyword):
+    # Every word must appear; quoting keeps user input from being read as FTS syntax
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in keyword.split())
+
+
+class ApplicationHistory:
+    """
+    SQLite history of every generation and refinement round.
+
+    A generation holds the candidate inputs, the job posting and the skill matching
+    report; each of its rounds (0 for the generated documents, then one per
+    refinement) holds the documents, their hashes, feedback dicts, scores and stage
+    timings. Job URL and scores are indexed columns, documents are indexed with
+    FTS5 (LIKE scans are used when SQLite lacks FTS5).
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets searches run while a round is being recorded
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+
+    @contextmanager
+    def _connect(self):
+        # Opened per operation and closed after it: sqlite3's own context manager only commits
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+
+    def record_generation(self, session_id, inputs, skill_matching, skill_matching_score,
+                          resume, cover_letter, resume_feedback, cover_feedback, timings=None):
+        """
+        Store a generation and its round 0.
+
+        Args:
+            session_id (str): Session the documents belong to.
+            inputs (dict): Form inputs, including job_posting_url.
+            skill_matching (dict): Skill matching report (model_dump()).
+            skill_matching_score (float): Skill matching score.
+            resume (str): Generated resume.
+            cover_letter (str): Generated cover letter.
+            resume_feedback (dict): Feedback dict of the resume (with 'score').
+            cover_feedback (dict): Feedback dict of the cover letter (with 'score').
+            timings (dict): Seconds spent per stage.
+
+        Returns:
+            int: The generation id, or None if it could not be recorded (the error is logged).
+        """
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO generations (session_id, created_at, job_posting_url, candidate_hash, "
+                    "inputs, skill_matching, skill_matching_score) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, now, inputs.get('job_posting_url'), candidate_hash(inputs),
+                     json.dumps(inputs), json.dumps(skill_matching), skill_matching_score)
+                )
+                generation_id = cursor.lastrowid
+                self._insert_round(conn, generation_id, 0, now, None, None, resume, cover_letter,
+                                   resume_feedback, cover_feedback, timings)
+        except sqlite3.Error as e:
+            # The history is a record of what was served: failing to write it must not fail the request
+            logger.error(f"Could not record the generation of session {session_id}: {e}")
+            return None
+        return generation_id
+
+    def record_refinement(self, session_id, user_feedback, compiled_feedback, resume, cover_letter,
+                          resume_feedback, cover_feedback, timings=None):
+        """
+        Store a refinement round of the latest generation of a session.
+
+        Concurrent refinements of the same session (e.g. a double submit) get
+        consecutive rounds: the last round is read and the next one written in
+        one write transaction.
+
+        Returns:
+            int: The round number, or None if the session has no recorded generation
+                 or the round could not be recorded (the error is logged).
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT g.id, MAX(r.round) FROM generations g JOIN rounds r ON r.generation_id = g.id "
+                    "WHERE g.session_id = ? GROUP BY g.id ORDER BY g.created_at DESC LIMIT 1",
+                    (session_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                generation_id, last_round = row[0], row[1]
+                self._insert_round(conn, generation_id, last_round + 1, time.time(), user_feedback,
+                                   compiled_feedback, resume, cover_letter, resume_feedback, cover_feedback,
+                                   timings)
+        except sqlite3.Error as e:
+            logger.error(f"Could not record the refinement of session {session_id}: {e}")
+            return None
+        return last_round + 1
+
+    def _insert_round(self, conn, generation_id, round_number, now, user_feedback, compiled_feedback,
+                      resume, cover_letter, resume_feedback, cover_feedback, timings):
+        cursor = conn.execute(
+            "INSERT INTO rounds (generation_id, round, created_at, user_feedback, compiled_feedback, "
+            "resume, cover_letter, resume_hash, cover_hash, resume_feedback, cover_feedback, "
+            "resume_score, cover_score, timings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (generation_id, round_number, now, user_feedback, compiled_feedback, resume, cover_letter,
+             content_hash(resume), content_hash(cover_letter), json.dumps(resume_feedback),
+             json.dumps(cover_feedback), resume_feedback.get('score'), cover_feedback.get('score'),
+             json.dumps(timings or {}))
+        )
+        if self.fts:
+            conn.execute(
+                "INSERT INTO rounds_fts (rowid, resume, cover_letter) VALUES (?, ?, ?)",
+                (cursor.lastrowid, resume, cover_letter)
+            )
+
+    def search(self, job_posting_url=None, min_score=None, max_score=None, score_field='resume_score',
+               keyword=None, latest_round_only=False, limit=50):
+        """
+        Find rounds by job posting, score range and/or keyword, newest first.
+
+        Args:
+            job_posting_url (str): Exact job posting URL.
+            min_score (float): Lowest score (inclusive) of `score_field`.
+            max_score (float): Highest score (inclusive) of `score_field`.
+            score_field (str): One of SCORE_FIELDS.
+            keyword (str): Words that must all appear in the resume or cover letter.
+            latest_round_only (bool): Only the last round of each generation.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list: Dicts with the generation id, session id, job URL, round, time and scores.
+        """
+        if score_field not in SCORE_FIELDS:
+            raise ValueError(f"Unknown score field: {score_field}")
+        column = 'g.skill_matching_score' if score_field == 'skill_matching_score' else f'r.{score_field}'
+
+        conditions, parameters = [], []
+        if job_posting_url:
+            conditions.append("g.job_posting_url = ?")
+            parameters.append(job_posting_url)
+        if min_score is not None:
+            conditions.append(f"{column} >= ?")
+            parameters.append(min_score)
+        if max_score is not None:
+            conditions.append(f"{column} <= ?")
+            parameters.append(max_score)
+        if keyword and keyword.strip():
+            if self.fts:
+                conditions.append("r.id IN (SELECT rowid FROM rounds_fts WHERE rounds_fts MATCH ?)")
+                parameters.append(_fts_query(keyword))
+            else:
+                for term in keyword.split():
+                    conditions.append("(r.resume LIKE ? OR r.cover_letter LIKE ?)")
+                    parameters.extend([f"%{term}%"] * 2)
+        if latest_round_only:
+            conditions.append("r.round = (SELECT MAX(round) FROM rounds WHERE generation_id = g.id)")
+
+        query = (
+            "SELECT g.id AS generation_id, g.session_id, g.job_posting_url, g.skill_matching_score, "
+            "r.round, r.created_at, r.resume_score, r.cover_score, r.resume_hash, r.cover_hash "
+            "FROM rounds r JOIN generations g ON g.id = r.generation_id"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY r.created_at DESC LIMIT ?"
+        parameters.append(limit)
+
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query, parameters)]
+
+    def get_round(self, generation_id, round_number=None):
+        """
+        Fetch the documents and feedback of a round (the latest one by default).
+
+        Returns:
+            dict: The round, with its feedback dicts and timings decoded, or None.
+        """
+        with self._connect() as conn:
+            if round_number is None:
+                row = conn.execute(
+                    "SELECT * FROM rounds WHERE generation_id = ? ORDER BY round DESC LIMIT 1",
+                    (generation_id,)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT * FROM rounds WHERE generation_id = ? AND round = ?",
+                    (generation_id, round_number)
+                ).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        for field in ('resume_feedback', 'cover_feedback', 'timings'):
+            result[field] = json.loads(result[field]) if result[field] else None
+        return result
+
+    def evaluations(self):
+        """
+        Iterate over every stored feedback dict, for bulk re-scoring (see agents.scoring).
+
+        Yields:
+            tuple: (round id, 'resume' or 'cover_letter', feedback dict).
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("SELECT id, resume_feedback, cover_feedback FROM rounds ORDER BY id")
+            for round_id, resume_feedback, cover_feedback in cursor:
+                if resume_feedback:
+                    yield round_id, 'resume', json.loads(resume_feedback)
+                if cover_feedback:
+                    yield round_id, 'cover_letter', json.loads(cover_feedback)
+
+    def warm_start(self, inputs, max_age=WARM_START_MAX_AGE):
+        """
+        Find the latest generation of the same candidate for the same job posting.
+
+        Args:
+            inputs (dict): Form inputs, including job_posting_url.
+            max_age (float): Only consider generations this recent (seconds).
+
+        Returns:
+            dict: generation_id, created_at, skill_matching (dict) and
+                  skill_matching_score, or None.
+        """
+        if max_age <= 0 or not inputs.get('job_posting_url'):
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, created_at, skill_matching, skill_matching_score FROM generations "
+                "WHERE candidate_hash = ? AND job_posting_url = ? AND created_at >= ? "
+                "AND skill_matching IS NOT NULL ORDER BY created_at DESC LIMIT 1",
+                (candidate_hash(inputs), inputs['job_posting_url'], time.time() - max_age)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'generation_id': row['id'],
+            'created_at': row['created_at'],
+            'skill_matching': json.loads(row['skill_matching']),
+            'skill_matching_score': row['skill_matching_score'],
+        }
+
+
+def create_history(path=None):
+    """
+    Create the application history, or None when HISTORY_DB is empty.
+    """
+    path = HISTORY_DB if path is None else path
+    return ApplicationHistory(path) if path else None
+
+
+if __name__ == '__main__':
+    # Query the history: python -m agents.application_history [--job URL] [--min-score N] [--keyword WORDS]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the generation history.")
+    parser.add_argument('--db', default=HISTORY_DB)
+    parser.add_argument('--job', help="Job posting URL")
+    parser.add_argument('--min-score', type=float)
+    parser.add_argument('--max-score', type=float)
+    parser.add_argument('--score-field', default='resume_score', choices=SCORE_FIELDS)
+    parser.add_argument('--keyword')
+    parser.add_argument('--latest', action='store_true', help="Only the last round of each generation")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    history = ApplicationHistory(args.db)
+    started = time.perf_counter()
+    results = history.search(args.job, args.min_score, args.max_score, args.score_field,
+                             args.keyword, args.latest, args.limit)
+    elapsed = time.perf_counter() - started
+    for result in results:
+        print(json.dumps(result))
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,279 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from agents.crewai_orchestrator import CrewaiOrchestrator
+from agents.deadlines import CancellationToken
+
+
+# Threads running the blocking CrewAI kickoffs and NLP scoring, shared by every pipeline in flight
+ASYNC_CREW_THREADS = int(os.getenv('ASYNC_CREW_THREADS', 64))
+# Connection pool of the outbound async HTTP client
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', 20))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+
+
+class AsyncCrewaiOrchestrator:
+    """
+    Asyncio counterpart of CrewaiOrchestrator, for the ASGI front end (asgi.py).
+
+    CrewAI kickoffs are blocking, so each stage runs on a shared pool of
+    ASYNC_CREW_THREADS threads while the event loop keeps serving other requests.
+    A crew in flight still holds a thread; requests waiting for one (or for
+    admission, or HTTP) do not. When the awaiting task is cancelled (e.g. the client disconnected), the
+    stage's cancellation token stops the crew at its next agent step. Outbound HTTP
+    calls share one pooled httpx.AsyncClient.
+
+    Create it inside the running event loop and close it with `aclose`.
+    """
+
+    def __init__(self, orchestrator=None, crew_threads=ASYNC_CREW_THREADS):
+        self.orchestrator = orchestrator or CrewaiOrchestrator()
+        self._executor = ThreadPoolExecutor(max_workers=crew_threads, thread_name_prefix='crew')
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=HTTP_TIMEOUT
+        )
+
+    async def _run(self, function, *args, **kwargs):
+        """
+        Run a blocking orchestrator call on the crew threads and await it.
+
+        Calls taking a `cancellation` keyword get a token that is cancelled when the
+        awaiting task is, so the crew stops instead of running on in the background.
+        The call runs in a copy of the task's context (e.g. its request profile).
+        """
+        cancellation = kwargs.get('cancellation', False)
+        if cancellation is not False:
+            kwargs['cancellation'] = cancellation = cancellation or CancellationToken()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, function, *args, **kwargs)
+        future = loop.run_in_executor(self._executor, call)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if cancellation:
+                cancellation.cancel("request cancelled")
+            raise
+
+    async def execute_skill_matching(self, job_posting_url, user_website, user_writeup, edu, work_experience,
+                                     cancellation=None):
+        """
+        See CrewaiOrchestrator.execute_skill_matching.
+        """
+        return await self._run(self.orchestrator.execute_skill_matching, job_posting_url, user_website,
+                               user_writeup, edu, work_experience, cancellation=cancellation)
+
+    async def execute_content_generation(self, skill_matching_output, name, work_experience, edu,
+                                         resume_tips_website, coverLetter_tips_website, cancellation=None):
+        """
+        See CrewaiOrchestrator.execute_content_generation.
+        """
+        return await self._run(self.orchestrator.execute_content_generation, skill_matching_output, name,
+                               work_experience, edu, resume_tips_website, coverLetter_tips_website,
+                               cancellation=cancellation)
+
+    async def execute_variant_generation(self, skill_matching_output, name, work_experience, edu,
+                                         resume_tips_website, coverLetter_tips_website, cancellation=None, **options):
+        """
+        See CrewaiOrchestrator.execute_variant_generation.
+        """
+        return await self._run(self.orchestrator.execute_variant_generation, skill_matching_output, name,
+                               work_experience, edu, resume_tips_website, coverLetter_tips_website,
+                               cancellation=cancellation, **options)
+
+    async def execute_feedback_refinement(self, resume, cover, user_fb, resumefb=None, coverfb=None,
+                                          cancellation=None):
+        """
+        See CrewaiOrchestrator.execute_feedback_refinement.
+        """
+        return await self._run(self.orchestrator.execute_feedback_refinement, resume, cover, user_fb,
+                               resumefb=resumefb, coverfb=coverfb, cancellation=cancellation)
+
+    async def execute_adaptive_refinement(self, resume, cover, user_fb, resumefb=None, coverfb=None,
+                                          cancellation=None, **options):
+        """
+        See CrewaiOrchestrator.execute_adaptive_refinement.
+        """
+        return await self._run(self.orchestrator.execute_adaptive_refinement, resume, cover, user_fb,
+                               resumefb=resumefb, coverfb=coverfb, cancellation=cancellation, **options)
+
+    async def calculate_feedback_score(self, content, content_type):
+        """
+        See CrewaiOrchestrator.calculate_feedback_score (CPU-bound, kept off the event loop).
+        """
+        return await self._run(self.orchestrator.calculate_feedback_score, content, content_type)
+
+    async def send_to_flask(self, data, endpoint):
+        """
+        Sends data to the specified Flask endpoint via HTTP POST, on the pooled client.
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        url = f"{self.orchestrator.flask_api_endpoint}/{endpoint}"
+        try:
+            response = await self.http.post(url, json=data)
+        except httpx.HTTPError as e:
+            print(f"Error sending data to Flask endpoint: {endpoint}. Error: {e!r}")
+            return False
+        if response.status_code != 200:
+            print(f"Failed to send data to Flask endpoint: {endpoint}. Status Code: {response.status_code}")
+            return False
+        return True
+
+    async def aclose(self):
+        await self.http.aclose()
+        self._executor.shutdown(wait=False)
+
+
+async def run_pipeline(orchestrator, inputs):
+    """
+    Async counterpart of agents.cassette.run_pipeline.
+    """
+    timings = {}
+    started = time.perf_counter()
+    report, _ = await orchestrator.execute_skill_matching(
+        inputs['job_posting_url'], inputs['user_website'], inputs['user_writeup'],
+        inputs['edu'], inputs['work_experience'])
+    timings['skill_matching'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cv, cover = await orchestrator.execute_content_generation(
+        report, inputs['name'], inputs['work_experience'], inputs['edu'],
+        inputs['resume_tips_website'], inputs['coverLetter_tips_website'])
+    timings['content_generation'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    (_, resume_score), (_, cover_score) = await asyncio.gather(
+        orchestrator.calculate_feedback_score(cv, content_type="resume"),
+        orchestrator.calculate_feedback_score(cover, content_type="cover_letter"))
+    timings['feedback'] = time.perf_counter() - started
+    return {'timings': timings, 'resume_score': resume_score, 'cover_score': cover_score}
+
+
+if __name__ == '__main__':
+    # Load test: python -m agents.async_orchestrator [--pipelines 64] [--threads 4 16 64] [--latency 2.0]
+    #
+    # Every crew kickoff is replaced by a wait of --latency seconds standing for the
+    # LLM and scraping traffic; the NLP scoring is real. For each thread count T,
+    # "blocking" runs the pipelines on T request threads, as a WSGI worker does, and
+    # "async" runs them all on one event loop through AsyncCrewaiOrchestrator with T
+    # crew threads. Both hold one thread per crew in flight, so at the same T they
+    # reach the same throughput: what changes is that the async worker does not tie
+    # a thread to a request waiting for a crew thread, admission or HTTP. Peak thread
+    # count and traced memory are reported per run.
+    import argparse
+    import threading
+    import tracemalloc
+    from types import SimpleNamespace
+    from concurrent.futures import ThreadPoolExecutor as WorkerPool
+    import agents.crewai_orchestrator as crewai_orchestrator
+    from agents.cassette import run_pipeline as run_blocking_pipeline
+    from agents.deadlines import run_with_deadline
+    from agents.skill_matching import SkillMatchingReport
+
+    parser = argparse.ArgumentParser(description="Concurrent pipelines per worker, blocking vs async, per thread count.")
+    parser.add_argument('--pipelines', type=int, default=64)
+    parser.add_argument('--threads', type=int, nargs='+', default=[4, 16, 64],
+                        help="Request threads of the blocking worker, crew threads of the async one")
+    parser.add_argument('--latency', type=float, default=2.0, help="Seconds per crew kickoff")
+    args = parser.parse_args()
+
+    report = SkillMatchingReport(skills=[
+        {'name': 'Python', 'status': 'MATCHING', 'importance': 'CRITICAL'},
+        {'name': 'Kubernetes', 'status': 'MISSING', 'importance': 'HIGH'},
+    ])
+    resume = SimpleNamespace(raw=(
+        "# Jane Doe\n\n## Experience\n- Led the migration of the billing platform to Python 3, "
+        "cutting batch times by 40%.\n- Built CI pipelines used by 12 teams.\n\n## Skills\nPython, SQL, Docker"))
+    cover = SimpleNamespace(raw=(
+        "Dear Hiring Manager,\n\nI am excited to apply for the Data Engineer role. In my current position "
+        "I built reliable data pipelines and mentored two junior engineers.\n\nSincerely,\nJane Doe"))
+    in_flight = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def simulated_crew(stage, agents, tasks, inputs, cancellation=None, timeout=None, **options):
+        def wait():
+            with lock:
+                in_flight['now'] += 1
+                in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+            try:
+                time.sleep(args.latency)
+            finally:
+                with lock:
+                    in_flight['now'] -= 1
+            return SimpleNamespace(pydantic=report, raw=report.model_dump_json(), tasks_output=[resume, cover, resume])
+        return run_with_deadline(wait, stage, timeout=timeout, cancellation=cancellation)
+
+    crewai_orchestrator.run_crew = simulated_crew
+    orchestrator = CrewaiOrchestrator()
+    orchestrator.job_profiles = None
+    inputs = {
+        'job_posting_url': 'https://example.com/job', 'user_website': '', 'user_writeup': 'Data engineer.',
+        'edu': 'BSc Computer Science', 'work_experience': '5 years of data engineering', 'name': 'Jane Doe',
+        'resume_tips_website': '', 'coverLetter_tips_website': '',
+    }
+    # Warm the NLP models up so the first run does not pay for loading them
+    orchestrator.calculate_feedback_score(resume, content_type="resume")
+
+    def measured(run):
+        # Wall time, peak threads (sampled every 10 ms) and traced memory peak of a run
+        peak_threads = [threading.active_count()]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.01):
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        in_flight['peak'] = 0
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            run()
+            return time.perf_counter() - started, peak_threads[0] - 1, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            done.set()
+            sampler.join()
+
+    def run_blocking(threads):
+        with WorkerPool(max_workers=threads) as pool:
+            list(pool.map(lambda _: run_blocking_pipeline(orchestrator, inputs), range(args.pipelines)))
+
+    def run_async(threads):
+        async def main():
+            async_orchestrator = AsyncCrewaiOrchestrator(orchestrator, crew_threads=threads)
+            try:
+                await asyncio.gather(*(run_pipeline(async_orchestrator, inputs) for _ in range(args.pipelines)))
+            finally:
+                await async_orchestrator.aclose()
+        asyncio.run(main())
+
+    print(f"{args.pipelines} pipelines, {args.latency:g} s per crew kickoff")
+    print(f"{'mode':<9} {'threads':>7} {'wall s':>7} {'pipelines/s':>11} {'in flight':>9} {'peak threads':>12} "
+          f"{'memory MiB':>10}")
+    for threads in args.threads:
+        for mode, run in (('blocking', run_blocking), ('async', run_async)):
+            wall, peak_threads, memory = measured(lambda: run(threads))
+            print(f"{mode:<9} {threads:7d} {wall:7.1f} {args.pipelines / wall:11.2f} {in_flight['peak']:9d} "
+                  f"{peak_threads:12d} {memory / 2 ** 20:10.1f}")
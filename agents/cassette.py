@@ -0,0 +1,387 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import threading
+import contextvars
+from datetime import timedelta
+from collections import defaultdict, deque
+import requests
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx  # HTTP client of the OpenAI SDK, used by the CrewAI LLM calls
+except ImportError:
+    httpx = None
+
+
+# Record every pipeline run of the web app into this directory (one cassette per run)
+CASSETTE_RECORD_DIR = os.getenv('CASSETTE_RECORD_DIR', '')
+
+CASSETTE_VERSION = 1
+# Response headers that no longer describe the stored (decoded) body, or must not be kept
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie'}
+
+# Cassette of the current run: set in its context and copied into the crew threads
+# it starts (run_with_deadline), so traffic of other requests and background threads passes through
+_active = contextvars.ContextVar('cassette', default=None)
+_install_lock = threading.Lock()
+_originals = {}
+
+
+class CassetteMiss(LookupError):
+    """
+    Raised in replay mode when a request has no recorded response left.
+    """
+
+
+def _body_hash(body):
+    if body is None:
+        body = b''
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    elif not isinstance(body, bytes):
+        body = b''  # Streamed / file bodies are matched on method and URL only
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+def _encode_body(content):
+    try:
+        return {'text': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(content).decode('ascii')}
+
+
+def _decode_body(entry):
+    if 'text' in entry:
+        return entry['text'].encode('utf-8')
+    return base64.b64decode(entry['base64'])
+
+
+def _kept_headers(headers):
+    return {name: value for name, value in headers.items() if name.lower() not in _DROPPED_HEADERS}
+
+
+class Cassette:
+    """
+    Records the HTTP traffic of a run (LLM API calls, scraped pages, search API)
+    to a gzipped JSON-lines file, or replays it offline.
+
+    Interception happens at the HTTP client level (requests.Session.send, and
+    httpx.Client.send / AsyncClient.send when httpx is installed), so it covers
+    CrewAI's LLM calls and the crewai_tools scrapers without depending on their
+    internals. Only the traffic of the context that entered the cassette is
+    intercepted (threads started with a copy of it included), so concurrent runs
+    and background threads are left out. Request headers (API keys) are never written.
+
+    In replay mode a request gets the next recorded response with the same method,
+    URL and body hash, or else the next one with the same method and URL (prompts
+    that differ slightly between runs). Responses are returned after their recorded
+    latency (`realtime=True`) or immediately.
+
+    Usage:
+        with Cassette('run.jsonl.gz', 'record', inputs=inputs):
+            ...
+        with Cassette('run.jsonl.gz', 'replay', realtime=False) as cassette:
+            ...
+    """
+
+    def __init__(self, path, mode='replay', realtime=False, inputs=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.inputs = inputs
+        self.calls = 0
+        self.replayed_latency = 0.0
+        self._lock = threading.Lock()
+        self._context_token = None
+        self._file = None
+        self._started = None
+        self._exact = defaultdict(deque)
+        self._by_url = defaultdict(deque)
+        self._used = set()
+
+    # --- Lifecycle ---
+
+    def __enter__(self):
+        if self.mode == 'replay':
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+            self._write({'version': CASSETTE_VERSION, 'created_at': time.time(), 'inputs': self.inputs})
+
+        _install()
+        self._context_token = _active.set(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _active.reset(self._context_token)
+        self._context_token = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return False
+
+    @staticmethod
+    def read_header(path):
+        """
+        Return the header of a cassette (version, created_at, inputs of the run).
+        """
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.loads(f.readline())
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version: {header.get('version')}")
+            self.inputs = header.get('inputs')
+            for number, line in enumerate(f):
+                entry = json.loads(line)
+                entry['number'] = number
+                self._exact[(entry['method'], entry['url'], entry['body_hash'])].append(entry)
+                self._by_url[(entry['method'], entry['url'])].append(entry)
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    # --- Recording ---
+
+    def _record_error(self, method, url, body, error, elapsed):
+        # Failed exchanges are replayed as failures, so bad runs reproduce too
+        self.calls += 1
+        self._write({
+            'method': method,
+            'url': url,
+            'body_hash': _body_hash(body),
+            'error': f"{type(error).__name__}: {error}",
+            'elapsed': round(elapsed, 4),
+            'offset': round(time.perf_counter() - self._started, 4),
+        })
+
+    def _record(self, method, url, body, status, reason, headers, content, elapsed):
+        self.calls += 1
+        self._write({
+            'method': method,
+            'url': url,
+            'body_hash': _body_hash(body),
+            'status': status,
+            'reason': reason,
+            'headers': _kept_headers(headers),
+            'elapsed': round(elapsed, 4),
+            'offset': round(time.perf_counter() - self._started, 4),
+            **_encode_body(content),
+        })
+
+    # --- Replay ---
+
+    def _next(self, method, url, body):
+        with self._lock:
+            for queue in (self._exact[(method, url, _body_hash(body))], self._by_url[(method, url)]):
+                while queue and queue[0]['number'] in self._used:
+                    queue.popleft()
+                if queue:
+                    entry = queue.popleft()
+                    self._used.add(entry['number'])
+                    self.calls += 1
+                    break
+            else:
+                raise CassetteMiss(f"No recorded response for {method} {url}")
+        if self.realtime:
+            time.sleep(entry['elapsed'])
+        self.replayed_latency += entry['elapsed']
+        return entry
+
+    # --- Interception ---
+
+    def requests_send(self, session, request, **kwargs):
+        if self.mode == 'record':
+            started = time.perf_counter()
+            try:
+                response = _originals['requests'](session, request, **kwargs)
+            except requests.RequestException as e:
+                self._record_error(request.method, request.url, request.body, e, time.perf_counter() - started)
+                raise
+            content = response.content  # Reads the body, also for streamed responses
+            self._record(request.method, request.url, request.body, response.status_code, response.reason,
+                         response.headers, content, time.perf_counter() - started)
+            return response
+
+        entry = self._next(request.method, request.url, request.body)
+        if 'error' in entry:
+            raise requests.ConnectionError(entry['error'], request=request)
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = _decode_body(entry)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=entry['elapsed'])
+        return response
+
+    def httpx_send(self, client, request, **kwargs):
+        if self.mode == 'record':
+            started = time.perf_counter()
+            try:
+                response = _originals['httpx'](client, request, **kwargs)
+            except httpx.TransportError as e:
+                self._record_error(request.method, str(request.url), request.read(), e, time.perf_counter() - started)
+                raise
+            content = response.read()
+            self._record(request.method, str(request.url), request.read(), response.status_code,
+                         response.reason_phrase, response.headers, content, time.perf_counter() - started)
+            return response
+        return self._httpx_response(request)
+
+    async def httpx_send_async(self, client, request, **kwargs):
+        if self.mode == 'record':
+            started = time.perf_counter()
+            try:
+                response = await _originals['httpx_async'](client, request, **kwargs)
+            except httpx.TransportError as e:
+                self._record_error(request.method, str(request.url), request.read(), e, time.perf_counter() - started)
+                raise
+            content = await response.aread()
+            self._record(request.method, str(request.url), request.read(), response.status_code,
+                         response.reason_phrase, response.headers, content, time.perf_counter() - started)
+            return response
+        return self._httpx_response(request)
+
+    def _httpx_response(self, request):
+        entry = self._next(request.method, str(request.url), request.read())
+        if 'error' in entry:
+            raise httpx.ConnectError(entry['error'], request=request)
+        return httpx.Response(entry['status'], headers=entry['headers'], content=_decode_body(entry), request=request)
+
+
+def _install():
+    """
+    Patch the HTTP clients once; the patches pass through outside a cassette's context.
+    """
+    with _install_lock:
+        if not _originals:
+            _patch_clients()
+
+
+def _patch_clients():
+    _originals['requests'] = requests.Session.send
+
+    def requests_send(session, request, **kwargs):
+        cassette = _active.get()
+        if cassette is None:
+            return _originals['requests'](session, request, **kwargs)
+        return cassette.requests_send(session, request, **kwargs)
+
+    requests.Session.send = requests_send
+
+    if httpx is not None:
+        _originals['httpx'] = httpx.Client.send
+        _originals['httpx_async'] = httpx.AsyncClient.send
+
+        def httpx_send(client, request, **kwargs):
+            cassette = _active.get()
+            if cassette is None:
+                return _originals['httpx'](client, request, **kwargs)
+            return cassette.httpx_send(client, request, **kwargs)
+
+        async def httpx_send_async(client, request, **kwargs):
+            cassette = _active.get()
+            if cassette is None:
+                return await _originals['httpx_async'](client, request, **kwargs)
+            return await cassette.httpx_send_async(client, request, **kwargs)
+
+        httpx.Client.send = httpx_send
+        httpx.AsyncClient.send = httpx_send_async
+
+
+def run_pipeline(orchestrator, inputs):
+    """
+    Run skill matching, content generation and feedback scoring, as the / route does.
+
+    Args:
+        orchestrator (CrewaiOrchestrator): The orchestrator.
+        inputs (dict): job_posting_url, user_website, user_writeup, edu, work_experience,
+            name, resume_tips_website and coverLetter_tips_website.
+
+    Returns:
+        dict: Seconds spent per stage, and the resume and cover letter scores.
+    """
+    timings = {}
+    started = time.perf_counter()
+    report, _ = orchestrator.execute_skill_matching(
+        inputs['job_posting_url'], inputs['user_website'], inputs['user_writeup'],
+        inputs['edu'], inputs['work_experience'])
+    timings['skill_matching'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cv, cover = orchestrator.execute_content_generation(
+        report, inputs['name'], inputs['work_experience'], inputs['edu'],
+        inputs['resume_tips_website'], inputs['coverLetter_tips_website'])
+    timings['content_generation'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, resume_score = orchestrator.calculate_feedback_score(cv, content_type="resume")
+    _, cover_score = orchestrator.calculate_feedback_score(cover, content_type="cover_letter")
+    timings['feedback'] = time.perf_counter() - started
+    return {'timings': timings, 'resume_score': resume_score, 'cover_score': cover_score}
+
+
+if __name__ == '__main__':
+    # Record a run:  python -m agents.cassette record run.jsonl.gz inputs.json
+    # Replay a run:  python -m agents.cassette replay run.jsonl.gz [--realtime] [--repeat N]
+    import argparse
+    from agents.crewai_orchestrator import CrewaiOrchestrator
+
+    parser = argparse.ArgumentParser(description="Record or replay a pipeline run.")
+    parser.add_argument('mode', choices=('record', 'replay'))
+    parser.add_argument('cassette')
+    parser.add_argument('inputs', nargs='?', help="JSON file of the run inputs (record mode)")
+    parser.add_argument('--realtime', action='store_true', help="Replay with the recorded latencies")
+    parser.add_argument('--repeat', type=int, default=1, help="Number of replays (regression benchmark)")
+    args = parser.parse_args()
+
+    orchestrator = CrewaiOrchestrator()
+    # Precomputed job profiles would skip the researcher in one run and not in the other
+    orchestrator.job_profiles = None
+    if args.mode == 'record':
+        if not args.inputs:
+            parser.error("record mode needs an inputs file")
+        with open(args.inputs, encoding='utf-8') as f:
+            run_inputs = json.load(f)
+        with Cassette(args.cassette, 'record', inputs=run_inputs) as cassette:
+            result = run_pipeline(orchestrator, run_inputs)
+        print(json.dumps(result))
+        print(f"Recorded {cassette.calls} HTTP exchanges to {args.cassette}")
+    else:
+        run_inputs = Cassette.read_header(args.cassette)['inputs']
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            with Cassette(args.cassette, 'replay', realtime=args.realtime) as cassette:
+                result = run_pipeline(orchestrator, run_inputs)
+            wall = time.perf_counter() - started
+            overhead = wall - (cassette.replayed_latency if args.realtime else 0.0)
+            print(json.dumps(result))
+            print(f"Replayed {cassette.calls} HTTP exchanges in {wall:.2f} s "
+                  f"(recorded network/LLM time {cassette.replayed_latency:.2f} s, pipeline overhead {overhead:.2f} s)")
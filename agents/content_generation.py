@@ -75,7 +75,12 @@ class ContentGeneration:
             )
         )
     
-    def _create_resume_creation_task(self):
+    @staticmethod
+    def _variant_instructions(variant_brief):
+        # Extra instructions making a drafted variant differ from the others
+        return f" For this draft: {variant_brief}" if variant_brief else ""
+
+    def _create_resume_creation_task(self, variant_brief=None):
         return Task(
             description=(
                 "Using the profile and job requirements obtained from "
@@ -84,11 +89,11 @@ class ContentGeneration:
                 "resume content and apply the tips from {resume_tips_website}. "
                 "Make sure this is a resume of very good quality and clear structure, "
                 "but don't make up any information. Write every section, "
-                "including an Introduction section, education section with {edu}, work experience section with the {work_experience}, skills section from {skill_matching_output}. "
+                "including an Introduction section, education section with {edu}, work experience section with the {work_experience}, skills section from the matched skills ({matched_skills}) in {skill_matching_output}. "
                 "All to better reflect the candidate's abilities and how it matches the job posting. "
                 "Also add a section about Language skills if you have this information about {name}. "
                 "Only add candidate's skills that match the job ones, and no suggestion for improvement."
-            ),
+            ) + self._variant_instructions(variant_brief),
             expected_output=(
                 "A clear and comphrehensive resume that effectively highlights the candidate's "
                 "qualifications and experiences relevant to the job."
@@ -97,7 +102,7 @@ class ContentGeneration:
             async_execution=False
         )
     
-    def _create_cover_letter_creation_task(self):
+    def _create_cover_letter_creation_task(self, variant_brief=None):
         return Task(
             description=(
                 "Using the profile and job requirements obtained from {skill_matching_output}"
@@ -106,7 +111,7 @@ class ContentGeneration:
                 "cover letter content and apply the tips from {coverLetter_tips_website}. Make sure this is a cover letter of very good quality "
                 "but don't make up any information. Write the content to better reflect the candidate's "
                 "abilities and how it matches the job posting. Make it clear and professional, to boost the chance of landing an interview."
-            ),
+            ) + self._variant_instructions(variant_brief),
             expected_output=(
                 "A cover letter that effectively highlights the candidate's "
                 "qualifications and experiences relevant to the job."
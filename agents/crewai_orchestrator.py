@@ -13,17 +13,128 @@
 
 
 import os
+import re
+import time
 import warnings
 import requests
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from crewai import Agent, Task, Crew
 from transformers import pipeline
 from crewai_tools import ScrapeWebsiteTool, SerperDevTool
-from agents.skill_matching import SkillMatching
+from agents.skill_matching import SkillMatching, SkillReportError
 from agents.content_generation import ContentGeneration
 from agents.feedback_refinement import FeedbackRefinement
+from agents.skill_taxonomy import get_taxonomy
+from agents.job_profiles import create_job_profile_ingestor
+from agents.profiling import profile_section
+from agents.deadlines import STAGE_TIMEOUTS, TASK_TIMEOUT, StageTimeout, BudgetSpent, Cancelled, CancellationToken, run_with_deadline
+from agents.variants import (MAX_VARIANTS, VARIANT_BRIEFS, VARIANT_TOKEN_BUDGET, TokenBudget, crew_tokens, tokens_used,
+                             llm_requests, rank_candidates, record_variant_cost, variant_cost_estimate)
+
+
+# Number of times the skill matcher alone is asked to fix an invalid report
+MAX_REPORT_REPAIRS = 2
+
+# /refine runs the whole feedback crew ('full') or only the refiners that are needed ('adaptive')
+REFINEMENT_MODE = os.getenv('REFINEMENT_MODE', 'adaptive')
+# Adaptive refinement: documents scoring at least this are not refined for the NLP feedback alone
+REFINEMENT_TARGET_SCORE = float(os.getenv('REFINEMENT_TARGET_SCORE', 95))
+# Adaptive refinement: most refinement rounds per /refine
+REFINEMENT_MAX_ROUNDS = int(os.getenv('REFINEMENT_MAX_ROUNDS', 2))
+# Adaptive refinement: a document stops being refined when a round gains less than this
+REFINEMENT_MIN_GAIN = float(os.getenv('REFINEMENT_MIN_GAIN', 0.5))
+
+# Words showing which document a user feedback is about
+_RESUME_WORDS_RE = re.compile(r"\b(resume|résumé|cv)\b", re.IGNORECASE)
+_COVER_WORDS_RE = re.compile(r"\b(cover|letter)\b", re.IGNORECASE)
+
+
+class RefinedText:
+    """
+    Text produced without a crew task, with the `raw` attribute of a CrewAI TaskOutput.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __str__(self):
+        return self.raw
+
+
+def requested_documents(user_fb):
+    """
+    Documents a user feedback is about: those it names, both when it names
+    neither, none when it is empty.
+    """
+    if not user_fb or not user_fb.strip():
+        return set()
+    requested = set()
+    if _RESUME_WORDS_RE.search(user_fb):
+        requested.add('resume')
+    if _COVER_WORDS_RE.search(user_fb):
+        requested.add('cover_letter')
+    return requested or {'resume', 'cover_letter'}
+
+
+def run_crew(stage, agents, tasks, inputs, cancellation=None, timeout=None, token_limit=None, **options):
+    """
+    Kicks off a request-scoped crew under a deadline, with cooperative cancellation.
+
+    Every agent gets TASK_TIMEOUT as its per-task limit, and the crew checks a
+    child of `cancellation` after each agent step, so a timed out or abandoned
+    stage stops making LLM calls.
+
+    Args:
+        stage (str): Stage name, a key of STAGE_TIMEOUTS.
+        agents (list): Agents of the crew.
+        tasks (list): Tasks of the crew.
+        inputs (dict): Kickoff inputs.
+        cancellation (CancellationToken): Token of the request, if any.
+        timeout (float): Time left for the stage, STAGE_TIMEOUTS[stage] by default.
+        token_limit (int): LLM tokens the crew may spend, if limited; it is
+                           cancelled at the first agent step past them.
+        **options: Other Crew options (e.g. full_output).
+
+    Returns:
+        CrewOutput: The crew output.
+
+    Raises:
+        StageTimeout: If the crew does not finish in time.
+        Cancelled: If the request is cancelled (client gone) or the crew spent `token_limit`.
+    """
+    token = cancellation.child() if cancellation is not None else CancellationToken()
+    for agent in agents:
+        agent.max_execution_time = TASK_TIMEOUT
+    step_callback = token.step_callback
+    if token_limit:
+        def step_callback(step_output):
+            if crew_tokens(crew) >= token_limit:
+                token.cancel(f"{stage} token limit ({token_limit}) spent")
+            token.step_callback(step_output)
+    crew = Crew(agents=agents, tasks=tasks, verbose=True, step_callback=step_callback, **options)
+
+    def kickoff():
+        with profile_section(f"crew:{stage}"):
+            return crew.kickoff(inputs=inputs)
+
+    return run_with_deadline(kickoff, stage, timeout=timeout, cancellation=token)
+
+
+def time_left(stage, started):
+    """
+    Seconds left of the `stage` budget, started at `started` (time.monotonic()).
+    """
+    return max(STAGE_TIMEOUTS[stage] - (time.monotonic() - started), 0.0)
 
 
 class CrewaiOrchestrator:
+    """
+    Runs the skill matching, content generation and feedback crews.
+
+    The orchestrator holds no per-request state and can be shared between threads.
+    """
+
     def __init__(self):
         # Suppress warnings
         warnings.filterwarnings('ignore')
@@ -33,67 +144,51 @@ class CrewaiOrchestrator:
         os.environ["OPENAI_MODEL_NAME"] = 'gpt-4-turbo'
         os.environ["SERPER_API_KEY"] = self.get_serper_api_key()
 
-        # Initialize tools
-        # self.search_tool = SerperDevTool()
-        self.scrape_tool = ScrapeWebsiteTool()
-
-        # Initialize SkillMatching instance
-        skill_matching = SkillMatching()  # Create an instance of SkillMatching
-
-        # Initialize Agents for Skill Matching
-        self.researcher = skill_matching._create_researcher_agent()
-        self.profiler = skill_matching._create_profiler_agent()
-        self.skill_matcher = skill_matching._create_skill_matcher_agent()
-
-        # Initialize Tasks for Skill Matching
-        self.research_task = skill_matching._create_research_task()
-        self.profile_task = skill_matching._create_profile_task()
-        self.skill_matching_task = skill_matching._create_skill_matching_task()
-
-        # Initialize ContentGeneration instance
-        content_generation = ContentGeneration()  # Create an instance of ContentGeneration
+        # Agents and Tasks are created for each request from the SkillMatching,
+        # ContentGeneration and FeedbackRefinement templates: CrewAI mutates them
+        # while running, so they are never shared between concurrent requests.
 
-        # Initialize Agents for Content Generation
-        self.resume_strategist = content_generation._create_resume_strategist()
-        self.cover_letter_strategist = content_generation._create_cover_letter_strategist()
-        self.resume_formatter = content_generation._create_resume_formatter()
-
-        # Initialize Tasks for Content Generation
-        self.resume_creation_task = content_generation._create_resume_creation_task()
-        self.cover_letter_creation_task = content_generation._create_cover_letter_creation_task()
-        self.resume_formatting_task = content_generation._create_resume_formatting_task()
+        # Load the skill taxonomy index up front rather than on the first request
+        get_taxonomy()
 
+        # Requirement profiles of job postings ingested ahead of time (None when disabled)
+        self.job_profiles = create_job_profile_ingestor()
 
         # Define Flask API endpoint
         self.flask_api_endpoint = 'http://localhost:5000/api'  # Update as needed
+        # Pooled connections for the calls to the Flask API
+        self.http = requests.Session()
 
 
-    def execute_skill_matching(self, job_posting_url, user_website, user_writeup, edu, work_experience):
+    def execute_skill_matching(self, job_posting_url, user_website, user_writeup, edu, work_experience,
+                               cancellation=None):
         """
         Executes the skill matching crew with the provided inputs.
 
+        When the job posting has a ready requirement profile (see agents.job_profiles),
+        the researcher is skipped and the skill matcher starts from the profile.
+
+        If the skill matcher output does not follow the report schema, only the
+        skill matcher is asked again to fix its report, not the whole crew.
+
         Args:
             job_posting_url (str): URL of the job posting.
-            linkedin_profile_url (str): URL of the user's LinkedIn profile.
+            user_website (str): URL of the user's website.
+            user_writeup (str): Personal write-up of the user.
+            edu (str): Education of the user.
+            work_experience (str): Work experience of the user.
+            cancellation (CancellationToken): Token of the request, if any.
 
         Returns:
-            dict: Skill matching results.
+            tuple: (SkillMatchingReport, float) validated report and matching score.
+
+        Raises:
+            StageTimeout: If skill matching, repairs included, exceeds SKILL_MATCHING_TIMEOUT.
+            Cancelled: If the request is cancelled.
         """
-        classs = SkillMatching()
-        # Initialize Crew for Skill Matching
-        self.skill_matching_crew = Crew(
-            agents=[
-                self.researcher,
-                self.profiler,
-                self.skill_matcher
-            ],
-            tasks=[
-                self.research_task,
-                self.profile_task,
-                self.skill_matching_task
-            ],
-            verbose=True
-        )
+        started = time.monotonic()
+        # Request-scoped Agents and Tasks
+        skill_matching = SkillMatching()
 
         inputs = {
             'job_posting_url': job_posting_url,
@@ -102,46 +197,90 @@ class CrewaiOrchestrator:
             'edu': edu,
             'work_experience': work_experience
         }
-        result = self.skill_matching_crew.kickoff(inputs=inputs)
-        score = classs.compute_score(result.raw)
-        return result, score 
-    
-    def execute_content_generation(self, skill_matching_output, name, work_experience, edu, resume_tips_website, coverLetter_tips_website):
+        profile = self.job_profiles.lookup(job_posting_url) if self.job_profiles else None
+        if profile is not None:
+            print(f"Using the precomputed requirement profile of {job_posting_url}")
+            inputs['job_requirements'] = profile.to_markdown()
+            agents = [skill_matching.profiler, skill_matching.skill_matcher]
+            tasks = [
+                skill_matching._create_profile_task(),
+                skill_matching._create_skill_matching_task(from_requirement_profile=True)
+            ]
+        else:
+            agents = [
+                skill_matching.researcher,
+                skill_matching.profiler,
+                skill_matching.skill_matcher
+            ]
+            tasks = [
+                skill_matching._create_research_task(),
+                skill_matching._create_profile_task(),
+                skill_matching._create_skill_matching_task()
+            ]
+        result = run_crew('skill_matching', agents=agents, tasks=tasks, inputs=inputs, cancellation=cancellation)
+        report = self.parse_skill_matching_output(result, skill_matching, cancellation, started)
+        score = SkillMatching.compute_score(report)
+        return report, score
+
+    def parse_skill_matching_output(self, result, skill_matching, cancellation=None, started=None):
+        """
+        Turns the skill matching crew output into a validated report.
+
+        Args:
+            result (CrewOutput): Output of the skill matching crew.
+            skill_matching (SkillMatching): The request-scoped SkillMatching that produced it.
+            cancellation (CancellationToken): Token of the request, if any.
+            started (float): time.monotonic() at the start of skill matching; repairs
+                             get what is left of its budget (a full budget when None).
+
+        Returns:
+            SkillMatchingReport: The validated, normalized report.
+
+        Raises:
+            SkillReportError: If the report is still invalid after the repair attempts.
+        """
+        if result.pydantic is not None:
+            return skill_matching.normalize_report(result.pydantic)
+
+        raw = result.raw
+        for attempt in range(MAX_REPORT_REPAIRS + 1):
+            try:
+                return skill_matching.parse_report(raw)
+            except SkillReportError as e:
+                if attempt == MAX_REPORT_REPAIRS:
+                    raise
+                print(f"Skill matching report failed validation, asking the skill matcher to fix it: {e}")
+                repaired = run_crew(
+                    'skill_matching',
+                    agents=[skill_matching.skill_matcher],
+                    tasks=[skill_matching._create_report_repair_task()],
+                    inputs={'previous_output': raw, 'validation_error': str(e)},
+                    cancellation=cancellation,
+                    timeout=None if started is None else time_left('skill_matching', started)
+                )
+                if repaired.pydantic is not None:
+                    return skill_matching.normalize_report(repaired.pydantic)
+                raw = repaired.raw
+
+    def execute_content_generation(self, skill_matching_output, name, work_experience, edu, resume_tips_website, coverLetter_tips_website,
+                                   cancellation=None):
         """
         Executes the content generation crew using skill matching results.
 
         Args:
-            skill_matching_output (dict): Output from the skill matching process.
+            skill_matching_output (SkillMatchingReport): Output from the skill matching process.
+            cancellation (CancellationToken): Token of the request, if any.
 
         Returns:
             dict: Content generation results.
-        """
 
-        # Initialize Crew for Content Generation
-        self.content_generation_crew = Crew(
-            agents=[
-                self.resume_strategist,
-                self.cover_letter_strategist,
-                self.resume_formatter
-            ],
-            tasks=[
-                self.resume_creation_task,
-                self.cover_letter_creation_task,
-                self.resume_formatting_task
-            ],
-            verbose=True,
-            full_output=True
-        )
+        Raises:
+            StageTimeout: If generation exceeds CONTENT_GENERATION_TIMEOUT.
+            Cancelled: If the request is cancelled.
+        """
 
-        inputs = {
-            'skill_matching_output': skill_matching_output,
-            'name': name,
-            'work_experience': work_experience,
-            'edu': edu,
-            'resume_tips_website': resume_tips_website,
-            'coverLetter_tips_website': coverLetter_tips_website,
-        }
-        result = self.content_generation_crew.kickoff(inputs=inputs)
+        result = self._run_content_generation(skill_matching_output, name, work_experience, edu, resume_tips_website,
+                                              coverLetter_tips_website, cancellation=cancellation)
         print("\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n")
         # for task in result.tasks_output:
         #     # print(task.task_id)
@@ -151,60 +290,314 @@ class CrewaiOrchestrator:
         print("\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n\n")
         
         return cv, cover
-    
 
-    def execute_feedback_refinement(self, resume, cover, user_fb):
+    def _run_content_generation(self, skill_matching_output, name, work_experience, edu, resume_tips_website,
+                                coverLetter_tips_website, variant_brief=None, cancellation=None, timeout=None,
+                                token_limit=None):
+        """
+        Runs one content generation crew (see execute_content_generation) and returns its output.
+        """
+        # Request-scoped Agents and Tasks
+        content_generation = ContentGeneration()
+
+        # Normalized skill names for the resume skills section
+        matched_skills = SkillMatching.matched_skills(skill_matching_output)
+
+        inputs = {
+            'skill_matching_output': skill_matching_output.to_markdown(),
+            'matched_skills': ', '.join(matched_skills),
+            'name': name,
+            'work_experience': work_experience,
+            'edu': edu,
+            'resume_tips_website': resume_tips_website,
+            'coverLetter_tips_website': coverLetter_tips_website,
+        }
+        return run_crew(
+            'content_generation',
+            agents=[
+                content_generation.resume_strategist,
+                content_generation.cover_letter_strategist,
+                content_generation.resume_formatter
+            ],
+            tasks=[
+                content_generation._create_resume_creation_task(variant_brief),
+                content_generation._create_cover_letter_creation_task(variant_brief),
+                content_generation._create_resume_formatting_task()
+            ],
+            inputs=inputs,
+            cancellation=cancellation,
+            timeout=timeout,
+            token_limit=token_limit,
+            full_output=True
+        )
+
+    def execute_variant_generation(self, skill_matching_output, name, work_experience, edu, resume_tips_website,
+                                   coverLetter_tips_website, variants=MAX_VARIANTS, token_budget=VARIANT_TOKEN_BUDGET,
+                                   cancellation=None):
+        """
+        Drafts several variants of the resume and cover letter at once and ranks them.
+
+        Each variant is a content generation crew with its own brief (VARIANT_BRIEFS),
+        all running concurrently under the content generation deadline, so the wall
+        time stays close to that of one generation. The variants share a token budget:
+        fewer are started when previous variants show they would not fit, and each
+        gets an equal share of it, enforced after every agent step, so a variant that
+        overruns its share is stopped while the others run on. The drafts are then
+        scored in one batched evaluation per document type.
+
+        Args:
+            skill_matching_output (SkillMatchingReport): Output from the skill matching process.
+            variants (int): Variants to draft, at most MAX_VARIANTS.
+            token_budget (int): LLM tokens the variants may spend together, 0 for no limit.
+            cancellation (CancellationToken): Token of the request, if any.
+
+        Returns:
+            tuple: (resume candidates, cover letter candidates), each a list of
+                   agents.variants.Candidate with its feedback dict, best first.
+
+        Raises:
+            StageTimeout: If no variant finishes within CONTENT_GENERATION_TIMEOUT
+                          (and the error of the last variant when they all fail).
+            BudgetSpent: If every variant is stopped at its share of the token budget.
+            Cancelled: If the request is cancelled.
+        """
+        started = time.monotonic()
+        budget = TokenBudget(token_budget)
+        count = budget.affordable(max(1, min(variants, MAX_VARIANTS, len(VARIANT_BRIEFS))), variant_cost_estimate())
+        share = budget.share(count)
+        tokens = [cancellation.child() if cancellation is not None else CancellationToken() for _ in range(count)]
+
+        drafts, failure = {}, None
+        with ThreadPoolExecutor(max_workers=count, thread_name_prefix='variant') as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, self._run_content_generation, skill_matching_output,
+                            name, work_experience, edu, resume_tips_website, coverLetter_tips_website,
+                            variant_brief=VARIANT_BRIEFS[variant], cancellation=tokens[variant],
+                            timeout=time_left('content_generation', started), token_limit=share): variant
+                for variant in range(count)
+            }
+            for future in as_completed(futures):
+                variant = futures[future]
+                try:
+                    result = future.result()
+                except Cancelled:
+                    if cancellation is not None and cancellation.cancelled:
+                        raise
+                    # Stopped at its share of the budget
+                    print(f"Variant {variant} stopped: its share of {share} tokens is spent")
+                    continue
+                except Exception as e:
+                    # Timed out or failed: the other variants may still make it
+                    print(f"Variant {variant} failed: {e}")
+                    failure = e
+                    continue
+                drafts[variant] = result
+                used = tokens_used(result)
+                record_variant_cost(used)
+                budget.charge(used)
+
+        if not drafts:
+            raise failure or BudgetSpent('content_generation', budget.limit)
+        print(f"Variant generation: {len(drafts)} of {count} variant(s) drafted, {budget.spent} tokens spent.")
+
+        variants = sorted(drafts)
+        resumes = [drafts[variant].tasks_output[0] for variant in variants]
+        covers = [drafts[variant].tasks_output[1] for variant in variants]
+        fb = FeedbackRefinement()
+        resume_feedbacks, resume_scores = fb.evaluate_batch([cv.raw for cv in resumes], content_type="resume")
+        cover_feedbacks, cover_scores = fb.evaluate_batch([cover.raw for cover in covers], content_type="cover_letter")
+        return (rank_candidates(variants, resumes, resume_feedbacks, resume_scores),
+                rank_candidates(variants, covers, cover_feedbacks, cover_scores))
+
+
+    def execute_feedback_refinement(self, resume, cover, user_fb, resumefb=None, coverfb=None, cancellation=None):
         """
         Gives feedback to the user based on the generated content.
 
         Args:
-            feedback (str): User feedback on the generated content.
+            resume (str): Current resume.
+            cover (str): Current cover letter.
+            user_fb (str): User feedback on the generated content.
+            resumefb (dict): Feedback already computed for this resume, if any.
+            coverfb (dict): Feedback already computed for this cover letter, if any.
+            cancellation (CancellationToken): Token of the request, if any.
 
         Returns:
-            str: Feedback response.
+            tuple: (feedback report, refined resume, refined cover letter,
+                    refined resume feedback dict, refined cover letter feedback dict).
+
+        Raises:
+            StageTimeout: If the crew exceeds FEEDBACK_REFINEMENT_TIMEOUT.
+            Cancelled: If the request is cancelled.
         """
+        # Request-scoped Agents and Tasks; the NLP models behind them are shared
         fb = FeedbackRefinement()
 
-        resumefb, rsc = fb.evaluate_content(resume, content_type="resume")
+        # Reuse the feedback computed in the previous round when available
+        if resumefb is None:
+            resumefb, _ = fb.evaluate_content(resume, content_type="resume")
         print(resumefb)
-        coverfb, csc = fb.evaluate_content(cover, content_type="cover_letter")
+        if coverfb is None:
+            coverfb, _ = fb.evaluate_content(cover, content_type="cover_letter")
         print(coverfb)
 
-        # Initialize Crew for Feedback
-        self.feedback_crew = Crew(
+        inputs = {
+            'user_fb': user_fb,
+            'resumefb': resumefb,
+            'coverfb': coverfb,
+            'resume': resume,
+            'cover': cover,
+        }
+        result = run_crew(
+            'feedback_refinement',
             agents=[
-                fb._create_feedback_compiling_agent(),
-                fb._create_feedback_refinement_agent(),
-                fb._create_resume_refiner_agent(),
-                fb._create_cover_letter_refiner_agent()
+                fb.feedback_compiling,
+                fb.feedback_refinement,
+                fb.resume_refiner,
+                fb.cover_letter_refiner
             ],
             tasks=[
-                fb._create_feedback_task(),
+                fb.feedback_generation_task,
                 fb._create_resume_refinement_task(),
                 fb._create_cover_letter_refinement_task()
             ],
-            verbose=True,
+            inputs=inputs,
+            cancellation=cancellation,
             full_output=True
         )
-
-        inputs = {
-            'user_fb': user_fb,
-            'resumefb': resumefb,
-            'coverfb': coverfb,
-            'resume': resume,
-            'cover': cover,
-        }
-        result = self.feedback_crew.kickoff(inputs=inputs)
+        print(f"Feedback refinement: {llm_requests(result)} LLM call(s), {tokens_used(result)} tokens.")
         feed = result.tasks_output[0]
         resume_refined = result.tasks_output[1]
         cover_refined = result.tasks_output[2]
 
 
-        _, rsc = fb.evaluate_content(resume_refined.raw, content_type="resume")
-        _, csc = fb.evaluate_content(cover_refined.raw, content_type="cover_letter")
+        refined_resumefb, _ = fb.evaluate_content(resume_refined.raw, content_type="resume")
+        refined_coverfb, _ = fb.evaluate_content(cover_refined.raw, content_type="cover_letter")
 
-        return feed, resume_refined, cover_refined, rsc, csc
+        return feed, resume_refined, cover_refined, refined_resumefb, refined_coverfb
     
+    def execute_adaptive_refinement(self, resume, cover, user_fb, resumefb=None, coverfb=None,
+                                    target_score=REFINEMENT_TARGET_SCORE, max_rounds=REFINEMENT_MAX_ROUNDS,
+                                    min_gain=REFINEMENT_MIN_GAIN, cancellation=None):
+        """
+        Refines only what needs it, in as few LLM calls as possible.
+
+        - The feedback compiler is not run: each refiner gets the user feedback and
+          the actionable points of its own document's NLP feedback directly.
+        - Round 1 refines the documents the user feedback is about, plus those
+          scoring below the target. Later rounds only refine documents still below
+          the target, and a document stops as soon as a round gains less than
+          `min_gain` (the better version is kept).
+        - Nothing is sent to the LLM when there is no user feedback and both
+          documents reach the target.
+
+        Args:
+            resume (str): Current resume.
+            cover (str): Current cover letter.
+            user_fb (str): User feedback on the generated content.
+            resumefb (dict): Feedback already computed for this resume, if any.
+            coverfb (dict): Feedback already computed for this cover letter, if any.
+            target_score (float): Score above which the NLP feedback alone triggers no refinement.
+            max_rounds (int): Most refinement rounds.
+            min_gain (float): Smallest score gain for a document to be refined again.
+            cancellation (CancellationToken): Token of the request, if any.
+
+        Returns:
+            tuple: Same as execute_feedback_refinement; the feedback report summarizes
+                   the points addressed.
+
+        Raises:
+            StageTimeout: If the first round exceeds FEEDBACK_REFINEMENT_TIMEOUT.
+            Cancelled: If the request is cancelled.
+        """
+        started = time.monotonic()
+        fb = FeedbackRefinement()
+        if resumefb is None:
+            resumefb, _ = fb.evaluate_content(resume, content_type="resume")
+        if coverfb is None:
+            coverfb, _ = fb.evaluate_content(cover, content_type="cover_letter")
+
+        documents = {
+            'resume': {'text': resume, 'feedback': resumefb, 'input': 'resume', 'points': 'resume_points',
+                       'agent': fb.resume_refiner, 'task': fb._create_targeted_resume_refinement_task},
+            'cover_letter': {'text': cover, 'feedback': coverfb, 'input': 'cover', 'points': 'cover_points',
+                             'agent': fb.cover_letter_refiner, 'task': fb._create_targeted_cover_letter_refinement_task},
+        }
+        requested = requested_documents(user_fb)
+        report = []
+        llm_calls = tokens = rounds = 0
+        refined, finished = set(), set()
+
+        for round_number in range(1, max_rounds + 1):
+            targets = [
+                content_type for content_type, document in documents.items()
+                if content_type not in finished and (
+                    (round_number == 1 and content_type in requested)
+                    or document['feedback']['score'] < target_score
+                )
+            ]
+            if not targets:
+                break
+
+            inputs = {'user_fb': user_fb if round_number == 1 else 'None, already applied.'}
+            for content_type, document in documents.items():
+                points = fb.actionable_points(document['feedback'])
+                inputs[document['input']] = document['text']
+                inputs[document['points']] = '\n'.join(f"- {point}" for point in points) if points else 'None.'
+                if content_type in targets:
+                    addressed = [f"- User feedback: {user_fb}"] if round_number == 1 and content_type in requested else []
+                    addressed.extend(f"- {point}" for point in points)
+                    report.append(f"Round {round_number}, {content_type.replace('_', ' ')} "
+                                  f"(score {document['feedback']['score']:.1f}):\n" + "\n".join(addressed))
+
+            # Request-scoped crew with one refinement task per document to refine
+            try:
+                result = run_crew(
+                    'feedback_refinement',
+                    agents=[documents[content_type]['agent'] for content_type in targets],
+                    tasks=[documents[content_type]['task']() for content_type in targets],
+                    inputs=inputs,
+                    cancellation=cancellation,
+                    timeout=time_left('feedback_refinement', started),
+                    full_output=True
+                )
+            except StageTimeout:
+                if round_number == 1:
+                    raise
+                # Later rounds are optional: keep what the previous rounds produced
+                report.append(f"Round {round_number} stopped: the refinement deadline passed.")
+                break
+            llm_calls += llm_requests(result)
+            tokens += tokens_used(result)
+            rounds += 1
+            refined.update(targets)
+
+            for content_type, output in zip(targets, result.tasks_output):
+                document = documents[content_type]
+                feedback, score = fb.evaluate_content(output.raw, content_type=content_type)
+                gain = score - document['feedback']['score']
+                user_requested = round_number == 1 and content_type in requested
+                if gain >= min_gain or user_requested:
+                    # The user's changes are kept even when the NLP score does not rise
+                    document['text'], document['feedback'] = output.raw, feedback
+                if gain < min_gain:
+                    finished.add(content_type)
+
+        skipped = [content_type.replace('_', ' ') for content_type in documents if content_type not in refined]
+        if skipped:
+            report.append(f"Not refined (not concerned by the user feedback, score at least {target_score:.0f}): "
+                          + ", ".join(skipped))
+        # Same measure as execute_feedback_refinement logs for the full feedback crew
+        print(f"Adaptive refinement: {llm_calls} LLM call(s), {tokens} tokens in {rounds} round(s).")
+
+        return (
+            RefinedText("\n\n".join(report)),
+            RefinedText(documents['resume']['text']),
+            RefinedText(documents['cover_letter']['text']),
+            documents['resume']['feedback'],
+            documents['cover_letter']['feedback'],
+        )
+
     def calculate_feedback_score(self, content, content_type):
         """
         Calculates the feedback score based on the user feedback and the generated content.
@@ -243,7 +636,7 @@ class CrewaiOrchestrator:
         """
         url = f"{self.flask_api_endpoint}/{endpoint}"
         try:
-            response = requests.post(url, json=data)
+            response = self.http.post(url, json=data, timeout=30)
             if response.status_code == 200:
                 print(f"Successfully sent data to Flask endpoint: {endpoint}")
                 return True
@@ -0,0 +1,188 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import time
+import select
+import socket
+import threading
+import contextvars
+
+
+# Longest time (seconds) each crew stage may run
+STAGE_TIMEOUTS = {
+    'skill_matching': float(os.getenv('SKILL_MATCHING_TIMEOUT', 300)),
+    'content_generation': float(os.getenv('CONTENT_GENERATION_TIMEOUT', 300)),
+    'feedback_refinement': float(os.getenv('FEEDBACK_REFINEMENT_TIMEOUT', 300)),
+}
+# Longest time (seconds) an agent may spend on one task (CrewAI max_execution_time)
+TASK_TIMEOUT = int(os.getenv('TASK_TIMEOUT', 120))
+# How often (seconds) a waiting stage checks its deadline and the client connection
+POLL_INTERVAL = 0.5
+
+
+class StageTimeout(Exception):
+    """
+    Raised when a crew stage does not finish before its deadline.
+    """
+
+    def __init__(self, stage, timeout):
+        super().__init__(f"{stage} did not finish within {timeout:.0f} seconds.")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class BudgetSpent(StageTimeout):
+    """
+    Raised when a crew stage spends its LLM token budget before finishing.
+
+    A StageTimeout, so callers fall back to their partial result the same way.
+    """
+
+    def __init__(self, stage, tokens):
+        Exception.__init__(self, f"{stage} spent its budget of {tokens} tokens before finishing.")
+        self.stage = stage
+        self.timeout = None
+        self.tokens = tokens
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a cancelled stage, at its next cooperative check.
+    """
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation shared by the stages of a request.
+
+    A token is cancelled explicitly (deadline passed) or when `is_disconnected`
+    reports the HTTP client is gone. Running crews notice it at their next agent
+    step (see step_callback) and stop instead of making more LLM calls.
+    Child tokens are cancelled with their parent, not the other way around.
+    """
+
+    def __init__(self, is_disconnected=None, parent=None):
+        self._event = threading.Event()
+        self._is_disconnected = is_disconnected
+        self.parent = parent
+        self.reason = None
+
+    def child(self):
+        return CancellationToken(parent=self)
+
+    def cancel(self, reason):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self.poll()
+
+    def poll(self):
+        """
+        Return True if the token (or its parent) is cancelled, checking the client first.
+        """
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.poll():
+            self.cancel(self.parent.reason)
+        elif self._is_disconnected is not None and self._is_disconnected():
+            self.cancel("client disconnected")
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raise Cancelled if the token is cancelled.
+        """
+        if self.poll():
+            raise Cancelled(self.reason)
+
+    def step_callback(self, step_output):
+        # Crew step_callback: runs after every agent step, in the crew's thread
+        self.check()
+
+
+def run_with_deadline(function, stage, timeout=None, cancellation=None):
+    """
+    Run `function` in a worker thread and wait for it until the stage deadline.
+
+    On timeout or cancellation the caller gets the exception right away; the
+    worker's token is cancelled so the crew stops at its next step. The worker
+    runs in a copy of the caller's context (e.g. its request profile).
+
+    Args:
+        function (callable): Work of the stage, e.g. a Crew kickoff.
+        stage (str): Stage name, a key of STAGE_TIMEOUTS.
+        timeout (float): Deadline in seconds, STAGE_TIMEOUTS[stage] by default.
+        cancellation (CancellationToken): Token the function checks, if any.
+
+    Returns:
+        The return value of `function`.
+
+    Raises:
+        StageTimeout: If the deadline passes first.
+        Cancelled: If the token is cancelled first (client gone).
+    """
+    timeout = STAGE_TIMEOUTS[stage] if timeout is None else timeout
+    result = {}
+    context = contextvars.copy_context()
+
+    def work():
+        try:
+            result['value'] = context.run(function)
+        except BaseException as e:
+            result['error'] = e
+
+    worker = threading.Thread(target=work, name=f"{stage}-worker", daemon=True)
+    deadline = time.monotonic() + timeout
+    worker.start()
+    while True:
+        worker.join(POLL_INTERVAL)
+        if not worker.is_alive():
+            break
+        if cancellation is not None and cancellation.poll():
+            raise Cancelled(cancellation.reason)
+        if time.monotonic() >= deadline:
+            if cancellation is not None:
+                cancellation.cancel(f"{stage} deadline passed")
+            raise StageTimeout(stage, timeout)
+
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def client_disconnected(environ):
+    """
+    Return a function telling whether the client of a WSGI request has gone away.
+
+    Works with servers exposing the client socket (werkzeug, gunicorn); elsewhere
+    the client is always considered connected.
+    """
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+
+    def is_disconnected():
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # A readable socket with nothing to read has been closed by the peer
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+        except ValueError:
+            return False  # TLS sockets cannot be peeked at
+        except OSError:
+            return True
+
+    return is_disconnected
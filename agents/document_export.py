@@ -0,0 +1,265 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import time
+import shutil
+import zipfile
+import tempfile
+from collections import namedtuple
+from html.parser import HTMLParser
+import markdown
+import pdfkit
+from docx import Document
+from jinja2 import Environment, FileSystemLoader
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(ROOT_DIR, 'templates')
+# wkhtmltopdf binary; looked up on the PATH when unset
+WKHTMLTOPDF_PATH = os.getenv('WKHTMLTOPDF_PATH', '')
+
+EXPORT_FORMATS = ('pdf', 'docx', 'html', 'md')
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'html': 'text/html',
+    'md': 'text/markdown',
+}
+# PDF and DOCX are compressed already, deflating them again only costs time
+_STORED_FORMATS = ('pdf', 'docx')
+
+PDF_OPTIONS = {'encoding': 'UTF-8', 'page-size': 'A4', 'quiet': ''}
+CHUNK_SIZE = 64 * 1024
+# DOCX files are built in memory up to this size, then spill to disk
+SPOOL_SIZE = 4 * 1024 * 1024
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# A document to export: `name` is its path in the archive, without extension
+ExportDocument = namedtuple('ExportDocument', ['name', 'title', 'markdown'])
+
+
+class _ChunkSink:
+    """
+    Write-only, unseekable file object collecting what zipfile writes, so the
+    archive can be handed out piece by piece as it is produced.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class _DocxBuilder(HTMLParser):
+    """
+    Rebuild the HTML produced from the Markdown as a Word document:
+    headings, paragraphs, bullet and numbered lists, bold, italic and code.
+    """
+
+    _HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+    def __init__(self, document):
+        super().__init__(convert_charrefs=True)
+        self.document = document
+        self.paragraph = None
+        self.lists = []
+        self.bold = self.italic = self.code = 0
+        self.line_start = True
+
+    def _new_paragraph(self, style=None):
+        self.paragraph = self.document.add_paragraph(style=style)
+        self.line_start = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._HEADINGS:
+            self.paragraph = self.document.add_heading(level=self._HEADINGS[tag])
+            self.line_start = True
+        elif tag == 'p':
+            # Paragraphs inside list items stay in the item
+            if not self.lists:
+                self._new_paragraph()
+        elif tag in ('ul', 'ol'):
+            self.lists.append(tag)
+        elif tag == 'li':
+            self._new_paragraph('List Number' if self.lists and self.lists[-1] == 'ol' else 'List Bullet')
+        elif tag in ('strong', 'b'):
+            self.bold += 1
+        elif tag in ('em', 'i'):
+            self.italic += 1
+        elif tag == 'code':
+            self.code += 1
+        elif tag == 'br' and self.paragraph is not None:
+            self.paragraph.add_run().add_break()
+            self.line_start = True
+        elif tag == 'hr':
+            self.paragraph = None
+
+    def handle_endtag(self, tag):
+        if tag in self._HEADINGS or tag in ('p', 'li'):
+            if not (tag == 'p' and self.lists):
+                self.paragraph = None
+        elif tag in ('ul', 'ol') and self.lists:
+            self.lists.pop()
+        elif tag in ('strong', 'b'):
+            self.bold -= 1
+        elif tag in ('em', 'i'):
+            self.italic -= 1
+        elif tag == 'code':
+            self.code -= 1
+
+    def handle_data(self, data):
+        # HTML whitespace rules: runs of whitespace are one space, none at line starts
+        data = _WHITESPACE_RE.sub(' ', data)
+        if self.paragraph is None or self.line_start:
+            data = data.lstrip()
+            if not data:
+                return
+        if self.paragraph is None:
+            self._new_paragraph()
+        self.line_start = False
+        run = self.paragraph.add_run(data)
+        run.bold = self.bold > 0 or None
+        run.italic = self.italic > 0 or None
+        if self.code:
+            run.font.name = 'Courier New'
+
+
+class DocumentRenderer:
+    """
+    Renders the generated Markdown documents as PDF, DOCX, HTML or Markdown files.
+
+    One renderer is meant to be reused for every export: the HTML template and the
+    wkhtmltopdf configuration are loaded once, and batches of documents are written
+    into a zip archive one entry at a time, never holding the whole archive in memory.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, wkhtmltopdf=WKHTMLTOPDF_PATH):
+        environment = Environment(loader=FileSystemLoader(template_dir), autoescape=True)
+        self.template = environment.get_template('export_document.html')
+        self.wkhtmltopdf = wkhtmltopdf
+        self._pdf_configuration = None
+
+    def to_html(self, document):
+        """
+        Render a document as a standalone HTML page.
+        """
+        body = markdown.markdown(document.markdown, extensions=['extra', 'sane_lists'])
+        return self.template.render(title=document.title, body=body)
+
+    def write(self, document, fmt, out):
+        """
+        Write a document in the given format to a binary file object.
+
+        Args:
+            document (ExportDocument): The document.
+            fmt (str): One of EXPORT_FORMATS.
+            out: Writable binary file object (need not be seekable).
+        """
+        if fmt == 'md':
+            out.write(document.markdown.encode('utf-8'))
+        elif fmt == 'html':
+            out.write(self.to_html(document).encode('utf-8'))
+        elif fmt == 'pdf':
+            self._write_pdf(document, out)
+        elif fmt == 'docx':
+            self._write_docx(document, out)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+    def _write_pdf(self, document, out):
+        if self._pdf_configuration is None:
+            # Locates the wkhtmltopdf binary once (raises OSError when it is missing)
+            self._pdf_configuration = pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf)
+        # wkhtmltopdf writes to a file; it is then copied to `out` in chunks
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.pdf')
+            pdfkit.from_string(self.to_html(document), path, configuration=self._pdf_configuration, options=PDF_OPTIONS)
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+
+    def _write_docx(self, document, out):
+        docx = Document()
+        builder = _DocxBuilder(docx)
+        builder.feed(markdown.markdown(document.markdown, extensions=['extra', 'sane_lists']))
+        builder.close()
+        # python-docx needs a seekable file; `out` may be a zip entry or a socket
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as buffer:
+            docx.save(buffer)
+            buffer.seek(0)
+            shutil.copyfileobj(buffer, out, CHUNK_SIZE)
+
+    def stream_archive(self, documents, formats):
+        """
+        Render documents into a zip archive, yielding the archive bytes as each entry is done.
+
+        Args:
+            documents (iterable): ExportDocument items, consumed lazily.
+            formats (list): Formats of EXPORT_FORMATS written for every document.
+
+        Yields:
+            bytes: Consecutive pieces of the zip archive.
+        """
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown export formats: {', '.join(unknown)}")
+
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, 'w') as archive:
+            for document in documents:
+                for fmt in formats:
+                    entry = zipfile.ZipInfo(f"{document.name}.{fmt}", date_time=time.localtime()[:6])
+                    entry.compress_type = zipfile.ZIP_STORED if fmt in _STORED_FORMATS else zipfile.ZIP_DEFLATED
+                    with archive.open(entry, 'w') as out:
+                        self.write(document, fmt, out)
+                    yield sink.drain()
+        # Central directory
+        yield sink.drain()
+
+    def write_archive(self, documents, formats, fileobj):
+        """
+        Render documents into a zip archive written to `fileobj`.
+        """
+        for chunk in self.stream_archive(documents, formats):
+            fileobj.write(chunk)
+
+
+if __name__ == '__main__':
+    # Batch export of Markdown files: python -m agents.document_export out.zip pdf,docx file.md [file.md ...]
+    import sys
+
+    if len(sys.argv) < 4:
+        sys.exit("Usage: python -m agents.document_export OUTPUT.zip FORMATS FILE.md [FILE.md ...]")
+
+    def read_documents(paths):
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(path, encoding='utf-8') as f:
+                yield ExportDocument(name, name.replace('_', ' ').title(), f.read())
+
+    started = time.perf_counter()
+    with open(sys.argv[1], 'wb') as output:
+        DocumentRenderer().write_archive(read_documents(sys.argv[3:]), sys.argv[2].split(','), output)
+    print(f"Exported {len(sys.argv) - 3} documents to {sys.argv[1]} in {time.perf_counter() - started:.2f} s")
@@ -11,12 +11,95 @@
 # 
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
 
-from textblob import TextBlob
-import textstat
-import spacy
+import os
+import threading
 from transformers import pipeline
 from crewai import Agent, Task
 from crewai_tools import ScrapeWebsiteTool, SerperDevTool
+from agents.skill_taxonomy import PhraseTrie, normalize_phrase
+from agents.analyzed_document import AnalyzedDocument
+from agents.nlp_profiles import load_nlp
+from agents.text_diff import diff_texts
+from agents.sentiment import get_sentiment_lexicon
+from agents.profiling import profiled, profile_section
+from agents.scoring import FeatureTable, score_table, recommendation_flags, DEFAULT_POLICY
+from agents.input_ingestion import cut_text
+
+
+# spaCy profile used for evaluation; the structure checks only need sentence boundaries
+FEEDBACK_NLP_PROFILE = os.getenv('FEEDBACK_NLP_PROFILE', 'structure')
+# Longer documents are cut to this many characters before being analyzed
+MAX_EVALUATION_CHARS = int(os.getenv('MAX_EVALUATION_CHARS', 20000))
+# Documents corrected per grammar model call in a batched evaluation
+GRAMMAR_BATCH_SIZE = int(os.getenv('GRAMMAR_BATCH_SIZE', 8))
+
+# Only the first corrections are listed in the feedback, all of them are counted
+MAX_REPORTED_ERRORS = 50
+
+# Recommendation given when no analyzer found anything to improve
+NO_ISSUES_RECOMMENDATION = "Overall, the content looks good. Minor improvements can be made for clarity and tone."
+# Corrections quoted to a refiner, as examples of the grammar errors found
+MAX_QUOTED_CORRECTIONS = 5
+
+
+# Standard resume sections and the titles that identify them
+RESUME_SECTION_CUES = {
+    'Contact Information': ['contact information'],
+    'Summary': ['summary'],
+    'Work Experience': ['work experience'],
+    'Education': ['education'],
+    'Skills': ['skills'],
+}
+
+# Conceptual cover letter sections and the keyword cues that reveal them
+COVER_LETTER_SECTION_CUES = {
+    'Greeting': ['dear', 'hello'],                                         # e.g. "Dear Hiring Manager,"
+    'Introduction': ['i am writing', 'interested in'],                     # Intro paragraph stating intent
+    'Body': ['experience', 'experiences', 'experienced', 'skills'],        # Main body highlighting relevant skills/experience
+    'Conclusion': ['thank you', 'looking forward'],                        # Closing remarks, restating interest
+    'Sign-off': ['sincerely', 'best regards'],                             # e.g. "Sincerely, [Name]"
+}
+
+_section_tries = {}
+
+
+def _section_trie(content_type):
+    """
+    Build (once) the phrase trie mapping section cues to their section name.
+    """
+    trie = _section_tries.get(content_type)
+    if trie is None:
+        trie = PhraseTrie()
+        cues = RESUME_SECTION_CUES if content_type == "resume" else COVER_LETTER_SECTION_CUES
+        for section, phrases in cues.items():
+            for phrase in phrases:
+                trie.add(normalize_phrase(phrase).split(' '), section)
+        _section_tries[content_type] = trie
+    return trie
+
+
+_models = None
+_models_lock = threading.Lock()
+_grammar_lock = threading.Lock()
+
+
+def _shared_models():
+    """
+    Load (once per process) the grammar correction pipeline, the spaCy model and the sentiment lexicon.
+    """
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                # Initialize transformer-based grammar correction pipeline
+                grammar_corrector = pipeline("text2text-generation", model="prithivida/grammar_error_correcter_v1")
+                # Load the trimmed spaCy pipeline of the configured profile
+                nlp = load_nlp(FEEDBACK_NLP_PROFILE)
+                # Sentiment lexicon table, parsed once for every evaluation
+                get_sentiment_lexicon()
+                _models = (grammar_corrector, nlp)
+    return _models
+
 
 class FeedbackRefinement:
     """
@@ -28,11 +111,9 @@ class FeedbackRefinement:
     - Generating refined content following feedback
     """
     def __init__(self):
-        # Initialize transformer-based grammar correction pipeline
-        self.grammar_corrector = pipeline("text2text-generation", model="prithivida/grammar_error_correcter_v1")
-        
-        # Load spaCy model for NLP tasks
-        self.nlp = spacy.load('en_core_web_sm')
+        # NLP models are loaded once per process and shared by every instance;
+        # only the Agents and Tasks below belong to this instance.
+        self.grammar_corrector, self.nlp = _shared_models()
 
         self.scrape_tool = ScrapeWebsiteTool()
 
@@ -45,6 +126,7 @@ class FeedbackRefinement:
         self.feedback_generation_task=self._create_feedback_task()
 
 
+    @profiled('evaluate_content')
     def evaluate_content(self, content, content_type="resume"):
         """
         Evaluate the given content (resume or cover letter) and return feedback.
@@ -54,28 +136,29 @@ class FeedbackRefinement:
         :return: A dictionary of feedback containing grammar, readability, sentiment, structure, tone, score, and recommendations.
         """
         feedback = {}
+        content = cut_text(content, MAX_EVALUATION_CHARS)
+
+        # Parse the text once; every analyzer below reads from this document
+        # (each step is a profile section when the request is profiled)
+        with profile_section('spacy'):
+            doc = AnalyzedDocument.build(content, self.nlp)
 
         # 1. Grammar and Spell Checking
-        grammar_feedback = self.correct_grammar(content)
+        with profile_section('grammar'):
+            grammar_feedback = self.correct_grammar(content)
         feedback['grammar'] = grammar_feedback
 
-        # 2. Readability Analysis using textstat
-        readability_scores = {
-            'flesch_reading_ease': textstat.flesch_reading_ease(content),
-            'flesch_kincaid_grade': textstat.flesch_kincaid_grade(content),
-            'gunning_fog': textstat.gunning_fog(content),
-            'smog_index': textstat.smog_index(content),
-            'automated_readability_index': textstat.automated_readability_index(content),
-            'coleman_liau_index': textstat.coleman_liau_index(content),
-            'linsear_write_formula': textstat.linsear_write_formula(content),
-            'dale_chall_readability_score': textstat.dale_chall_readability_score(content)
-        }
-        feedback['readability'] = readability_scores
+        # 2. Readability Analysis (textstat formulas over the shared word and syllable counts)
+        with profile_section('readability'):
+            feedback['readability'] = doc.readability()
 
-        feedback['sentiment'] = self.assess_tone(content)
+        # 3. Sentiment Analysis
+        with profile_section('sentiment'):
+            feedback['sentiment'] = self.assess_tone(doc)
 
         # 4. Structural Analysis
-        structure_feedback = self.analyze_structure(content, content_type)
+        with profile_section('structure'):
+            structure_feedback = self.analyze_structure(doc, content_type)
         feedback['structure'] = structure_feedback
 
         # 6. Scoring and Score Explanation
@@ -89,87 +172,136 @@ class FeedbackRefinement:
 
         return feedback, feedback['score']
 
+    @profiled('evaluate_batch')
+    def evaluate_batch(self, contents, content_type="resume", policy=DEFAULT_POLICY):
+        """
+        Evaluate several documents of the same type in one pass, e.g. the drafted variants.
+
+        spaCy parses them with nlp.pipe, the grammar model corrects them in batches of
+        GRAMMAR_BATCH_SIZE, and they are scored together over one feature table. Each
+        feedback dict is the one evaluate_content gives for the document.
+
+        :param contents: The text contents of the resumes or cover letters.
+        :param content_type: Either "resume" or "cover_letter" to determine structural expectations.
+        :param policy: ScoringPolicy with the thresholds and weights.
+        :return: (list of feedback dicts, list of scores), in the order of `contents`.
+        """
+        contents = [cut_text(content, MAX_EVALUATION_CHARS) for content in contents]
+        if not contents:
+            return [], []
+
+        with profile_section('spacy'):
+            docs = [AnalyzedDocument.build(content, self.nlp, parsed)
+                    for content, parsed in zip(contents, self.nlp.pipe(contents))]
+        with profile_section('grammar'):
+            grammar_feedbacks = self.correct_grammar_batch(contents)
+
+        feedbacks = []
+        for doc, grammar_feedback in zip(docs, grammar_feedbacks):
+            feedbacks.append({
+                'grammar': grammar_feedback,
+                'readability': doc.readability(),
+                'sentiment': self.assess_tone(doc),
+                'structure': self.analyze_structure(doc, content_type),
+            })
+
+        table = FeatureTable.from_feedback(feedbacks)
+        scores = score_table(table, policy)
+        flags = recommendation_flags(table, policy)
+        for row, feedback in enumerate(feedbacks):
+            feedback['score'], feedback['score_comment'] = self._explain_score(feedback, scores, row, policy)
+            feedback['recommendations'] = self.generate_recommendations(
+                feedback, content_type, policy, flags={name: flag[row] for name, flag in flags.items()})
+
+        return feedbacks, [feedback['score'] for feedback in feedbacks]
+
     def correct_grammar(self, content):
         """
         Correct grammar and spelling using a transformer-based model.
         """
-        corrected = self.grammar_corrector(content, max_length=512, truncation=True)
-        corrected_text = corrected[0]['generated_text']
+        # The transformers pipeline is not safe to call from several threads at once
+        with _grammar_lock:
+            corrected = self.grammar_corrector(content, max_length=512, truncation=True)
+        return self._grammar_feedback(content, corrected[0]['generated_text'])
+
+    def correct_grammar_batch(self, contents):
+        """
+        correct_grammar for several texts, with one model call per GRAMMAR_BATCH_SIZE texts.
+        """
+        with _grammar_lock:
+            corrected = self.grammar_corrector(list(contents), max_length=512, truncation=True,
+                                               batch_size=GRAMMAR_BATCH_SIZE)
+        # A list input gives one result per text (a list of one candidate, or the candidate itself)
+        return [
+            self._grammar_feedback(content, (result[0] if isinstance(result, list) else result)['generated_text'])
+            for content, result in zip(contents, corrected)
+        ]
+
+    @staticmethod
+    def _grammar_feedback(content, corrected_text):
+        """
+        Grammar feedback dict of a text from its corrected version.
+        """
+        # Word-level diff between original and corrected text: an edit span is a run of
+        # adjacent changed words, and counts one error per word it changes (as many as the
+        # scoring policy's grammar_free_errors and grammar_error_penalty expect).
+        # The model input and output are capped at 512 tokens, so a long text comes back
+        # truncated: only the part the correction covers is compared, its untouched tail
+        # is not an error (and is not diffed).
+        spans = diff_texts(content, corrected_text, prefix=True)
 
-        # Compare original and corrected text (simple heuristic)
-        original_words = content.split()
-        corrected_words = corrected_text.split()
-        differences = sum(1 for o, c in zip(original_words, corrected_words) if o != c)
-        
         errors = []
-        for original, corrected_word in zip(original_words, corrected_words):
-            if original != corrected_word:
-                errors.append(f"Original: {original} --> Corrected: {corrected_word}")
-        
+        for span in spans[:MAX_REPORTED_ERRORS]:
+            original = content[span.orig_start:span.orig_end]
+            corrected_words = corrected_text[span.corr_start:span.corr_end]
+            errors.append(f"Original: {original or '(none)'} --> Corrected: {corrected_words or '(removed)'}")
+
         return {
-            'error_count': differences,
+            'error_count': sum(max(len(content[span.orig_start:span.orig_end].split()),
+                                   len(corrected_text[span.corr_start:span.corr_end].split()))
+                               for span in spans),
             'errors': errors,
+            'edits': spans[:MAX_REPORTED_ERRORS],
             'corrected_content': corrected_text
         }
 
-    def analyze_structure(self, content, content_type):
+    def analyze_structure(self, doc, content_type):
         """
         Analyze the structure of the content based on whether it's a resume or cover letter.
+
+        Section cues are matched with a phrase trie, so each sentence is scanned once
+        instead of once per section keyword.
+
+        :param doc: The AnalyzedDocument of the resume or cover letter.
+        :param content_type: Either "resume" or "cover_letter".
         """
         if content_type == "resume":
-            # Standard sections for a resume
-            standard_sections = [
-                'Contact Information',
-                'Summary',
-                'Work Experience',
-                'Education',
-                'Skills'
-            ]
+            # Standard sections for a resume, found through their actual section titles
+            section_cues = RESUME_SECTION_CUES
         else:
             # Standard sections for a cover letter
             # These are conceptual rather than strictly "sections," but we check for cues.
-            standard_sections = [
-                'Greeting',      # e.g. "Dear Hiring Manager,"
-                'Introduction',  # Intro paragraph stating intent
-                'Body',          # Main body paragraphs highlighting relevant skills/experience
-                'Conclusion',    # Closing remarks, restating interest
-                'Sign-off'       # e.g. "Sincerely, [Name]"
-            ]
-
-        doc = self.nlp(content)
+            section_cues = COVER_LETTER_SECTION_CUES
+        trie = _section_trie(content_type)
+
         found_sections = set()
 
-        for sent in doc.sents:
-            sent_text_lower = sent.text.lower()
-            for section in standard_sections:
-                # For the cover letter, these sections are conceptual. We'll do basic keyword checks:
-                if content_type == "cover_letter":
-                    if section == 'Greeting' and ("dear" in sent_text_lower or "hello" in sent_text_lower):
-                        found_sections.add('Greeting')
-                    elif section == 'Introduction' and ("i am writing" in sent_text_lower or "interested in" in sent_text_lower):
-                        found_sections.add('Introduction')
-                    elif section == 'Body' and ("experience" in sent_text_lower or "skills" in sent_text_lower):
-                        found_sections.add('Body')
-                    elif section == 'Conclusion' and ("thank you" in sent_text_lower or "looking forward" in sent_text_lower):
-                        found_sections.add('Conclusion')
-                    elif section == 'Sign-off' and ("sincerely" in sent_text_lower or "best regards" in sent_text_lower):
-                        found_sections.add('Sign-off')
-                else:
-                    # For resumes, look for actual section titles
-                    if section.lower() in sent_text_lower:
-                        found_sections.add(section)
-
-        missing_sections = set(standard_sections) - found_sections
+        for tokens in doc.sentences():
+            for _, _, section in trie.scan(tokens):
+                found_sections.add(section)
+
+        missing_sections = set(section_cues) - found_sections
 
         return {
             'found_sections': list(found_sections),
             'missing_sections': list(missing_sections)
         }
 
-    def assess_tone(self, content):
-        blob = TextBlob(content)
-        polarity = blob.sentiment.polarity  # [-1.0, 1.0]
-        subjectivity = blob.sentiment.subjectivity
+    def assess_tone(self, doc):
+        # Lexicon scores on TextBlob's scale, from the tokens already in the document
+        sentiment = get_sentiment_lexicon().score_document(doc)
+        polarity = sentiment.polarity  # [-1.0, 1.0]
+        subjectivity = sentiment.subjectivity
         
         if polarity > 0.1:
             tone = 'Positive'
@@ -181,46 +313,48 @@ class FeedbackRefinement:
         return {
             'polarity': polarity,
             'tone': tone,
-            'subjectivity': subjectivity
+            'subjectivity': subjectivity,
+            'sentence_polarity': [round(float(p), 3) for p in sentiment.sentence_polarity]
         }   
 
-    def calculate_score(self, feedback):
+    def calculate_score(self, feedback, policy=DEFAULT_POLICY):
         """
         A scoring mechanism combining grammar quality, readability (Flesch-Kincaid & Gunning Fog), and sentiment.
         Scores will be between 0 and 100. Less punitive to produce better scores.
+
+        The rules are those of agents.scoring, applied to a one-row feature table,
+        so a single evaluation and a bulk re-scoring always agree.
+
+        :param feedback: Feedback dict with grammar, readability, sentiment and structure.
+        :param policy: ScoringPolicy with the thresholds and weights.
+        :return: (score, score explanation).
         """
-        # Start with a base score
-        score = 100.0
-        reasons = []
+        scores = score_table(FeatureTable.from_feedback([feedback]), policy)
+        return self._explain_score(feedback, scores, 0, policy)
 
-        # 1. Grammar Errors: Reduced Deduction Severity
-        grammar_errors = feedback['grammar']['error_count']
-        if grammar_errors > 0:
-            penalty = grammar_errors * 0.5  # Reduce impact (0.5 points per error)
-            if grammar_errors <= 2:  # Allow up to 2 errors with no penalty
-                penalty = 0
-            score -= penalty
-            if penalty > 0:
-                reasons.append(f"{grammar_errors} grammar/spelling error(s) reduced the score by {penalty:.2f} points.")
+    @staticmethod
+    def _explain_score(feedback, scores, row, policy):
+        """
+        (score, score explanation) of the feedback at `row` of the score_table results `scores`.
+        """
+        reasons = []
 
+        # 1. Grammar Errors: no penalty for the first few
+        penalty = scores.grammar_penalty[row]
+        if penalty > 0:
+            grammar_errors = feedback['grammar']['error_count']
+            reasons.append(f"{grammar_errors} grammar/spelling error(s) reduced the score by {penalty:.2f} points.")
 
-        # 3. Gunning Fog Index Adjustment
+        # 2. Gunning Fog Index above the target for professional documents (capped penalty)
         gunning_fog = feedback['readability']['gunning_fog']
-        if gunning_fog > 14:  # Target readability for professional documents
-            diff = (gunning_fog - 14) * 0.75  # Lower the multiplier
-            if diff > 3:  # Cap the maximum penalty at 3 points
-                diff = 3
-            score -= diff
-            reasons.append(f"Complex sentence structure (Gunning Fog Index {gunning_fog:.2f}) reduced the score by {diff:.2f} points.")
-
-        # 4. Sentiment Polarity: More Lenient Penalty
-        polarity = feedback['sentiment']['polarity']
-        if polarity < -0.3:  # Penalize only for strong negativity
-            score -= 5  # Reduced penalty for very negative tone
-            reasons.append("Strong negative tone reduced the score by 5 points.")
-
-        # Bound the score between 0 and 100
-        score = max(0, min(100, score))
+        if gunning_fog > policy.fog_threshold:
+            reasons.append(f"Complex sentence structure (Gunning Fog Index {gunning_fog:.2f}) reduced the score by {scores.fog_penalty[row]:.2f} points.")
+
+        # 3. Sentiment Polarity: penalized only for strong negativity
+        if scores.tone_penalty[row] > 0:
+            reasons.append(f"Strong negative tone reduced the score by {scores.tone_penalty[row]:g} points.")
+
+        score = float(scores.score[row])
 
         # Add default message if no deductions
         if not reasons:
@@ -231,33 +365,50 @@ class FeedbackRefinement:
 
         return score, score_comment
 
-    def generate_recommendations(self, feedback, content_type):
+    def generate_recommendations(self, feedback, content_type, policy=DEFAULT_POLICY, flags=None):
         recommendations = []
+        # Same flags as a bulk evaluation (agents.scoring.recommendation_flags); a batch passes its row
+        if flags is None:
+            flags = {name: flag[0] for name, flag in recommendation_flags(FeatureTable.from_feedback([feedback]), policy).items()}
 
         # Grammar recommendations
-        if feedback['grammar']['error_count'] > 0:
+        if flags['grammar']:
             recommendations.append("Consider reviewing grammar and spelling to reduce errors.")
 
         # Readability recommendations
-        if feedback['readability']['flesch_kincaid_grade'] > 12:
+        if flags['readability']:
             recommendations.append("Try simplifying the language to improve readability.")
 
         # Tone recommendations
-        if feedback['sentiment']['tone'] == 'Negative':
+        if flags['tone']:
             recommendations.append("Aim for a more positive or neutral tone to appeal to a broader audience.")
 
         # Structural recommendations
         missing_sections = feedback['structure']['missing_sections']
-        if missing_sections:
+        if flags['structure']:
             if content_type == "resume":
                 recommendations.append("Consider adding the following resume sections: " + ", ".join(missing_sections))
             else:
                 recommendations.append("Consider incorporating elements of a standard cover letter structure: " + ", ".join(missing_sections))
 
         if not recommendations:
-            recommendations.append("Overall, the content looks good. Minor improvements can be made for clarity and tone.")
+            recommendations.append(NO_ISSUES_RECOMMENDATION)
 
         return recommendations
+
+    @staticmethod
+    def actionable_points(feedback):
+        """
+        List what a refiner should fix according to a feedback dict.
+
+        :param feedback: Feedback dict returned by evaluate_content.
+        :return: A list of instructions, empty when nothing is actionable.
+        """
+        points = [r for r in feedback['recommendations'] if r != NO_ISSUES_RECOMMENDATION]
+        if feedback['score'] < 100:
+            points.append(feedback['score_comment'])
+        points.extend(feedback['grammar']['errors'][:MAX_QUOTED_CORRECTIONS])
+        return points
     
 
 
@@ -353,3 +504,31 @@ class FeedbackRefinement:
             dependencies=[self.feedback_generation_task],
             async_execution=True
         )
+
+    def _create_targeted_resume_refinement_task(self):
+        return Task(
+            description=(
+                "Refine the user's resume {resume}. Apply the user's feedback, if any: {user_fb}. "
+                "Address these points from the automatic review of the resume: {resume_points}. "
+                "Keep everything that is not concerned by these points unchanged."
+            ),
+            expected_output=(
+                "The complete refined resume, in the same format as the original."
+            ),
+            agent=self.resume_refiner,
+            async_execution=False
+        )
+
+    def _create_targeted_cover_letter_refinement_task(self):
+        return Task(
+            description=(
+                "Refine the user's cover letter {cover}. Apply the user's feedback, if any: {user_fb}. "
+                "Address these points from the automatic review of the cover letter: {cover_points}. "
+                "Keep everything that is not concerned by these points unchanged."
+            ),
+            expected_output=(
+                "The complete refined cover letter, in the same format as the original."
+            ),
+            agent=self.cover_letter_refiner,
+            async_execution=False
+        )
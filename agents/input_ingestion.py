@@ -0,0 +1,433 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import codecs
+import itertools
+import tempfile
+from collections import namedtuple
+from docx import Document
+from pypdf import PdfReader
+
+
+# Largest accepted resume upload (bytes)
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 5 * 1024 * 1024))
+# Text read from an upload or a form field is cut past this many characters
+MAX_EXTRACTED_CHARS = int(os.getenv('MAX_EXTRACTED_CHARS', 500000))
+# Characters kept per section of an upload; the rest of a section is summarized as a count
+MAX_SECTION_CHARS = int(os.getenv('MAX_SECTION_CHARS', 1500))
+# Characters of a candidate input (education, experience, write-up) given to the agents
+MAX_FIELD_CHARS = int(os.getenv('MAX_FIELD_CHARS', 6000))
+MAX_PDF_PAGES = 50
+# Longest line kept whole; longer ones are split
+MAX_LINE_CHARS = 2000
+CHUNK_SIZE = 64 * 1024
+# PDF and DOCX uploads are spooled to disk past this size to be parsed
+SPOOL_SIZE = 1024 * 1024
+
+# Section names and the headings introducing them
+SECTION_HEADINGS = {
+    'summary': ['summary', 'profile', 'about me', 'general description', 'objective', 'personal statement'],
+    'contact': ['contact', 'contact information', 'personal information', 'personal url'],
+    'education': ['education', 'academic background', 'qualifications'],
+    'experience': ['experience', 'work experience', 'professional experience', 'employment', 'employment history',
+                   'work history'],
+    'skills': ['skills', 'technical skills', 'competencies', 'languages'],
+    'projects': ['projects'],
+    'publications': ['publications', 'selected publications', 'papers'],
+    'certifications': ['certifications', 'certificates', 'awards', 'honors'],
+}
+# Sections making up each candidate input of the pipeline
+FIELD_SECTIONS = {
+    'edu': ('education', 'certifications'),
+    'work_experience': ('experience', 'projects'),
+    'user_writeup': ('summary', 'skills', 'publications', 'contact', 'other'),
+}
+
+_HEADING_NAMES = {heading: name for name, headings in SECTION_HEADINGS.items() for heading in headings}
+_HEADING_RE = re.compile(r'^\s*(?:#{1,6}\s*)?([A-Za-z][A-Za-z &/\-]{1,38}?)\s*(?::\s*(.*))?$')
+_BULLET_RE = re.compile(r'^\s*(?:[-*•▪–]|\d{1,3}[.)])\s+')
+
+# Counters of an ingestion: what was read, whether it was cut, and the most
+# characters held at once (line buffer + kept section text)
+IngestStats = namedtuple('IngestStats', ['bytes_read', 'chars_read', 'truncated', 'peak_buffered_chars'])
+
+
+class InputTooLarge(ValueError):
+    """
+    Raised when an upload exceeds MAX_UPLOAD_BYTES.
+    """
+
+
+class UnsupportedInput(ValueError):
+    """
+    Raised when an upload is not a text, PDF or DOCX file.
+    """
+
+
+class Section:
+    """
+    A section of a candidate input, holding at most `budget` characters of items
+    (bullets or paragraphs); the items past the budget are only counted.
+    """
+
+    def __init__(self, name, title, budget):
+        self.name = name
+        self.title = title
+        self.budget = budget
+        self.items = []
+        self.kept_chars = 0
+        self.omitted_items = 0
+        self.omitted_chars = 0
+
+    def add_item(self, item):
+        if self.kept_chars + len(item) <= self.budget:
+            self.items.append(item)
+            self.kept_chars += len(item)
+        elif not self.items:
+            # A single item longer than the budget keeps its beginning
+            self.items.append(item[:self.budget].rstrip() + ' ...')
+            self.kept_chars = self.budget
+            self.omitted_chars += len(item) - self.budget
+        else:
+            self.omitted_items += 1
+            self.omitted_chars += len(item)
+
+    def limit(self, budget):
+        """
+        Keep only `budget` characters of the items already added.
+        """
+        items, omitted_items, omitted_chars = self.items, self.omitted_items, self.omitted_chars
+        self.budget = budget
+        self.items = []
+        self.kept_chars = self.omitted_items = self.omitted_chars = 0
+        for item in items:
+            self.add_item(item)
+        self.omitted_items += omitted_items
+        self.omitted_chars += omitted_chars
+
+    def to_text(self):
+        lines = [f"{self.title}:"] if self.title else []
+        lines.extend(self.items)
+        if self.omitted_items:
+            lines.append(f"(... and {self.omitted_items} more entries, {self.omitted_chars} characters omitted)")
+        return "\n".join(lines)
+
+
+class IngestedInput:
+    """
+    Bounded, sectioned candidate input produced by ResumeSectioner.
+    """
+
+    def __init__(self, sections, stats):
+        self.sections = sections
+        self.stats = stats
+
+    def text(self, names=None, max_chars=None):
+        """
+        Text of the sections (all, or those named), cut at `max_chars`.
+        """
+        text = "\n\n".join(section.to_text() for section in self.sections
+                           if (names is None or section.name in names) and (section.items or section.title))
+        return text if max_chars is None or len(text) <= max_chars else text[:max_chars].rstrip() + ' ...'
+
+    def fields(self, max_chars=MAX_FIELD_CHARS):
+        """
+        The pipeline inputs (edu, work_experience, user_writeup) built from the sections.
+        """
+        return {field: self.text(names, max_chars) for field, names in FIELD_SECTIONS.items()}
+
+
+class ResumeSectioner:
+    """
+    Incremental sectioning of a resume or long candidate input.
+
+    Text is fed in chunks of any size and split into lines, headings start
+    sections, and bullets or paragraphs become section items. Only the first
+    `section_chars` characters of items of each section are kept, so what is
+    held stays bounded however long the input is; reading stops at `max_chars`.
+    """
+
+    def __init__(self, section_chars=MAX_SECTION_CHARS, max_chars=MAX_EXTRACTED_CHARS):
+        self.section_chars = section_chars
+        self.max_chars = max_chars
+        self.sections = [Section('other', '', section_chars)]
+        self._by_name = {}
+        self._pending = ''
+        self._item = []
+        self._item_chars = 0
+        self.bytes_read = 0
+        self.chars_read = 0
+        self.truncated = False
+        self.peak_buffered_chars = 0
+
+    @property
+    def full(self):
+        return self.chars_read >= self.max_chars
+
+    def _measure(self):
+        held = len(self._pending) + self._item_chars + sum(section.kept_chars for section in self.sections)
+        self.peak_buffered_chars = max(self.peak_buffered_chars, held)
+
+    def feed(self, text):
+        """
+        Feed the next chunk of text.
+        """
+        if self.full:
+            self.truncated = self.truncated or bool(text)
+            return
+        if self.chars_read + len(text) > self.max_chars:
+            text = text[:self.max_chars - self.chars_read]
+            self.truncated = True
+        self.chars_read += len(text)
+        lines = (self._pending + text).split('\n')
+        self._pending = lines.pop()
+        if len(self._pending) > MAX_LINE_CHARS:
+            lines.append(self._pending)
+            self._pending = ''
+        for line in lines:
+            self.feed_line(line)
+        self._measure()
+
+    def feed_line(self, line, heading=False):
+        """
+        Feed a whole line; `heading` marks it as a section title (e.g. a DOCX heading style).
+        """
+        line = line.rstrip()
+        if not line.strip():
+            self._end_item()
+            return
+        match = _HEADING_RE.match(line) if len(line) <= 80 else None
+        title = match.group(1).strip() if match else None
+        name = _HEADING_NAMES.get(title.lower()) if title else None
+        # Known headings, or short ALL CAPS titles ending with a colon
+        if heading or name or (match and title.isupper() and line.rstrip().endswith(':')):
+            self._start_section(name or 'other', title or line.strip())
+            rest = match.group(2) if match else None
+            if rest:
+                self._add_line(rest)
+            return
+        if _BULLET_RE.match(line):
+            self._end_item()
+        self._add_line(line.strip())
+
+    def _add_line(self, line):
+        self._item.append(line[:MAX_LINE_CHARS])
+        self._item_chars += len(self._item[-1])
+        if self._item_chars > self.section_chars:
+            self._end_item()
+
+    def _end_item(self):
+        if self._item:
+            self.sections[-1].add_item(' '.join(self._item))
+            self._item = []
+            self._item_chars = 0
+
+    def _start_section(self, name, title):
+        self._end_item()
+        # Sections are merged by title, so a repeated heading does not reset its budget
+        key = title.lower()
+        section = self._by_name.get(key)
+        if section is None:
+            section = self._by_name[key] = Section(name, title, self.section_chars)
+        else:
+            self.sections.remove(section)
+        self.sections.append(section)
+
+    def close(self):
+        """
+        Flush the last line and return the ingested input.
+
+        Returns:
+            IngestedInput: The bounded sections and the ingestion counters.
+        """
+        if self._pending:
+            self.feed_line(self._pending)
+            self._pending = ''
+        self._end_item()
+        self._measure()
+        stats = IngestStats(self.bytes_read, self.chars_read, self.truncated, self.peak_buffered_chars)
+        return IngestedInput(self.sections, stats)
+
+
+def _read_limited(stream, max_bytes):
+    # Read a stream in chunks, refusing it as soon as it is larger than max_bytes
+    read = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        read += len(chunk)
+        if read > max_bytes:
+            raise InputTooLarge(f"The upload is larger than {max_bytes // 1024} KiB.")
+        yield chunk
+
+
+def _detect_format(head, filename, content_type):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if head.startswith(b'%PDF') or extension == '.pdf' or content_type == 'application/pdf':
+        return 'pdf'
+    if head.startswith(b'PK') or extension == '.docx':
+        return 'docx'
+    if extension in ('.txt', '.md', '') or (content_type or '').startswith('text/'):
+        return 'text'
+    raise UnsupportedInput(f"Unsupported resume format: {extension or content_type}")
+
+
+def ingest_upload(stream, filename=None, content_type=None, max_bytes=MAX_UPLOAD_BYTES,
+                  section_chars=MAX_SECTION_CHARS, max_chars=MAX_EXTRACTED_CHARS):
+    """
+    Read an uploaded resume (text, PDF or DOCX) as a stream into bounded sections.
+
+    Text is decoded and sectioned chunk by chunk. PDF and DOCX files need random
+    access, so they are spooled (to disk past SPOOL_SIZE) and then read page by
+    page or paragraph by paragraph, stopping once `max_chars` are extracted.
+
+    Args:
+        stream: Binary file object of the upload.
+        filename (str): Name of the uploaded file, for its extension.
+        content_type (str): MIME type sent with the upload.
+
+    Returns:
+        IngestedInput: The bounded sections and the ingestion counters.
+
+    Raises:
+        InputTooLarge: If the upload exceeds `max_bytes`.
+        UnsupportedInput: If the format is not supported or the file cannot be read.
+    """
+    sectioner = ResumeSectioner(section_chars, max_chars)
+    chunks = _read_limited(stream, max_bytes)
+    first = next(chunks, b'')
+    fmt = _detect_format(first, filename, content_type)
+
+    if fmt == 'text':
+        decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+        for chunk in itertools.chain([first], chunks):
+            sectioner.bytes_read += len(chunk)
+            # Past `max_chars` the rest is only counted, so the size limit still applies
+            if not sectioner.full:
+                sectioner.feed(decoder.decode(chunk).replace('\r\n', '\n'))
+            else:
+                sectioner.truncated = True
+        sectioner.feed(decoder.decode(b'', final=True))
+        return sectioner.close()
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        spool.write(first)
+        sectioner.bytes_read += len(first)
+        for chunk in chunks:
+            spool.write(chunk)
+            sectioner.bytes_read += len(chunk)
+        spool.seek(0)
+        try:
+            if fmt == 'pdf':
+                reader = PdfReader(spool)
+                for page in reader.pages[:MAX_PDF_PAGES]:
+                    sectioner.feed((page.extract_text() or '') + '\n')
+                    if sectioner.full:
+                        break
+            else:
+                for paragraph in Document(spool).paragraphs:
+                    style = paragraph.style.name if paragraph.style is not None else ''
+                    # Each paragraph is an item of its own
+                    sectioner.feed_line(paragraph.text, heading=style.startswith('Heading'))
+                    sectioner.feed_line('')
+                    sectioner.chars_read += len(paragraph.text)
+                    if sectioner.full:
+                        sectioner.truncated = True
+                        break
+        except Exception as e:
+            raise UnsupportedInput(f"The {fmt.upper()} file could not be read: {e}") from e
+    return sectioner.close()
+
+
+def _share(budget, sizes):
+    # Split a budget between sizes: the small ones are kept whole, the others get equal parts
+    shares = [0] * len(sizes)
+    left = budget
+    for rank, index in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+        shares[index] = min(sizes[index], max(left, 0) // (len(sizes) - rank))
+        left -= shares[index]
+    return shares
+
+
+def cut_text(text, max_chars):
+    """
+    Cut a text at `max_chars`, at the last line or word break before it, adding no marker.
+    """
+    if text is None or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind('\n'), cut.rfind(' '))
+    return (cut[:end] if end > max_chars // 2 else cut).rstrip()
+
+
+def bound_text(text, max_chars=MAX_FIELD_CHARS):
+    """
+    Bound a text for a prompt: returned as is when short enough, cut when it has
+    no section headings, otherwise sectioned with `max_chars` shared between the
+    sections (the longest are summarized first).
+    """
+    if text is None or len(text) <= max_chars:
+        return text
+    sectioner = ResumeSectioner(section_chars=max_chars)
+    sectioner.feed(text)
+    ingested = sectioner.close()
+    sections = [section for section in ingested.sections if section.items or section.title]
+    if all(not section.title for section in sections):
+        return cut_text(text, max_chars)
+
+    # Room for the items once the titles, line breaks and omission notes are counted
+    overhead = sum(len(section.title) + len(section.items) + 80 for section in sections)
+    budgets = _share(max_chars - overhead, [section.kept_chars + section.omitted_chars for section in sections])
+    for section, budget in zip(sections, budgets):
+        section.limit(budget)
+    return ingested.text(max_chars=max_chars)
+
+
+if __name__ == '__main__':
+    # Peak memory vs input size: python -m agents.input_ingestion [--entries 1000 10000 100000]
+    import io
+    import time
+    import argparse
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Peak memory of the ingestion of growing resumes.")
+    parser.add_argument('--entries', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    header = "SUMMARY:\nResearcher in natural language processing.\n\nEDUCATION:\n- PhD in Computer Science\n\nPUBLICATIONS:\n"
+    entry = "- A. Author, B. Author. A study of transformer models for {i}. Proceedings of a conference, 2021.\n"
+    print(f"{'entries':>8} {'input':>10} {'whole text peak':>16} {'streamed peak':>14} {'held chars':>11} {'ms':>7}")
+    for count in args.entries:
+        data = (header + ''.join(entry.format(i=i) for i in range(count))).encode('utf-8')
+
+        source = io.BytesIO(data)
+        tracemalloc.start()
+        text = source.read().decode('utf-8')
+        whole = [line for line in text.split('\n')]
+        _, whole_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del text, whole
+
+        source = io.BytesIO(data)
+        tracemalloc.start()
+        started = time.perf_counter()
+        ingested = ingest_upload(source, 'resume.txt', max_bytes=len(data) + 1, max_chars=len(data) + 1)
+        elapsed = (time.perf_counter() - started) * 1000
+        _, streamed_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # The BytesIO source itself is excluded from both measurements (allocated before tracing)
+        print(f"{count:8d} {len(data) / 1024:8.0f} KiB {whole_peak / 1024:12.0f} KiB {streamed_peak / 1024:10.0f} KiB "
+              f"{ingested.stats.peak_buffered_chars:11d} {elapsed:7.1f}")
@@ -0,0 +1,470 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import closing, contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from crewai import Crew
+from agents.skill_matching import SkillMatching, JobRequirementProfile
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SQLite database of the job posting requirement profiles; empty to disable them
+JOB_PROFILE_DB = os.getenv('JOB_PROFILE_DB', os.path.join(ROOT_DIR, 'data', 'job_profiles.db'))
+# Postings fetched and extracted at the same time, overall and per site
+JOB_INGEST_CONCURRENCY = int(os.getenv('JOB_INGEST_CONCURRENCY', 4))
+JOB_INGEST_PER_HOST = int(os.getenv('JOB_INGEST_PER_HOST', 2))
+# A profile checked longer ago than this (seconds) is still used, and re-checked in the background
+JOB_PROFILE_REFRESH_AGE = float(os.getenv('JOB_PROFILE_REFRESH_AGE', 24 * 3600))
+# A profile checked longer ago than this (seconds) is no longer used; the researcher runs inline
+JOB_PROFILE_MAX_AGE = float(os.getenv('JOB_PROFILE_MAX_AGE', 7 * 24 * 3600))
+# Queue unknown postings for ingestion when a request uses them, so the next request finds a profile
+JOB_PROFILE_INGEST_ON_MISS = os.getenv('JOB_PROFILE_INGEST_ON_MISS', '1') == '1'
+# Most postings queued or being ingested at once; postings submitted past it are skipped
+JOB_INGEST_MAX_PENDING = int(os.getenv('JOB_INGEST_MAX_PENDING', 100))
+# /job-profiles needs this token in the X-Job-Profile-Token header; empty disables it
+JOB_PROFILE_TOKEN = os.getenv('JOB_PROFILE_TOKEN', '')
+JOB_PROFILE_TOKEN_HEADER = 'X-Job-Profile-Token'
+# Most URLs accepted by one POST /job-profiles
+MAX_URLS_PER_REQUEST = int(os.getenv('JOB_PROFILE_MAX_URLS', 50))
+
+# 'stale': fetch new postings and those not checked for JOB_PROFILE_REFRESH_AGE
+# 'always': fetch every posting; 'never': only fetch postings without a profile
+REFRESH_POLICIES = ('stale', 'always', 'never')
+FETCH_TIMEOUT = 20
+# Longest posting text (characters) given to the extraction task
+MAX_POSTING_CHARS = 20000
+
+# Query parameters that do not change the posting
+# (ref, refid and the like can select the posting on some job boards, so they are kept)
+_TRACKING_PARAM_RE = re.compile(r'^(utm_\w+|gclid|fbclid)$', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_profiles (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    profile TEXT,
+    content_hash TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL,
+    extracted_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS job_profiles_checked ON job_profiles (checked_at);
+"""
+
+
+def normalize_url(url):
+    """
+    Key of a job posting: scheme and host lowercased, fragment and tracking parameters removed.
+    """
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not _TRACKING_PARAM_RE.match(key)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+
+def read_url_list(path):
+    """
+    Read posting URLs from a file, one per line; blank lines and # comments are skipped.
+    """
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Visible text of an HTML page, one line per block element.
+    """
+
+    _SKIPPED = {'script', 'style', 'noscript', 'svg', 'head', 'template'}
+    _BLOCKS = {'p', 'div', 'li', 'br', 'tr', 'section', 'article', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipped = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED:
+            self.skipped += 1
+        elif tag in self._BLOCKS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED and self.skipped:
+            self.skipped -= 1
+        elif tag in self._BLOCKS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skipped:
+            self.parts.append(data)
+
+    def text(self):
+        text = _WHITESPACE_RE.sub(' ', ''.join(self.parts))
+        return _BLANK_LINES_RE.sub('\n', text).strip()
+
+
+def posting_text(html):
+    """
+    Visible text of a job posting page.
+    """
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def extract_requirements(url, text):
+    """
+    Extract the requirement profile of a fetched posting with the job researcher.
+
+    Args:
+        url (str): URL of the posting.
+        text (str): Visible text of the posting.
+
+    Returns:
+        JobRequirementProfile: The normalized profile.
+    """
+    skill_matching = SkillMatching()
+    crew = Crew(
+        agents=[skill_matching.researcher],
+        tasks=[skill_matching._create_requirement_extraction_task()],
+        verbose=True
+    )
+    result = crew.kickoff(inputs={'job_posting_url': url, 'job_posting_text': text[:MAX_POSTING_CHARS]})
+    profile = result.pydantic if result.pydantic is not None else JobRequirementProfile.model_validate_json(result.raw)
+    return skill_matching.normalize_requirements(profile)
+
+
+class JobProfileStore:
+    """
+    SQLite store of the job posting requirement profiles, keyed by normalized URL.
+
+    A posting is 'ready' once a profile was extracted (it stays ready when a later
+    refresh fails), 'failed' when no profile could be extracted and 'gone' when the
+    posting was removed. ETag, Last-Modified and a hash of the posting text tell
+    whether a refreshed posting changed.
+    """
+
+    def __init__(self, path=JOB_PROFILE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Closed on exit, not only committed; ingestion threads each open their own
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+
+    def get(self, url):
+        """
+        Stored row of a posting as a dict (profile parsed), or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM job_profiles WHERE url = ?", (normalize_url(url),)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['profile'] = json.loads(entry['profile']) if entry['profile'] else None
+        return entry
+
+    def list(self, status=None):
+        """
+        Rows of every posting (without the profiles), most recently checked first.
+        """
+        query = "SELECT url, status, checked_at, extracted_at, error FROM job_profiles"
+        params = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + " ORDER BY checked_at DESC", params)]
+
+    def due(self, refresh_age=JOB_PROFILE_REFRESH_AGE):
+        """
+        URLs of the postings not checked for `refresh_age` seconds (removed postings excluded).
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT url FROM job_profiles WHERE status != 'gone' AND (checked_at IS NULL OR checked_at < ?)",
+                (time.time() - refresh_age,)
+            ).fetchall()
+        return [row['url'] for row in rows]
+
+    def save_profile(self, url, profile, content_hash, etag=None, last_modified=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_profiles (url, status, profile, content_hash, etag, last_modified, checked_at, extracted_at) "
+                "VALUES (?, 'ready', ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET status = 'ready', profile = excluded.profile, "
+                "content_hash = excluded.content_hash, etag = excluded.etag, last_modified = excluded.last_modified, "
+                "checked_at = excluded.checked_at, extracted_at = excluded.extracted_at, error = NULL",
+                (url, profile.model_dump_json(), content_hash, etag, last_modified, now, now)
+            )
+
+    def mark_checked(self, url, etag=None, last_modified=None):
+        # The posting did not change: the profile is fresh again
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_profiles SET checked_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified), error = NULL WHERE url = ?",
+                (time.time(), etag, last_modified, url)
+            )
+
+    def mark_gone(self, url):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_profiles (url, status, checked_at) VALUES (?, 'gone', ?) "
+                "ON CONFLICT (url) DO UPDATE SET status = 'gone', checked_at = excluded.checked_at",
+                (url, time.time())
+            )
+
+    def mark_failed(self, url, error):
+        # A posting with a profile keeps it; checked_at moves so it is not retried at once
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_profiles (url, status, checked_at, error) VALUES (?, 'failed', ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET checked_at = excluded.checked_at, error = excluded.error, "
+                "status = CASE WHEN job_profiles.profile IS NULL THEN 'failed' ELSE job_profiles.status END",
+                (url, time.time(), str(error))
+            )
+
+
+class JobProfileIngestor:
+    """
+    Fetches job postings and extracts their requirement profiles in the background.
+
+    Postings are processed by a pool of JOB_INGEST_CONCURRENCY threads, at most
+    JOB_INGEST_PER_HOST at a time per site, and a posting is never processed twice
+    at the same time. At most `max_pending` postings (None: no limit) are queued or
+    running; postings submitted past it are skipped. A refreshed posting is re-extracted only when it changed:
+    conditional requests (ETag / Last-Modified) and a hash of its text avoid LLM calls.
+    """
+
+    def __init__(self, store, concurrency=JOB_INGEST_CONCURRENCY, per_host=JOB_INGEST_PER_HOST,
+                 extractor=extract_requirements, max_pending=JOB_INGEST_MAX_PENDING):
+        self.store = store
+        self.extractor = extractor
+        self.per_host = per_host
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job-ingest')
+        # Reentrant: a done callback runs at once, under the lock, when its future is already done
+        self._lock = threading.RLock()
+        self._in_flight = {}
+        self._hosts = {}
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def _needs_fetch(self, entry, refresh, refresh_age):
+        if entry is None or entry['status'] == 'failed':
+            return True
+        if refresh == 'never':
+            return False
+        if refresh == 'always':
+            return True
+        return entry['checked_at'] is None or time.time() - entry['checked_at'] >= refresh_age
+
+    def submit(self, urls, refresh='stale', refresh_age=JOB_PROFILE_REFRESH_AGE):
+        """
+        Queue postings for ingestion.
+
+        Args:
+            urls (iterable): Posting URLs.
+            refresh (str): One of REFRESH_POLICIES, for postings already stored.
+            refresh_age (float): Age (seconds) after which 'stale' postings are fetched again.
+
+        Returns:
+            dict: Normalized URL -> Future of the queued postings (skipped ones, up to date
+                  or past `max_pending`, are left out).
+        """
+        if refresh not in REFRESH_POLICIES:
+            raise ValueError(f"Unknown refresh policy: {refresh}")
+        queued = {}
+        for url in urls:
+            url = normalize_url(url)
+            if url in queued or not self._needs_fetch(self.store.get(url), refresh, refresh_age):
+                continue
+            with self._lock:
+                future = self._in_flight.get(url)
+                if future is None:
+                    if self.max_pending is not None and len(self._in_flight) >= self.max_pending:
+                        continue
+                    future = self._executor.submit(self.ingest, url)
+                    self._in_flight[url] = future
+                    future.add_done_callback(lambda _, url=url: self._done(url))
+            queued[url] = future
+        return queued
+
+    def _done(self, url):
+        with self._lock:
+            self._in_flight.pop(url, None)
+
+    def ingest(self, url):
+        """
+        Fetch a posting and store its profile, re-extracting it only when the posting changed.
+
+        Returns:
+            str: 'extracted', 'unchanged', 'gone' or 'failed'.
+        """
+        url = normalize_url(url)
+        entry = self.store.get(url)
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; job-profile-ingestor)'}
+        if entry and entry['profile']:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            with self._host_slot(url):
+                response = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+            if response.status_code == 304:
+                self.store.mark_checked(url)
+                return 'unchanged'
+            if response.status_code in (404, 410):
+                self.store.mark_gone(url)
+                return 'gone'
+            response.raise_for_status()
+
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            text = posting_text(response.text)
+            if not text:
+                raise ValueError("The posting has no text.")
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if entry and entry['profile'] and entry['content_hash'] == digest:
+                self.store.mark_checked(url, etag, last_modified)
+                return 'unchanged'
+
+            profile = self.extractor(url, text)
+            self.store.save_profile(url, profile, digest, etag, last_modified)
+            return 'extracted'
+        except Exception as e:
+            print(f"Job posting ingestion failed for {url}: {e}")
+            self.store.mark_failed(url, e)
+            return 'failed'
+
+    def ingest_all(self, urls, refresh='stale', refresh_age=JOB_PROFILE_REFRESH_AGE):
+        """
+        Ingest postings and wait for them.
+
+        Returns:
+            dict: Normalized URL -> outcome (see ingest) of the postings fetched.
+        """
+        queued = self.submit(urls, refresh, refresh_age)
+        wait(queued.values())
+        return {url: future.result() for url, future in queued.items()}
+
+    def lookup(self, url, max_age=JOB_PROFILE_MAX_AGE, refresh_age=JOB_PROFILE_REFRESH_AGE,
+               ingest_on_miss=JOB_PROFILE_INGEST_ON_MISS):
+        """
+        Requirement profile of a posting for the request path, or None.
+
+        A stale profile is returned and refreshed in the background; a profile older
+        than `max_age` is not returned. Unknown postings are queued when `ingest_on_miss`.
+
+        Returns:
+            JobRequirementProfile: The profile, or None when there is no usable one.
+        """
+        entry = self.store.get(url)
+        if entry is None:
+            if ingest_on_miss:
+                self.submit([url])
+            return None
+        if entry['status'] != 'ready':
+            return None
+        age = time.time() - (entry['checked_at'] or 0)
+        if age >= refresh_age:
+            self.submit([url], 'stale', refresh_age)
+        if age >= max_age:
+            return None
+        return JobRequirementProfile.model_validate(entry['profile'])
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def create_job_profile_ingestor(path=None):
+    """
+    Create the job posting ingestor and its store, or None when JOB_PROFILE_DB is empty.
+    """
+    path = JOB_PROFILE_DB if path is None else path
+    return JobProfileIngestor(JobProfileStore(path)) if path else None
+
+
+if __name__ == '__main__':
+    # python -m agents.job_profiles ingest urls.txt | refresh | show URL | list
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute job posting requirement profiles.")
+    parser.add_argument('--db', default=JOB_PROFILE_DB)
+    parser.add_argument('--concurrency', type=int, default=JOB_INGEST_CONCURRENCY)
+    parser.add_argument('--per-host', type=int, default=JOB_INGEST_PER_HOST)
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help="Ingest the posting URLs of a file (one per line)")
+    ingest_parser.add_argument('file')
+    ingest_parser.add_argument('--refresh', choices=REFRESH_POLICIES, default='stale')
+    refresh_parser = commands.add_parser('refresh', help="Re-check the postings not checked recently")
+    refresh_parser.add_argument('--age', type=float, default=JOB_PROFILE_REFRESH_AGE, help="Seconds")
+    show_parser = commands.add_parser('show', help="Print the profile of a posting")
+    show_parser.add_argument('url')
+    list_parser = commands.add_parser('list', help="List the stored postings")
+    list_parser.add_argument('--status', choices=('ready', 'failed', 'gone'))
+    args = parser.parse_args()
+
+    store = JobProfileStore(args.db)
+    if args.command in ('ingest', 'refresh'):
+        # Run by an operator: the whole list is queued
+        ingestor = JobProfileIngestor(store, args.concurrency, args.per_host, max_pending=None)
+        started = time.perf_counter()
+        if args.command == 'ingest':
+            outcomes = ingestor.ingest_all(read_url_list(args.file), args.refresh)
+        else:
+            outcomes = ingestor.ingest_all(store.due(args.age), 'always')
+        ingestor.shutdown()
+        for url, outcome in outcomes.items():
+            print(f"{outcome:<10} {url}")
+        print(f"{len(outcomes)} postings fetched in {time.perf_counter() - started:.1f} s")
+    elif args.command == 'show':
+        entry = store.get(args.url)
+        if entry is None or not entry['profile']:
+            parser.exit(1, f"No profile for {args.url}\n")
+        print(JobRequirementProfile.model_validate(entry['profile']).to_markdown())
+    else:
+        for entry in store.list(args.status):
+            checked = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['checked_at'] or 0))
+            print(f"{entry['status']:<7} {checked}  {entry['url']}" + (f"  ({entry['error']})" if entry['error'] else ''))
@@ -0,0 +1,129 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import threading
+import spacy
+
+
+# spaCy model shared by all profiles
+SPACY_MODEL = os.getenv('SPACY_MODEL', 'en_core_web_sm')
+
+# Pipeline profiles: components excluded at load time, and whether a rule-based
+# sentencizer replaces the dependency parser for sentence boundaries.
+NLP_PROFILES = {
+    # Sentence boundaries only, for the structure checks
+    'structure': {
+        'exclude': ['tok2vec', 'tagger', 'parser', 'senter', 'attribute_ruler', 'lemmatizer', 'ner'],
+        'sentencizer': True,
+    },
+    # Every component of the model (POS tags, lemmas, dependency parse, entities)
+    'full': {
+        'exclude': [],
+        'sentencizer': False,
+    },
+}
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def load_nlp(profile='structure'):
+    """
+    Load (once per process) the spaCy pipeline of a profile.
+
+    Args:
+        profile (str): A key of NLP_PROFILES.
+
+    Returns:
+        spacy.Language: The pipeline.
+    """
+    if profile not in NLP_PROFILES:
+        raise ValueError(f"Unknown NLP profile: {profile}")
+    nlp = _pipelines.get(profile)
+    if nlp is None:
+        with _pipelines_lock:
+            nlp = _pipelines.get(profile)
+            if nlp is None:
+                config = NLP_PROFILES[profile]
+                nlp = spacy.load(SPACY_MODEL, exclude=config['exclude'])
+                if config['sentencizer']:
+                    nlp.add_pipe('sentencizer')
+                _pipelines[profile] = nlp
+    return nlp
+
+
+def _resident_memory_kib():
+    """
+    Current resident set size of this process in KiB (Linux), or None.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def report_profile(profile, texts):
+    """
+    Measure startup time, per-document latency and resident memory of a profile.
+
+    Run it in a fresh process for meaningful memory figures.
+
+    Args:
+        profile (str): A key of NLP_PROFILES.
+        texts (list): Documents to process.
+
+    Returns:
+        dict: load_seconds, ms_per_document, rss_kib_before, rss_kib_after and components.
+    """
+    import time
+
+    rss_before = _resident_memory_kib()
+    started = time.perf_counter()
+    nlp = load_nlp(profile)
+    load_seconds = time.perf_counter() - started
+
+    nlp(texts[0])  # Warm-up
+    started = time.perf_counter()
+    for text in texts:
+        nlp(text)
+    per_document = (time.perf_counter() - started) / len(texts)
+
+    return {
+        'profile': profile,
+        'components': nlp.pipe_names,
+        'load_seconds': round(load_seconds, 3),
+        'ms_per_document': round(per_document * 1000, 2),
+        'rss_kib_before': rss_before,
+        'rss_kib_after': _resident_memory_kib(),
+    }
+
+
+if __name__ == '__main__':
+    # Report every profile, each in its own process: python -m agents.nlp_profiles [file]
+    import sys
+    import json
+    import subprocess
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'salima_live.txt')
+    if len(sys.argv) > 2:
+        with open(path, encoding='utf-8') as f:
+            sample = f.read()
+        print(json.dumps(report_profile(sys.argv[2], [sample] * 20)))
+    else:
+        for name in NLP_PROFILES:
+            subprocess.run([sys.executable, '-m', 'agents.nlp_profiles', path, name], check=True)
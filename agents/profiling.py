@@ -0,0 +1,281 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import sys
+import time
+import random
+import secrets
+import threading
+import tracemalloc
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from collections import Counter
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Directory of the profiles (folded stacks and reports)
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(ROOT_DIR, 'data', 'profiles'))
+# A request is profiled when it sends this token in the X-Profile header or the
+# `profile` query parameter; empty disables profiling on demand
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_HEADER = 'X-Profile'
+# Fraction (0 to 1) of the pipeline requests profiled without being asked
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Seconds between two stack samples
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))
+# Frames kept per allocation traceback, and allocation sites listed in the report
+TRACEMALLOC_FRAMES = 8
+TOP_ALLOCATIONS = 25
+
+# Profile of the request being served in this context (copied into worker threads)
+_active = contextvars.ContextVar('request_profile', default=None)
+
+# tracemalloc is process-wide: it runs while at least one profile needs it, and is
+# only stopped by the profiles when they started it (not under python -X tracemalloc)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing_started = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _short_path(filename):
+    # Paths relative to the repository or to site-packages keep the stacks readable
+    if 'site-packages' + os.sep in filename:
+        return filename.rsplit('site-packages' + os.sep, 1)[1]
+    if filename.startswith(ROOT_DIR + os.sep):
+        return os.path.relpath(filename, ROOT_DIR)
+    return os.path.basename(filename)
+
+
+class RequestProfile:
+    """
+    CPU and allocation profile of a single request.
+
+    A sampler thread records the stack of every thread currently inside a profiled
+    section (see profile_section) every PROFILE_INTERVAL seconds. Stacks are
+    prefixed with the section names, so the folded output groups the flamegraph by
+    request, crew kickoff, evaluate_content and its analyzers. tracemalloc
+    snapshots taken at start and stop give the allocation sites that grew.
+
+    Threads are followed when the work runs in a copy of the request context, as
+    run_with_deadline does; threads CrewAI starts on its own are not sampled.
+    tracemalloc is process-wide, so allocations of concurrent requests show too.
+    """
+
+    def __init__(self, label, directory=PROFILE_DIR, interval=PROFILE_INTERVAL):
+        self.label = label
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{secrets.token_hex(3)}"
+        self.directory = directory
+        self.interval = interval
+        self.samples = Counter()
+        self.sections = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._token = None
+        self._root = None
+
+    def start(self):
+        """
+        Start profiling, with the calling thread sampled as section `label` until stop.
+        """
+        _start_tracing()
+        self._baseline = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self._token = _active.set(self)
+        self._root = self.section(self.label)
+        self._root.__enter__()
+        self._sampler.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = [(ident, list(sections)) for ident, sections in self._threads.items()]
+            for ident, sections in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[';'.join([f"[{section}]" for section in sections] + stack)] += 1
+
+    @contextmanager
+    def section(self, name):
+        """
+        Sample the current thread, and time `name`, until the block exits.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.setdefault(ident, []).append(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                sections = self._threads[ident]
+                sections.pop()
+                if not sections:
+                    del self._threads[ident]
+                total, calls = self.sections.get(name, (0.0, 0))
+                self.sections[name] = (total + elapsed, calls + 1)
+
+    def stop(self, title=None):
+        """
+        Stop profiling and write `<name>.folded` (flamegraph.pl / speedscope input)
+        and `<name>.txt` (section timings and top allocations) to the profile directory.
+
+        Must be called from the thread that started the profile.
+
+        Returns:
+            tuple: Paths of the folded stacks and of the report.
+        """
+        self._root.__exit__(None, None, None)
+        self._stop.set()
+        self._sampler.join()
+        wall = time.perf_counter() - self.started
+        _active.reset(self._token)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracing()
+
+        os.makedirs(self.directory, exist_ok=True)
+        folded_path = os.path.join(self.directory, f"{self.name}.folded")
+        with open(folded_path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        report_path = os.path.join(self.directory, f"{self.name}.txt")
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        growth = snapshot.filter_traces(filters).compare_to(self._baseline.filter_traces(filters), 'lineno')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(f"Profile of {title or self.label}: {wall:.2f} s wall, {sum(self.samples.values())} samples "
+                    f"every {self.interval * 1000:.0f} ms, traced memory peak {peak / 2 ** 20:.1f} MiB\n\n")
+            f.write("Sections (total wall time, calls):\n")
+            for name, (total, calls) in sorted(self.sections.items(), key=lambda item: -item[1][0]):
+                f.write(f"  {name:<40} {total:8.3f} s {calls:6d}\n")
+            f.write("\nTop allocations since the request started:\n")
+            for stat in growth[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                f.write(f"  {_short_path(frame.filename)}:{frame.lineno}: {stat.size_diff / 1024:+.1f} KiB "
+                        f"({stat.count_diff:+d} blocks)\n")
+        return folded_path, report_path
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Profile the block as section `name` when the current request is profiled; no-op otherwise.
+    """
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    with profile.section(name):
+        yield
+
+
+def profiled(name):
+    """
+    Decorator running a function as profile section `name`.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile_section(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wants_profile(headers, args, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE):
+    """
+    Whether a request asks to be profiled (with the token) or is picked by sampling.
+
+    Args:
+        headers: Request headers (mapping).
+        args: Query parameters (mapping).
+    """
+    if token and secrets.compare_digest(headers.get(PROFILE_HEADER, '') or args.get('profile', ''), token):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def start_request_profile(label, headers, args):
+    """
+    Start profiling the current request if it wants it (see wants_profile).
+
+    Returns:
+        RequestProfile: The running profile, or None.
+    """
+    if not wants_profile(headers, args):
+        return None
+    return RequestProfile(label).start()
+
+
+def hottest_functions(folded_path, top=20):
+    """
+    Functions with the most samples of their own in a folded stacks file, as
+    (function, self, total) rows.
+    """
+    own, total = Counter(), Counter()
+    with open(folded_path, encoding='utf-8') as f:
+        for line in f:
+            stack, count = line.rstrip('\n').rsplit(' ', 1)
+            frames = stack.split(';')
+            own[frames[-1]] += int(count)
+            for frame in set(frames):
+                total[frame] += int(count)
+    return [(frame, count, total[frame]) for frame, count in own.most_common(top)]
+
+
+if __name__ == '__main__':
+    # Summarize a profile in the terminal: python -m agents.profiling data/profiles/<name>.folded [--top N]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Hottest functions of a folded stacks profile.")
+    parser.add_argument('folded')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = hottest_functions(args.folded, args.top)
+    samples = sum(int(line.rsplit(' ', 1)[1]) for line in open(args.folded, encoding='utf-8'))
+    print(f"{'self':>7} {'total':>7}  function ({samples} samples)")
+    for frame, own, total in rows:
+        print(f"{own / samples:7.1%} {total / samples:7.1%}  {frame}")
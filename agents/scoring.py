@@ -0,0 +1,181 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import json
+from collections import namedtuple
+import numpy as np
+from pydantic import BaseModel
+
+
+# JSON file of a ScoringPolicy replacing the default thresholds and weights
+SCORING_POLICY = os.getenv('SCORING_POLICY', '')
+
+READABILITY_FEATURES = (
+    'flesch_reading_ease', 'flesch_kincaid_grade', 'gunning_fog', 'smog_index',
+    'automated_readability_index', 'coleman_liau_index', 'linsear_write_formula',
+    'dale_chall_readability_score',
+)
+# Columns of a FeatureTable, read from the feedback dicts of evaluate_content
+FEATURES = ('error_count',) + READABILITY_FEATURES + ('polarity', 'subjectivity', 'missing_section_count')
+
+# Recommendation flags, in the order generate_recommendations lists them
+RECOMMENDATIONS = ('grammar', 'readability', 'tone', 'structure')
+
+
+class ScoringPolicy(BaseModel):
+    """
+    Thresholds and weights of the feedback score and recommendations.
+
+    The defaults are the historical rules: 0.5 points per grammar error past the
+    first 2, 0.75 points per Gunning Fog point above 14 (at most 3), 5 points for a
+    polarity below -0.3; simpler language is recommended above grade 12, a
+    friendlier tone below -0.1 polarity.
+    """
+    grammar_free_errors: int = 2
+    grammar_error_penalty: float = 0.5
+    fog_threshold: float = 14
+    fog_penalty: float = 0.75
+    fog_max_penalty: float = 3
+    negative_polarity_threshold: float = -0.3
+    negative_polarity_penalty: float = 5
+    grade_threshold: float = 12
+    negative_tone_threshold: float = -0.1
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.model_validate(json.load(f))
+
+
+DEFAULT_POLICY = ScoringPolicy.load(SCORING_POLICY) if SCORING_POLICY else ScoringPolicy()
+
+# Per-document results of score_table; penalties are in points
+Scores = namedtuple('Scores', ['score', 'grammar_penalty', 'fog_penalty', 'tone_penalty'])
+
+
+class FeatureTable:
+    """
+    Columnar table of the readability, grammar and sentiment metrics of many
+    evaluations: one float64 array per name of FEATURES, one row per document.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.size = len(columns[FEATURES[0]])
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_feedback(cls, feedbacks):
+        """
+        Build the table from feedback dicts (evaluate_content output, or stored JSON).
+
+        Args:
+            feedbacks (iterable): Feedback dicts.
+
+        Returns:
+            FeatureTable: One row per feedback.
+        """
+        rows = []
+        for feedback in feedbacks:
+            readability = feedback['readability']
+            rows.append(
+                (feedback['grammar']['error_count'],)
+                + tuple(readability[name] for name in READABILITY_FEATURES)
+                + (feedback['sentiment']['polarity'], feedback['sentiment']['subjectivity'],
+                   len(feedback['structure']['missing_sections']))
+            )
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES))
+        return cls({name: matrix[:, i] for i, name in enumerate(FEATURES)})
+
+
+def score_table(table, policy=DEFAULT_POLICY):
+    """
+    Feedback scores of every row of a table, in one vectorized pass.
+
+    Returns:
+        Scores: Arrays of the scores (0 to 100) and of each penalty.
+    """
+    errors = table['error_count']
+    grammar_penalty = np.where(errors > policy.grammar_free_errors, errors * policy.grammar_error_penalty, 0.0)
+    fog = table['gunning_fog']
+    fog_penalty = np.where(fog > policy.fog_threshold,
+                           np.minimum((fog - policy.fog_threshold) * policy.fog_penalty, policy.fog_max_penalty), 0.0)
+    tone_penalty = np.where(table['polarity'] < policy.negative_polarity_threshold,
+                            float(policy.negative_polarity_penalty), 0.0)
+    score = np.clip(100.0 - grammar_penalty - fog_penalty - tone_penalty, 0, 100)
+    return Scores(score, grammar_penalty, fog_penalty, tone_penalty)
+
+
+def recommendation_flags(table, policy=DEFAULT_POLICY):
+    """
+    Which recommendations apply to every row of a table.
+
+    Returns:
+        dict: Name of RECOMMENDATIONS -> boolean array.
+    """
+    return {
+        'grammar': table['error_count'] > 0,
+        'readability': table['flesch_kincaid_grade'] > policy.grade_threshold,
+        'tone': table['polarity'] < policy.negative_tone_threshold,
+        'structure': table['missing_section_count'] > 0,
+    }
+
+
+def rescore_history(history, policy=DEFAULT_POLICY):
+    """
+    Re-score every stored evaluation of the history under a policy.
+
+    Returns:
+        tuple: (rows, table, scores, flags); rows are (round id, document, stored score).
+    """
+    rows, feedbacks = [], []
+    for round_id, document, feedback in history.evaluations():
+        rows.append((round_id, document, feedback.get('score')))
+        feedbacks.append(feedback)
+    table = FeatureTable.from_feedback(feedbacks)
+    return rows, table, score_table(table, policy), recommendation_flags(table, policy)
+
+
+if __name__ == '__main__':
+    # What-if re-scoring: python -m agents.scoring [--policy new.json ...] [--db data/history.db]
+    import time
+    import argparse
+    from agents.application_history import ApplicationHistory, HISTORY_DB
+
+    parser = argparse.ArgumentParser(description="Re-score the stored evaluations under scoring policies.")
+    parser.add_argument('--db', default=HISTORY_DB)
+    parser.add_argument('--policy', action='append', default=[], help="ScoringPolicy JSON file (repeatable)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows, table, _, _ = rescore_history(ApplicationHistory(args.db))
+    print(f"Loaded {len(table)} evaluations in {time.perf_counter() - started:.3f} s")
+    if not len(table):
+        raise SystemExit(0)
+    stored = np.array([score if score is not None else np.nan for _, _, score in rows])
+    print(f"{'policy':<24} {'mean':>7} {'<90':>6} {'changed':>8} " + ' '.join(f"{name:>11}" for name in RECOMMENDATIONS)
+          + f" {'ms':>7}")
+    for name, policy in [('default', DEFAULT_POLICY)] + [(path, ScoringPolicy.load(path)) for path in args.policy]:
+        started = time.perf_counter()
+        scores = score_table(table, policy)
+        flags = recommendation_flags(table, policy)
+        elapsed = (time.perf_counter() - started) * 1000
+        changed = np.count_nonzero(~np.isclose(scores.score, stored, equal_nan=False))
+        print(f"{os.path.basename(name):<24} {scores.score.mean():7.2f} {np.mean(scores.score < 90):6.1%} {changed:8d} "
+              + ' '.join(f"{flags[flag].mean():11.1%}" for flag in RECOMMENDATIONS) + f" {elapsed:7.2f}")
@@ -0,0 +1,410 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import threading
+import importlib.util
+import re
+from collections import namedtuple
+from xml.etree import ElementTree
+import numpy as np
+from spacy.strings import hash_string
+
+
+def _default_lexicon_path():
+    # The English subjectivity lexicon shipped with TextBlob (pattern's en-sentiment.xml)
+    spec = importlib.util.find_spec('textblob')
+    if spec is None or not spec.submodule_search_locations:
+        return ''
+    return os.path.join(spec.submodule_search_locations[0], 'en', 'en-sentiment.xml')
+
+
+SENTIMENT_LEXICON_PATH = os.getenv('SENTIMENT_LEXICON_PATH') or _default_lexicon_path()
+
+# Same rules as TextBlob's PatternAnalyzer, so scores keep its scale:
+# polarity in [-1.0, 1.0], subjectivity in [0.0, 1.0].
+# TextBlob also lists "n't", but its tokenizer splits "didn't" into "did n ' t",
+# so the contraction never negates there; spaCy's "n't" token is left out to match.
+NEGATIONS = ('no', 'not', 'never')
+EMOTICONS = {
+    +1.00: ('<3', '♥', '>:D', ':-D', ':D', '=-D', '=D', 'X-D', 'x-D', 'XD', 'xD', '8-D'),
+    +0.75: ('>:P', ':-P', ':P', ':-p', ':p', ':-b', ':b', ':c)', ':o)', ':^)'),
+    +0.50: ('>:)', ':-)', ':)', '=)', '=]', ':]', ':}', ':>', ':3', '8)', '8-)'),
+    +0.25: ('>;]', ';-)', ';)', ';-]', ';]', ';D', ';^)', '*-)', '*)'),
+    +0.05: ('>:o', ':-O', ':O', ':o', ':-o', 'o_O', 'o.O', '°O°', '°o°'),
+    -0.25: ('>:/', ':-/', ':/', ':\\', '>:\\', ':-.', ':-s', ':s', ':S', ':-S', '>.>'),
+    -0.75: ('>:[', ':-(', ':(', '=(', ':-[', ':[', ':{', ':-<', ':c', ':-c', '=/'),
+    -1.00: (":'(", ":'''(", ";'("),
+}
+
+_APOSTROPHE_RE = re.compile("['\u2019]")
+_HYPHEN = hash_string('-')
+_SPACES = np.array([code for code in range(0x3001) if chr(code).isspace()], dtype=np.uint32)
+# Emoticons as written, and the lowercase hash of every piece spaCy may split them into
+_EMOTICON_FORMS = {emoticon for emoticons in EMOTICONS.values() for emoticon in emoticons}
+_EMOTICON_PREFIXES = {emoticon[:stop] for emoticon in _EMOTICON_FORMS for stop in range(1, len(emoticon) + 1)}
+_EMOTICON_PIECES = np.array(sorted({
+    hash_string(emoticon[start:stop].lower())
+    for emoticon in _EMOTICON_FORMS
+    for start in range(len(emoticon)) for stop in range(start + 1, len(emoticon) + 1)
+}), dtype=np.uint64)
+
+# Sentiment of one document: averages over the assessed words, and the same per sentence
+SentimentScores = namedtuple('SentimentScores', ['polarity', 'subjectivity', 'sentence_polarity', 'sentence_subjectivity'])
+
+
+def _average(values):
+    return [sum(column) / len(column) for column in zip(*values)]
+
+
+def _breaks(word):
+    """
+    Whether a word cancels a pending (negation, modifier) when it is not a lexicon word.
+
+    TextBlob's tokenizer splits words at apostrophes ("n't" -> "n ' t"), so the
+    length rules are applied to those pieces rather than to the spaCy token.
+    """
+    pieces = _APOSTROPHE_RE.split(word)
+    return any(len(piece) > 1 for piece in pieces), any(len(piece) > 2 for piece in pieces)
+
+
+class SentimentLexicon:
+    """
+    The subjectivity lexicon as a hash-indexed array table.
+
+    Every entry (lexicon word, negation, emoticon, "!") is a row of parallel
+    numpy arrays, sorted by the spaCy hash of the word. Documents are looked up
+    with a single np.searchsorted over their token hashes, so the lexicon is
+    parsed once per process and no Python dict is touched per token.
+    """
+
+    def __init__(self, path=SENTIMENT_LEXICON_PATH):
+        """
+        Load the lexicon.
+
+        Args:
+            path (str): pattern-style sentiment XML file.
+        """
+        words = self._read_words(path)
+
+        entries = dict.fromkeys(words)
+        entries.update(dict.fromkeys(NEGATIONS))
+        # TextBlob only checks words with a non-letter for emoticons ("xD" is not one)
+        moods = {emoticon.lower(): polarity for polarity, emoticons in EMOTICONS.items() for emoticon in emoticons
+                 if not emoticon.isalpha()}
+        entries.update(dict.fromkeys(moods))
+        entries['!'] = None
+
+        hashes = np.fromiter((hash_string(word) for word in entries), dtype=np.uint64, count=len(entries))
+        order = np.argsort(hashes)
+        self.words = [list(entries)[row] for row in order]
+        self.hashes = hashes[order]
+        self.index = {word: row for row, word in enumerate(self.words)}
+
+        size = len(self.words)
+        self.polarity = np.zeros(size)
+        self.subjectivity = np.zeros(size)
+        self.intensity = np.ones(size)
+        self.known = np.zeros(size, dtype=bool)
+        self.modifier = np.zeros(size, dtype=bool)
+        self.mood = np.zeros(size, dtype=bool)
+        for row, word in enumerate(self.words):
+            if word in words:
+                senses = words[word]
+                self.polarity[row], self.subjectivity[row], self.intensity[row] = senses[None]
+                self.known[row] = True
+                self.modifier[row] = 'RB' in senses
+            elif word in moods:
+                self.polarity[row] = moods[word]
+                self.subjectivity[row] = 1.0
+                self.mood[row] = True
+        self.negation = np.isin(np.arange(size), [self.index[word] for word in NEGATIONS])
+        self.exclamation = np.arange(size) == self.index['!']
+        # A modifier ending in -ly may carry a negation that follows it ("really not good")
+        self.ly_modifier = np.array([word.endswith('ly') for word in self.words])
+        # Words that end a pending negation / modifier when they are not lexicon words
+        breaks = np.array([_breaks(word) for word in self.words], dtype=bool).reshape(size, 2)
+        self.breaks_negation = breaks[:, 0]
+        self.breaks_modifier = breaks[:, 1]
+
+    @staticmethod
+    def _read_words(path):
+        """
+        Read {word: {pos: (polarity, subjectivity, intensity)}}, senses averaged per
+        part of speech, None holding the average over all of them.
+        """
+        senses = {}
+        for element in ElementTree.parse(path).getroot().findall('word'):
+            word = element.attrib.get('form')
+            if word:
+                senses.setdefault(word, {}).setdefault(element.attrib.get('pos'), []).append((
+                    float(element.attrib.get('polarity', 0.0)),
+                    float(element.attrib.get('subjectivity', 0.0)),
+                    float(element.attrib.get('intensity', 1.0)),
+                ))
+
+        words = {}
+        for word, by_pos in senses.items():
+            words[word] = {pos: _average(values) for pos, values in by_pos.items()}
+            words[word][None] = _average(words[word].values())
+
+        # Adverbs derived from adjectives ("terrible" -> "terribly"), as TextBlob does
+        for word, by_pos in list(words.items()):
+            if 'JJ' in by_pos:
+                if word.endswith('y'):
+                    word = word[:-1] + 'i'
+                if word.endswith('le'):
+                    word = word[:-2]
+                adverb = words.setdefault(word + 'ly', {})
+                adverb['RB'] = adverb[None] = by_pos['JJ']
+        return words
+
+    def rows(self, token_hashes):
+        """
+        Row of each token in the table, -1 for tokens outside it.
+
+        Args:
+            token_hashes (np.ndarray): spaCy hashes (uint64) of lowercase tokens.
+        """
+        positions = np.searchsorted(self.hashes, token_hashes)
+        positions[positions == len(self.hashes)] = 0
+        return np.where(self.hashes[positions] == token_hashes, positions, -1)
+
+    def score_document(self, doc):
+        """
+        Score the polarity and subjectivity of an analyzed document.
+
+        Args:
+            doc (AnalyzedDocument): Document analyzed with a spaCy pipeline.
+
+        Returns:
+            SentimentScores: Document averages and per-sentence averages (numpy arrays).
+        """
+        if doc.lower is None:
+            raise ValueError("The document was analyzed without a spaCy pipeline.")
+        n_sentences = len(doc.sent_starts)
+        if len(doc.lower) == 0:
+            return SentimentScores(0.0, 0.0, np.zeros(n_sentences), np.zeros(n_sentences))
+
+        tokens, token_positions, joined = self._tokens(doc)
+
+        # One lookup per distinct token; the table is then indexed with the inverse mapping
+        unique, inverse = np.unique(tokens, return_inverse=True)
+        unique_rows = self.rows(unique)
+        outside = unique_rows < 0
+        strings = doc.vocab.strings
+        unique_breaks_negation = np.zeros(len(unique), dtype=bool)
+        unique_breaks_modifier = np.zeros(len(unique), dtype=bool)
+        for position in np.flatnonzero(outside):
+            word = joined.get(int(unique[position])) or strings[int(unique[position])]
+            unique_breaks_negation[position], unique_breaks_modifier[position] = _breaks(word)
+        rows = unique_rows[inverse]
+
+        # Index of the last word before each position that cancels a pending negation / modifier
+        positions = np.arange(len(rows))
+        last_negation_break = np.maximum.accumulate(np.where(unique_breaks_negation[inverse], positions, -1))
+        last_modifier_break = np.maximum.accumulate(np.where(unique_breaks_modifier[inverse], positions, -1))
+
+        polarity, subjectivity, intensity, negated, starts = self._assess(
+            rows, np.flatnonzero(rows >= 0), last_negation_break, last_modifier_break)
+        if not polarity:
+            return SentimentScores(0.0, 0.0, np.zeros(n_sentences), np.zeros(n_sentences))
+
+        polarity = np.array(polarity)
+        subjectivity = np.array(subjectivity)
+        # "not good" = slightly bad, "not bad" = slightly good
+        polarity = np.where(np.array(negated), polarity * -0.5, polarity)
+
+        sentence = np.searchsorted(doc.sent_starts, token_positions[np.array(starts)], side='right') - 1
+        counts = np.bincount(sentence, minlength=n_sentences)
+        divisor = np.maximum(counts, 1)
+        return SentimentScores(
+            float(polarity.mean()),
+            float(subjectivity.mean()),
+            np.bincount(sentence, weights=polarity, minlength=n_sentences) / divisor,
+            np.bincount(sentence, weights=subjectivity, minlength=n_sentences) / divisor,
+        )
+
+    @staticmethod
+    def _tokens(doc):
+        """
+        The tokens of a document as TextBlob's tokenizer sees them: whitespace
+        tokens dropped ("not \\n great" keeps its negation), and the hyphenated
+        words ("full-time", looked up as a whole like "risk-free") and emoticons
+        (": (") that spaCy splits joined back into one token.
+
+        Returns:
+            tuple: Token hashes, position in the document of each of them, and
+                   {hash: text} of the joined tokens (they are not in the vocab).
+        """
+        text = doc.text
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        positions = np.flatnonzero(~np.isin(codes[doc.idx], _SPACES))
+        lower = doc.lower[positions]
+        starts = doc.idx[positions].astype(np.int64)
+        # A token ends where the next one starts, less the space spaCy keeps as its trailing whitespace
+        following = np.append(doc.idx[1:], len(text)).astype(np.int64)[positions]
+        ends = following - np.isin(codes[following - 1], _SPACES)
+
+        spans = []
+        # Hyphens glued to the tokens on both sides
+        glued = (lower[1:-1] == _HYPHEN) & (starts[2:] == starts[1:-1] + 1) & (ends[:-2] == starts[1:-1])
+        for i in np.flatnonzero(glued) + 1:
+            if spans and spans[-1][1] == i - 1:
+                spans[-1][1] = i + 1  # "state-of-the-art"
+            else:
+                spans.append([i - 1, i + 1])
+        in_word = np.zeros(len(lower), dtype=bool)
+        for first, last in spans:
+            in_word[first:last + 1] = True
+
+        # Emoticons split into several tokens, not across a blank line
+        piece = np.isin(lower, _EMOTICON_PIECES) & ~in_word
+        emoticons = []
+        for i in np.flatnonzero(piece[:-1] & piece[1:]):
+            if emoticons and emoticons[-1][1] >= i:
+                continue
+            # Longest run of tokens spelling an emoticon, as TextBlob's tokenizer joins them
+            written, found = text[starts[i]:ends[i]], None
+            for last in range(i + 1, min(i + 4, len(lower))):
+                if not piece[last] or '\n\n' in text[ends[last - 1]:starts[last]]:
+                    break
+                written += text[starts[last]:ends[last]]
+                if written not in _EMOTICON_PREFIXES:
+                    break
+                if written in _EMOTICON_FORMS:
+                    found = last
+            if found is not None:
+                emoticons.append([i, found])
+
+        spans += emoticons
+        if not spans:
+            return lower, positions, {}
+        lower = lower.copy()
+        keep = np.ones(len(lower), dtype=bool)
+        joined = {}
+        for first, last in spans:
+            word = ''.join(text[starts[j]:ends[j]] for j in range(first, last + 1)).lower()
+            lower[first] = hash_string(word)
+            joined[int(lower[first])] = word
+            keep[first + 1:last + 1] = False
+        return lower[keep], positions[keep], joined
+
+    def _assess(self, rows, hits, last_negation_break, last_modifier_break):
+        """
+        Apply the modifier, negation and exclamation rules to the table hits.
+
+        Only tokens found in the table are visited; the effect of the other
+        tokens is read from the precomputed last_*_break positions.
+
+        Returns:
+            tuple: Lists of polarity, subjectivity, intensity, negation flag and
+                   token position of each assessment.
+        """
+        polarity, subjectivity, intensity, negated, starts = [], [], [], [], []
+        modifier = negation = -1  # Position of the pending modifier / negation
+        modifier_row = -1
+        for position in hits:
+            row = rows[position]
+            if negation >= 0 and last_negation_break[position - 1] > negation:
+                negation = -1
+            if modifier >= 0 and last_modifier_break[position - 1] > modifier:
+                modifier = -1
+
+            if self.known[row]:
+                if modifier < 0:
+                    # "good"
+                    polarity.append(self.polarity[row])
+                    subjectivity.append(self.subjectivity[row])
+                    intensity.append(self.intensity[row])
+                    negated.append(False)
+                    starts.append(position)
+                else:
+                    # "really good": the modifier intensity scales the word
+                    polarity[-1] = max(-1.0, min(self.polarity[row] * intensity[-1], 1.0))
+                    subjectivity[-1] = max(-1.0, min(self.subjectivity[row] * intensity[-1], 1.0))
+                    intensity[-1] = self.intensity[row]
+                if negation >= 0:
+                    # "not (really) good"
+                    intensity[-1] = 1.0 / intensity[-1]
+                    negated[-1] = True
+                modifier = position if self.modifier[row] else -1
+                modifier_row = row
+                negation = position if self.negation[row] else -1
+                continue
+
+            if self.negation[row]:
+                negation = position
+            elif negation >= 0 and self.breaks_negation[row]:
+                negation = -1
+            if negation >= 0 and modifier >= 0 and self.ly_modifier[modifier_row]:
+                # "really not good"
+                negated[-1] = True
+                negation = -1
+            elif modifier >= 0 and self.breaks_modifier[row]:
+                modifier = -1
+            if self.exclamation[row] and polarity:
+                polarity[-1] = max(-1.0, min(polarity[-1] * 1.25, 1.0))
+            if self.mood[row]:
+                polarity.append(self.polarity[row])
+                subjectivity.append(1.0)
+                intensity.append(1.0)
+                negated.append(False)
+                starts.append(position)
+        return polarity, subjectivity, intensity, negated, starts
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_sentiment_lexicon():
+    """
+    Return the process-wide SentimentLexicon, loading it on first use.
+    """
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = SentimentLexicon()
+    return _lexicon
+
+
+if __name__ == '__main__':
+    # Agreement with TextBlob and time per document: python -m agents.sentiment [file]
+    import sys
+    import time
+    from textblob import TextBlob
+    from agents.analyzed_document import AnalyzedDocument
+    from agents.nlp_profiles import load_nlp
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'salima_live.txt')
+    with open(path, encoding='utf-8') as f:
+        sample = f.read()
+
+    started = time.perf_counter()
+    lexicon = get_sentiment_lexicon()
+    print(f"Lexicon loaded in {(time.perf_counter() - started) * 1000:.0f} ms, {len(lexicon.words)} rows")
+
+    doc = AnalyzedDocument.build(sample, load_nlp('structure'))
+    started = time.perf_counter()
+    scores = lexicon.score_document(doc)
+    elapsed = time.perf_counter() - started
+
+    TextBlob(sample).sentiment  # Warm-up (TextBlob loads its lexicon lazily)
+    started = time.perf_counter()
+    reference = TextBlob(sample).sentiment
+    reference_elapsed = time.perf_counter() - started
+
+    print(f"TextBlob: polarity {reference.polarity:.4f}, subjectivity {reference.subjectivity:.4f}, {reference_elapsed * 1000:.1f} ms")
+    print(f"SentimentLexicon: polarity {scores.polarity:.4f}, subjectivity {scores.subjectivity:.4f}, {elapsed * 1000:.1f} ms")
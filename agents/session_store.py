@@ -0,0 +1,239 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+
+
+# Sessions not touched for this long (seconds) are dropped
+SESSION_TTL = int(os.getenv('SESSION_TTL', 6 * 3600))
+# Maximum number of sessions kept by the in-memory backend
+MAX_SESSIONS = int(os.getenv('SESSION_MAX_COUNT', 1000))
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class SessionStore:
+    """
+    In-memory store of the artifacts produced for a user session.
+
+    Artifacts are JSON-serializable dicts (generated documents, their feedback
+    dicts and scores, skill matching report) kept under a random session id, so
+    later requests only need to send the id back.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def new_session_id():
+        return secrets.token_urlsafe(24)
+
+    @staticmethod
+    def is_valid_id(session_id):
+        return bool(session_id) and bool(_SESSION_ID_RE.match(session_id))
+
+    def create(self, artifacts):
+        """
+        Store artifacts under a new session id.
+
+        Args:
+            artifacts (dict): JSON-serializable artifacts.
+
+        Returns:
+            str: The new session id.
+        """
+        session_id = self.new_session_id()
+        self._save(session_id, dict(artifacts))
+        return session_id
+
+    def get(self, session_id):
+        """
+        Fetch the artifacts of a session.
+
+        Returns:
+            dict: The artifacts, or None if the session is unknown or expired.
+        """
+        if not self.is_valid_id(session_id):
+            return None
+        return self._load(session_id)
+
+    def update(self, session_id, **artifacts):
+        """
+        Merge new artifacts into an existing session.
+
+        Returns:
+            dict: The updated artifacts, or None if the session is unknown or expired.
+        """
+        # Under the store lock, two requests updating a session cannot drop each other's artifacts
+        with self._lock:
+            current = self.get(session_id)
+            if current is None:
+                return None
+            current.update(artifacts)
+            self._save(session_id, current)
+        return current
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _save(self, session_id, artifacts):
+        with self._lock:
+            self._sessions[session_id] = (time.time(), artifacts)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            updated_at, artifacts = entry
+            if time.time() - updated_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            return dict(artifacts)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store persisted in a SQLite database, shared between worker processes.
+    """
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        super().__init__(ttl=ttl)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, artifacts TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A connection of its own per operation, committed (or rolled back) and closed
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            yield conn
+
+    def update(self, session_id, **artifacts):
+        if not self.is_valid_id(session_id):
+            return None
+        with self._connect() as conn:
+            # The write lock is taken before reading, so concurrent updates of a
+            # session, from any worker process, are applied one after the other
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT artifacts FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            current = json.loads(row[0])
+            current.update(artifacts)
+            conn.execute(
+                "UPDATE sessions SET artifacts = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(current), time.time(), session_id)
+            )
+        return current
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _save(self, session_id, artifacts):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, artifacts, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(artifacts), now)
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+
+    def _load(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT artifacts FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class FileSessionStore(SessionStore):
+    """
+    Session store keeping one JSON file per session in a directory.
+    """
+
+    def __init__(self, directory, ttl=SESSION_TTL):
+        super().__init__(ttl=ttl)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def delete(self, session_id):
+        if self.is_valid_id(session_id):
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def _save(self, session_id, artifacts):
+        tmp_path = f"{self._path(session_id)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(artifacts, f)
+        os.replace(tmp_path, self._path(session_id))
+
+    def _load(self, session_id):
+        path = self._path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                self.delete(session_id)
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+def create_session_store(url=None):
+    """
+    Create the session store described by a URL.
+
+    Args:
+        url (str): "memory" (default), "sqlite:///path/to/sessions.db" or
+            "file:///path/to/directory". Defaults to the SESSION_STORE environment variable.
+
+    Returns:
+        SessionStore: The session store.
+    """
+    url = url or os.getenv('SESSION_STORE', 'memory')
+    if url == 'memory':
+        return SessionStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(url[len('sqlite:///'):])
+    if url.startswith('file:///'):
+        return FileSessionStore(url[len('file:///'):])
+    raise ValueError(f"Unsupported session store: {url}")
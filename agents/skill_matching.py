@@ -14,6 +14,96 @@
 # Import necessary libraries
 from crewai import Agent, Task  # Core CrewAI classes
 from crewai_tools import ScrapeWebsiteTool, SerperDevTool  # Tools for scraping and searching
+import re
+from typing import List, Literal
+from pydantic import BaseModel, Field, ValidationError  # Schema validation of the matcher output
+from agents.skill_taxonomy import get_taxonomy, normalize_phrase  # Canonical skill names and aliases
+
+
+# Weight mapping for importance levels
+WEIGHT_MAP = {
+    'LOW': 1,
+    'HIGH': 2,
+    'CRITICAL': 3
+}
+
+# Matches the legacy MATCHING_SKILL_[HIGH] / MISSING_SKILL_[LOW] tags, used to repair reports
+SKILL_TAG_RE = re.compile(r"(MATCHING|MISSING)_SKILL_?\s*\[\s*([A-Z]+)\s*\]")
+
+
+class SkillEntry(BaseModel):
+    """
+    A single skill of the skill matching report.
+    """
+    name: str
+    status: Literal['MATCHING', 'MISSING']
+    importance: Literal['LOW', 'HIGH', 'CRITICAL']
+
+
+class SkillMatchingReport(BaseModel):
+    """
+    Structured output of the skill matching task.
+    """
+    skills: List[SkillEntry]
+    suggestions: List[str] = Field(default_factory=list)
+
+    def to_markdown(self):
+        """
+        Render the report as Markdown, for the web page and the content generation prompts.
+        """
+        lines = ["**Matching skills**"]
+        lines += [f"- {s.name} ({s.importance})" for s in self.skills if s.status == 'MATCHING']
+        lines += ["", "**Missing skills**"]
+        lines += [f"- {s.name} ({s.importance})" for s in self.skills if s.status == 'MISSING']
+        if self.suggestions:
+            lines += ["", "**Suggestions**"]
+            lines += [f"- {suggestion}" for suggestion in self.suggestions]
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.to_markdown()
+
+
+class JobRequirement(BaseModel):
+    """
+    A skill required by a job posting.
+    """
+    name: str
+    importance: Literal['LOW', 'HIGH', 'CRITICAL']
+
+
+class JobRequirementProfile(BaseModel):
+    """
+    Requirements extracted from a job posting ahead of time (see agents.job_profiles).
+    """
+    title: str = ''
+    requirements: List[JobRequirement]
+    qualifications: List[str] = Field(default_factory=list)
+    experience: List[str] = Field(default_factory=list)
+
+    def to_markdown(self):
+        """
+        Render the profile as Markdown, for the skill matching prompt.
+        """
+        lines = [f"**{self.title}**", ""] if self.title else []
+        lines += ["**Required skills**"]
+        lines += [f"- {r.name} ({r.importance})" for r in self.requirements]
+        if self.qualifications:
+            lines += ["", "**Qualifications**"]
+            lines += [f"- {q}" for q in self.qualifications]
+        if self.experience:
+            lines += ["", "**Experience**"]
+            lines += [f"- {e}" for e in self.experience]
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.to_markdown()
+
+
+class SkillReportError(ValueError):
+    """
+    Raised when the skill matching output does not follow the report schema.
+    """
 
 
 class SkillMatching:
@@ -25,6 +115,7 @@ class SkillMatching:
     - Creates comprehensive candidate profiles.
     - Matches candidate skills with job requirements.
     - Computes a matching score based on skill relevance.
+    - Normalizes skill names against the skill taxonomy.
     """
 
     def __init__(self):
@@ -35,6 +126,9 @@ class SkillMatching:
         # Initialize scraping tool
         self.scrape_tool = ScrapeWebsiteTool()
 
+        # Skill taxonomy used to normalize skill names
+        self.taxonomy = get_taxonomy()
+
         # Initialize agents
         self.researcher = self._create_researcher_agent()
         self.profiler = self._create_profiler_agent()
@@ -109,63 +203,217 @@ class SkillMatching:
             async_execution=True
         )
 
-    def _create_skill_matching_task(self):
+    def _create_skill_matching_task(self, from_requirement_profile=False):
         """
         Define a task to compare job requirements with a candidate's profile.
+        The output is validated against the SkillMatchingReport schema.
+
+        With `from_requirement_profile`, the job requirements come from a precomputed
+        profile given as the {job_requirements} input instead of the research task.
+        """
+        description = (
+            "Using job requirements and the user's profile, identify matching skills and missing skills. "
+            "For each skill give its common short name (eg: Python, not Python 3 programming), its status "
+            "(MATCHING or MISSING) and its importance for the job (LOW, HIGH, or CRITICAL). "
+            "Also give a few tailored suggestions for the candidate."
+        )
+        if from_requirement_profile:
+            description = "Job requirements of {job_posting_url}:\n{job_requirements}\n\n" + description
+            dependencies = [self._create_profile_task()]
+        else:
+            dependencies = [self._create_research_task(), self._create_profile_task()]
+        return Task(
+            description=description,
+            expected_output=(
+                "A JSON object with a 'skills' list, where each skill has a 'name', a 'status' (MATCHING or MISSING) "
+                "and an 'importance' (LOW, HIGH or CRITICAL), and a 'suggestions' list of strings."
+            ),
+            agent=self.skill_matcher,
+            dependencies=dependencies,
+            output_pydantic=SkillMatchingReport,
+            async_execution=False
+        )
+
+    def _create_requirement_extraction_task(self):
+        """
+        Define a task extracting the requirement profile of an already fetched job posting.
         """
         return Task(
             description=(
-                "Using job requirements and the user's profile, identify matching skills and missing skills. "
-                "Format: MATCHING_SKILL_[importance] or MISSING_SKILL_[importance] (leave the brackets eg: MATCHING_SKILL_[HIGH]) where importance can be LOW, HIGH, or CRITICAL. "
-                "Do not forget the [] brackets around the importance level, They need to be there."
+                "Extract the key skills, qualifications and experiences required by the job posting "
+                "{job_posting_url}, whose text is:\n{job_posting_text}\n"
+                "For each skill give its common short name (eg: Python, not Python 3 programming) and its "
+                "importance for the job (LOW, HIGH, or CRITICAL)."
             ),
             expected_output=(
-                "A detailed report highlighting matched skills, missing skills, and tailored suggestions."
+                "A JSON object with the job 'title', a 'requirements' list where each skill has a 'name' and an "
+                "'importance' (LOW, HIGH or CRITICAL), and 'qualifications' and 'experience' lists of strings."
+            ),
+            agent=self.researcher,
+            output_pydantic=JobRequirementProfile,
+            async_execution=False
+        )
+
+    def _create_report_repair_task(self):
+        """
+        Define a task asking the skill matcher to fix a report that failed schema validation.
+        """
+        return Task(
+            description=(
+                "Your previous skill matching report could not be read: {validation_error}\n"
+                "Previous report:\n{previous_output}\n"
+                "Rewrite the same report, without adding or removing skills, so it follows the requested format exactly."
+            ),
+            expected_output=(
+                "A JSON object with a 'skills' list, where each skill has a 'name', a 'status' (MATCHING or MISSING) "
+                "and an 'importance' (LOW, HIGH or CRITICAL), and a 'suggestions' list of strings."
             ),
             agent=self.skill_matcher,
-            dependencies=[self._create_research_task(), self._create_profile_task()],
+            output_pydantic=SkillMatchingReport,
             async_execution=False
         )
 
-    def compute_score(self, skill_matching_output):
+    def parse_report(self, raw_output):
+        """
+        Validate a raw skill matching output against the report schema.
+
+        The raw JSON is validated in a single pass. If that fails, the output is
+        repaired locally (code fences or prose around the JSON object, legacy
+        MATCHING_SKILL_[importance] lines) before giving up.
+
+        Args:
+            raw_output (str): Raw output of the skill matching task.
+
+        Returns:
+            SkillMatchingReport: The validated report, with normalized skill names.
+
+        Raises:
+            SkillReportError: If the output cannot be turned into a valid report.
+        """
+        try:
+            return self.normalize_report(SkillMatchingReport.model_validate_json(raw_output))
+        except ValidationError as e:
+            error = e
+
+        # Repair 1: JSON object wrapped in a code fence or in prose
+        start = raw_output.find('{')
+        end = raw_output.rfind('}')
+        if start != -1 and end > start:
+            try:
+                return self.normalize_report(SkillMatchingReport.model_validate_json(raw_output[start:end + 1]))
+            except ValidationError as e:
+                error = e
+
+        # Repair 2: legacy line format
+        skills = []
+        for line in raw_output.split('\n'):
+            tag = SKILL_TAG_RE.search(line)
+            if tag and tag.group(2) in WEIGHT_MAP:
+                name = (line[:tag.start()] + ' ' + line[tag.end():]).strip(' \t-*:|')
+                skills.append(SkillEntry(name=name, status=tag.group(1), importance=tag.group(2)))
+        if skills:
+            return self.normalize_report(SkillMatchingReport(skills=skills))
+
+        raise SkillReportError(str(error))
+
+    def normalize_report(self, report):
+        """
+        Map skill names to their canonical taxonomy form and merge duplicates.
+
+        "Python 3", "python" and "Python programming" collapse into a single
+        "Python" entry. When a skill is reported several times, the highest
+        importance is kept and a match takes precedence over a gap.
+
+        Args:
+            report (SkillMatchingReport): A validated report.
+
+        Returns:
+            SkillMatchingReport: The normalized report.
+        """
+        merged = {}
+        for entry in report.skills:
+            name = self.taxonomy.normalize(entry.name)
+            if not name:
+                # Unnamed entries are still counted, each on its own
+                name = f"#{len(merged)}"
+            elif name == normalize_phrase(entry.name):
+                # Unknown skill: keep the name as written
+                name = entry.name.strip()
+
+            previous = merged.get(name.lower())
+            if previous is not None:
+                if previous.status == 'MATCHING' and entry.status == 'MISSING':
+                    continue
+                if previous.status == entry.status and WEIGHT_MAP[previous.importance] >= WEIGHT_MAP[entry.importance]:
+                    continue
+            merged[name.lower()] = SkillEntry(name=name, status=entry.status, importance=entry.importance)
+
+        return SkillMatchingReport(skills=list(merged.values()), suggestions=report.suggestions)
+
+    def normalize_requirements(self, profile):
+        """
+        Map required skill names to their canonical taxonomy form and merge
+        duplicates, keeping the highest importance.
+
+        Args:
+            profile (JobRequirementProfile): A validated profile.
+
+        Returns:
+            JobRequirementProfile: The normalized profile.
+        """
+        merged = {}
+        for requirement in profile.requirements:
+            name = self.taxonomy.normalize(requirement.name)
+            if not name:
+                continue
+            if name == normalize_phrase(requirement.name):
+                # Unknown skill: keep the name as written
+                name = requirement.name.strip()
+            previous = merged.get(name.lower())
+            if previous is None or WEIGHT_MAP[requirement.importance] > WEIGHT_MAP[previous.importance]:
+                merged[name.lower()] = JobRequirement(name=name, importance=requirement.importance)
+        return profile.model_copy(update={'requirements': list(merged.values())})
+
+    @staticmethod
+    def matched_skills(report):
+        """
+        Canonical names of the matched skills, most important first.
+
+        Args:
+            report (SkillMatchingReport): A validated report.
+
+        Returns:
+            list: Matched skill names.
+        """
+        matched = [entry for entry in report.skills
+                   if entry.status == 'MATCHING' and not entry.name.startswith('#')]
+        matched.sort(key=lambda entry: -WEIGHT_MAP[entry.importance])
+        return [entry.name for entry in matched]
+
+    @staticmethod
+    def compute_score(report):
         """
         Compute a score based on matching and missing skills.
 
         Args:
-            skill_matching_output (str): Output containing MATCHING_SKILL and MISSING_SKILL entries.
+            report (SkillMatchingReport): A validated report.
 
         Returns:
             float: A score representing the percentage of matched skills.
         """
-        matching_skills = []
-        missing_skills = []
-
-        # Weight mapping for importance levels
-        weight_map = {
-            'LOW': 1,
-            'HIGH': 2,
-            'CRITICAL': 3
-        }
-
-        # Parse each line to identify and extract skill importance
-        for line in skill_matching_output.split('\n'):
-            line = line.strip()
-            if 'MATCHING_SKILL_' in line or 'MISSING_SKILL_' in line:
-                start = line.find('[')
-                end = line.find(']')
-                if start != -1 and end != -1:
-                    importance = line[start + 1:end]
-                    if importance in weight_map:
-                        weight = weight_map[importance]
-                        if 'MATCHING_SKILL_' in line:
-                            matching_skills.append(weight)
-                        elif 'MISSING_SKILL_' in line:
-                            missing_skills.append(weight)
+        matching_weight = 0
+        missing_weight = 0
+
+        for entry in report.skills:
+            if entry.status == 'MATCHING':
+                matching_weight += WEIGHT_MAP[entry.importance]
+            else:
+                missing_weight += WEIGHT_MAP[entry.importance]
 
         # Calculate total and compute score
-        total_weight = sum(matching_skills) + sum(missing_skills)
+        total_weight = matching_weight + missing_weight
         if total_weight == 0:  # Avoid division by zero
             return 0
 
-        score = (sum(matching_skills) / total_weight) * 100
+        score = (matching_weight / total_weight) * 100
         return round(score, 2)
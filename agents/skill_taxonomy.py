@@ -0,0 +1,315 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import numpy as np
+
+
+# Default locations of the taxonomy source and of the compiled on-disk index
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAXONOMY_PATH = os.getenv('SKILL_TAXONOMY_PATH', os.path.join(ROOT_DIR, 'data', 'skill_taxonomy.json'))
+INDEX_DIR = os.getenv('SKILL_INDEX_DIR', os.path.join(ROOT_DIR, 'data', 'skill_index'))
+
+# Size of the hashed character-trigram embeddings used for fuzzy normalization
+EMBEDDING_DIM = 256
+# Minimum cosine similarity for a fuzzy match against a known alias
+FUZZY_THRESHOLD = 0.8
+
+# Tokens keep the characters that matter in skill names (C++, C#, .NET, Node.js)
+_TOKEN_RE = re.compile(r"\.?[A-Za-z0-9][A-Za-z0-9+#]*(?:[.\-][A-Za-z0-9+#]+)*")
+
+
+def tokenize(text):
+    """
+    Split text into skill tokens.
+
+    Args:
+        text (str): Free text.
+
+    Returns:
+        list: (lowercased token, surface token) pairs.
+    """
+    return [(m.group(0).lower(), m.group(0)) for m in _TOKEN_RE.finditer(text)]
+
+
+def normalize_phrase(text):
+    """
+    Canonical lowercase form of a phrase, as used for alias table keys.
+    """
+    return ' '.join(token for token, _ in tokenize(text))
+
+
+class PhraseTrie:
+    """
+    A token-level trie for leftmost-longest phrase extraction.
+
+    Phrases are bounded in length, so scanning a token sequence costs
+    O(len(tokens) * max phrase length), i.e. linear in the text length.
+    """
+
+    _END = '\0'
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, phrase, value):
+        """
+        Register a phrase (a sequence of lowercased tokens) with its value.
+        """
+        node = self.root
+        for token in phrase:
+            node = node.setdefault(token, {})
+        node[self._END] = value
+
+    def scan(self, tokens):
+        """
+        Yield (start, end, value) for each leftmost-longest match in tokens.
+
+        Args:
+            tokens (list): Lowercased tokens.
+        """
+        i = 0
+        n = len(tokens)
+        while i < n:
+            node = self.root
+            match = None
+            j = i
+            while j < n and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if self._END in node:
+                    match = (j, node[self._END])
+            if match is None:
+                i += 1
+                continue
+            end, value = match
+            yield i, end, value
+            i = end
+
+
+def _embed(phrase):
+    """
+    Hashed character-trigram embedding of a normalized phrase (L2-normalized).
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    padded = f"#{phrase}#"
+    for k in range(len(padded) - 2):
+        vector[zlib.crc32(padded[k:k + 3].encode('utf-8')) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class SkillTaxonomy:
+    """
+    Canonical skill names, their aliases and a phrase trie for fast extraction.
+
+    The compiled index lives on disk (alias table as JSON, alias embeddings as a
+    .npy array) and is memory-mapped on load. It is rebuilt automatically when
+    the taxonomy source changes.
+    """
+
+    def __init__(self, skills, categories, case_sensitive, aliases, alias_owners, embeddings):
+        self.skills = skills
+        self.categories = categories
+        self.case_sensitive = case_sensitive
+        self.aliases = aliases
+        self.alias_owners = alias_owners
+        self.embeddings = embeddings
+        self._skill_index = {name: idx for idx, name in enumerate(skills)}
+
+        # Alias table -> token trie; values are (skill index, required surface form or None)
+        self.trie = PhraseTrie()
+        for alias, owner in zip(aliases, alias_owners):
+            owner = int(owner)
+            surface = None
+            if case_sensitive[owner] and alias == normalize_phrase(skills[owner]):
+                surface = tuple(s for _, s in tokenize(skills[owner]))
+            self.trie.add(alias.split(' '), (owner, surface))
+
+    @staticmethod
+    def build_index(source=TAXONOMY_PATH, index_dir=INDEX_DIR):
+        """
+        Compile the taxonomy source into the on-disk index.
+
+        Args:
+            source (str): Path to the taxonomy JSON file.
+            index_dir (str): Directory receiving the compiled index.
+
+        Returns:
+            str: The source hash recorded in the index.
+        """
+        with open(source, 'rb') as f:
+            raw = f.read()
+        source_hash = hashlib.sha256(raw).hexdigest()
+        taxonomy = json.loads(raw)
+
+        skills, categories, case_sensitive = [], [], []
+        aliases, alias_owners = [], []
+        seen = {}
+        for idx, entry in enumerate(taxonomy['skills']):
+            skills.append(entry['name'])
+            categories.append(entry.get('category', ''))
+            case_sensitive.append(bool(entry.get('case_sensitive', False)))
+            for alias in [entry['name']] + entry.get('aliases', []):
+                key = normalize_phrase(alias)
+                if not key:
+                    continue
+                if key in seen:
+                    if seen[key] != idx:
+                        raise ValueError(f"Alias '{alias}' is assigned to both {skills[seen[key]]} and {entry['name']}.")
+                    continue
+                seen[key] = idx
+                aliases.append(key)
+                alias_owners.append(idx)
+
+        embeddings = np.stack([_embed(alias) for alias in aliases]) if aliases else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        os.makedirs(index_dir, exist_ok=True)
+        meta = {
+            'source_hash': source_hash,
+            'skills': skills,
+            'categories': categories,
+            'case_sensitive': case_sensitive,
+            'aliases': aliases,
+            'alias_owners': alias_owners,
+        }
+        # Write to temporary files first so concurrent loaders never see a partial index
+        tmp_meta = os.path.join(index_dir, f'aliases.json.{os.getpid()}.tmp')
+        tmp_emb = os.path.join(index_dir, f'embeddings.{os.getpid()}.tmp.npy')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        np.save(tmp_emb, embeddings.astype(np.float32))
+        os.replace(tmp_emb, os.path.join(index_dir, 'embeddings.npy'))
+        os.replace(tmp_meta, os.path.join(index_dir, 'aliases.json'))
+        return source_hash
+
+    @classmethod
+    def load(cls, source=TAXONOMY_PATH, index_dir=INDEX_DIR):
+        """
+        Load the compiled index, rebuilding it first if it is missing or stale.
+
+        Args:
+            source (str): Path to the taxonomy JSON file.
+            index_dir (str): Directory holding the compiled index.
+
+        Returns:
+            SkillTaxonomy: The loaded taxonomy.
+        """
+        meta_path = os.path.join(index_dir, 'aliases.json')
+        with open(source, 'rb') as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta is None or meta.get('source_hash') != source_hash:
+            cls.build_index(source, index_dir)
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+
+        embeddings = np.load(os.path.join(index_dir, 'embeddings.npy'), mmap_mode='r')
+        return cls(
+            meta['skills'],
+            meta['categories'],
+            meta['case_sensitive'],
+            meta['aliases'],
+            np.asarray(meta['alias_owners'], dtype=np.int32),
+            embeddings
+        )
+
+    def find_all(self, text):
+        """
+        Yield every skill mention in text as (canonical name, start token, end token).
+        """
+        tokens = tokenize(text)
+        lowered = [token for token, _ in tokens]
+        for start, end, (owner, surface) in self.trie.scan(lowered):
+            if surface is not None and tuple(s for _, s in tokens[start:end]) != surface:
+                continue
+            yield self.skills[owner], start, end
+
+    def extract(self, text):
+        """
+        Extract the canonical skills mentioned in text, in order of first mention.
+
+        Args:
+            text (str): Free text (job posting, profile, resume...).
+
+        Returns:
+            list: Unique canonical skill names.
+        """
+        found = {}
+        for name, _, _ in self.find_all(text):
+            found.setdefault(name, None)
+        return list(found)
+
+    def normalize(self, name):
+        """
+        Map a free-text skill name to its canonical form.
+
+        Exact alias matches are resolved through the trie ("Python programming" ->
+        "Python"); unknown names fall back to the nearest alias embedding, and
+        finally to the cleaned-up lowercase text.
+
+        Args:
+            name (str): A skill name as written by the LLM or the user.
+
+        Returns:
+            str: The canonical skill name, or the normalized text if unknown.
+        """
+        key = normalize_phrase(name)
+        if not key:
+            return ''
+
+        mentions = self.extract(name)
+        if len(mentions) == 1:
+            return mentions[0]
+
+        if len(self.aliases) and not mentions:
+            similarities = self.embeddings @ _embed(key)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= FUZZY_THRESHOLD:
+                return self.skills[int(self.alias_owners[best])]
+
+        return key
+
+    def category(self, name):
+        """
+        Category of a canonical skill name, or None if it is not in the taxonomy.
+        """
+        idx = self._skill_index.get(name)
+        return None if idx is None else self.categories[idx]
+
+
+_taxonomy = None
+_taxonomy_lock = threading.Lock()
+
+
+def get_taxonomy():
+    """
+    Return the process-wide SkillTaxonomy, loading it on first use.
+    """
+    global _taxonomy
+    if _taxonomy is None:
+        with _taxonomy_lock:
+            if _taxonomy is None:
+                _taxonomy = SkillTaxonomy.load()
+    return _taxonomy
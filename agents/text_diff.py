@@ -0,0 +1,267 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import re
+from collections import namedtuple
+
+
+# An edit between two token sequences. `op` is 'replace', 'delete' or 'insert';
+# offsets are character offsets into the original and corrected texts.
+EditSpan = namedtuple('EditSpan', ['op', 'orig_start', 'orig_end', 'corr_start', 'corr_end'])
+
+# Same notion of a word as str.split()
+_WORD_RE = re.compile(r'\S+')
+
+# Prefix diffs: words of the original compared past the length of the corrected
+# text, as slack for the words the correction removed (at least PREFIX_MIN_SLACK)
+PREFIX_SLACK = 0.25
+PREFIX_MIN_SLACK = 16
+
+
+def tokenize_with_offsets(text):
+    """
+    Split text on whitespace, keeping the character offsets of each token.
+
+    Returns:
+        tuple: (tokens, starts, ends) lists.
+    """
+    tokens, starts, ends = [], [], []
+    for match in _WORD_RE.finditer(text):
+        tokens.append(match.group(0))
+        starts.append(match.start())
+        ends.append(match.end())
+    return tokens, starts, ends
+
+
+def _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi):
+    """
+    Find the middle snake of the shortest edit script between a[a_lo:a_hi] and b[b_lo:b_hi].
+
+    Runs the forward and reverse searches of Myers' algorithm until they overlap,
+    using O(N + M) memory.
+
+    Returns:
+        tuple: (x0, y0, x1, y1) start and end of the snake, relative to a_lo / b_lo.
+    """
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    reverse = [0] * (2 * offset + 1)
+
+    for d in range((n + m + 1) // 2 + 1):
+        # Forward search: furthest reaching D-paths from the top-left corner
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + reverse[offset + delta - k] >= n:
+                return x0, y0, x, y
+
+        # Reverse search: furthest reaching D-paths from the bottom-right corner
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and reverse[offset + k - 1] < reverse[offset + k + 1]):
+                x = reverse[offset + k + 1]
+            else:
+                x = reverse[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            reverse[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - x0, m - y0
+
+    raise AssertionError("No middle snake found.")
+
+
+def _diff(a, b, a_lo, a_hi, b_lo, b_hi, edits):
+    """
+    Append the (op, a_start, a_end, b_start, b_end) token edits of a[a_lo:a_hi] -> b[b_lo:b_hi].
+    """
+    # Common prefix and suffix are not part of any edit
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        a_lo += 1
+        b_lo += 1
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+
+    if a_lo == a_hi:
+        if b_lo < b_hi:
+            edits.append(('insert', a_lo, a_lo, b_lo, b_hi))
+        return
+    if b_lo == b_hi:
+        edits.append(('delete', a_lo, a_hi, b_lo, b_lo))
+        return
+
+    x0, y0, x1, y1 = _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi)
+    _diff(a, b, a_lo, a_lo + x0, b_lo, b_lo + y0, edits)
+    _diff(a, b, a_lo + x1, a_hi, b_lo + y1, b_hi, edits)
+
+
+def diff_tokens(a, b):
+    """
+    Compute a minimal token-level edit script between two sequences.
+
+    Uses Myers' O((N + M) D) algorithm with the linear-space divide and conquer
+    refinement, so memory stays O(N + M) even on long documents. Adjacent
+    deletions and insertions are merged into 'replace' edits.
+
+    Args:
+        a (list): Original tokens.
+        b (list): Corrected tokens.
+
+    Returns:
+        list: (op, a_start, a_end, b_start, b_end) token index edits, in order.
+    """
+    raw = []
+    _diff(a, b, 0, len(a), 0, len(b), raw)
+
+    merged = []
+    for op, a_start, a_end, b_start, b_end in raw:
+        if merged and merged[-1][2] == a_start and merged[-1][4] == b_start:
+            _, p_a_start, _, p_b_start, _ = merged[-1]
+            merged[-1] = ('replace', p_a_start, a_end, p_b_start, b_end)
+        else:
+            merged.append((op, a_start, a_end, b_start, b_end))
+    return merged
+
+
+def _trim_unseen_tail(edits, a_len, b_len):
+    """
+    Drop the unseen tail of the original from the last edit of a prefix diff.
+
+    The tail shows up in the edit reaching the end of both sequences: a deletion
+    is dropped; a replacement keeps as many original tokens as it has corrected ones.
+    """
+    if not edits:
+        return edits
+    op, a_lo, a_hi, b_lo, b_hi = edits[-1]
+    if a_hi != a_len or b_hi != b_len:
+        return edits
+    if op == 'delete':
+        return edits[:-1]
+    if op == 'replace' and a_hi - a_lo > b_hi - b_lo:
+        return edits[:-1] + [('replace', a_lo, a_lo + (b_hi - b_lo), b_lo, b_hi)]
+    return edits
+
+
+def diff_texts(original, corrected, prefix=False):
+    """
+    Compute the word-level edits turning `original` into `corrected`.
+
+    With `prefix`, `corrected` may cover only the beginning of `original` (e.g. the
+    output of a model whose input or output length is capped). Only the words of
+    the original the correction can cover (its length plus PREFIX_SLACK) are
+    compared, and the uncovered tail is not reported as an edit. The diff then
+    costs O(len(corrected) * D) however long the original is.
+
+    Args:
+        original (str): Original text.
+        corrected (str): Corrected text.
+        prefix (bool): Whether `corrected` may stop before the end of `original`.
+
+    Returns:
+        list: EditSpan edits with character offsets into both texts.
+    """
+    a, a_starts, a_ends = tokenize_with_offsets(original)
+    b, b_starts, b_ends = tokenize_with_offsets(corrected)
+    orig_len = len(original)
+    if prefix:
+        covered = len(b) + max(PREFIX_MIN_SLACK, int(len(b) * PREFIX_SLACK))
+        if covered < len(a):
+            # Insertions at the end of the compared part land before the first word left out
+            orig_len = a_starts[covered]
+            a, a_starts, a_ends = a[:covered], a_starts[:covered], a_ends[:covered]
+
+    def char_range(starts, ends, lo, hi, text_len):
+        if lo < hi:
+            return starts[lo], ends[hi - 1]
+        # Empty range: position just before the next token (or end of text)
+        position = starts[lo] if lo < len(starts) else text_len
+        return position, position
+
+    edits = diff_tokens(a, b)
+    if prefix:
+        edits = _trim_unseen_tail(edits, len(a), len(b))
+
+    spans = []
+    for op, a_lo, a_hi, b_lo, b_hi in edits:
+        orig_start, orig_end = char_range(a_starts, a_ends, a_lo, a_hi, orig_len)
+        corr_start, corr_end = char_range(b_starts, b_ends, b_lo, b_hi, len(corrected))
+        spans.append(EditSpan(op, orig_start, orig_end, corr_start, corr_end))
+    return spans
+
+
+if __name__ == '__main__':
+    # Benchmark on a resume-sized input (~600 words) and a 10x input
+    import random
+    import time
+    import tracemalloc
+
+    random.seed(0)
+    vocabulary = [f"word{i}" for i in range(400)]
+
+    for words in (600, 6000):
+        original = [random.choice(vocabulary) for _ in range(words)]
+        corrected = list(original)
+        for _ in range(words // 20):  # ~5% of the words are edited
+            position = random.randrange(len(corrected))
+            action = random.random()
+            if action < 0.4:
+                corrected[position] = random.choice(vocabulary)
+            elif action < 0.7:
+                del corrected[position]
+            else:
+                corrected.insert(position, random.choice(vocabulary))
+        original_text, corrected_text = ' '.join(original), ' '.join(corrected)
+
+        started = time.perf_counter()
+        spans = diff_texts(original_text, corrected_text)
+        elapsed = time.perf_counter() - started
+
+        # Separate run for memory, tracemalloc slows allocations down a lot
+        tracemalloc.start()
+        diff_texts(original_text, corrected_text)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{words} words: {len(spans)} edit spans in {elapsed * 1000:.1f} ms, peak memory {peak / 1024:.0f} KiB")
+
+    # Truncated correction: the grammar model stops after ~380 words, so the rest of
+    # the original is missing from the corrected text. The full diff walks the whole
+    # missing tail; the prefix diff only compares what the correction covers.
+    for words in (600, 6000):
+        original = [random.choice(vocabulary) for _ in range(words)]
+        corrected = list(original[:380])
+        for _ in range(19):
+            corrected[random.randrange(len(corrected))] = random.choice(vocabulary)
+        original_text, corrected_text = ' '.join(original), ' '.join(corrected) + '.'
+
+        for label, prefix in (('full', False), ('prefix', True)):
+            started = time.perf_counter()
+            spans = diff_texts(original_text, corrected_text, prefix=prefix)
+            elapsed = time.perf_counter() - started
+            longest = max((span.orig_end - span.orig_start for span in spans), default=0)
+            print(f"{words} words, correction cut at 380 ({label} diff): {len(spans)} edit spans in "
+                  f"{elapsed * 1000:.1f} ms, longest span {longest} characters")
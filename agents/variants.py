@@ -0,0 +1,151 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import threading
+from collections import namedtuple
+
+
+# Most variants of each document drafted by one request
+MAX_VARIANTS = int(os.getenv('MAX_VARIANTS', 4))
+# LLM tokens the variants of one request may spend together; 0 for no limit
+VARIANT_TOKEN_BUDGET = int(os.getenv('VARIANT_TOKEN_BUDGET', 60000))
+# Weight of the last generation in the running estimate of the tokens of a variant
+COST_SMOOTHING = 0.3
+
+# What each variant puts forward; the first is the regular generation
+VARIANT_BRIEFS = [
+    None,
+    "keep it concise, favour short sentences and plain words, and lead with measurable achievements.",
+    "put the skills matching the job posting first and mirror the wording of its requirements.",
+    "tell the candidate's career as a story, showing how each role prepared them for this job.",
+    "use a formal, conservative tone suited to large organizations and academia.",
+]
+
+# A drafted document and its evaluation: `variant` indexes VARIANT_BRIEFS
+Candidate = namedtuple('Candidate', ['variant', 'brief', 'output', 'feedback', 'score'])
+
+
+class TokenBudget:
+    """
+    LLM tokens shared by the variants of one request.
+
+    Each variant gets a fixed share of the budget, which its crew checks after
+    every agent step (see run_crew), so the variants together stay within the
+    budget up to one step each. `affordable` caps how many variants are started
+    from what previous variants cost.
+    """
+
+    def __init__(self, limit=VARIANT_TOKEN_BUDGET):
+        self.limit = limit
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def affordable(self, requested, estimate=None):
+        """
+        Variants to start: `requested`, fewer if `estimate` tokens each would not fit (at least one).
+        """
+        if not self.limit or not estimate:
+            return requested
+        return max(1, min(requested, int(self.limit // estimate)))
+
+    def share(self, count):
+        """
+        Tokens each of `count` variants may spend, None for no limit.
+        """
+        if not self.limit:
+            return None
+        return max(1, self.limit // count)
+
+    def charge(self, tokens):
+        """
+        Account for the tokens of a finished variant.
+        """
+        with self._lock:
+            self.spent += tokens
+
+
+_cost_lock = threading.Lock()
+_variant_cost = None
+
+
+def record_variant_cost(tokens):
+    """
+    Update the running estimate of the tokens a variant costs.
+    """
+    global _variant_cost
+    if not tokens:
+        return
+    with _cost_lock:
+        _variant_cost = tokens if _variant_cost is None else (
+            COST_SMOOTHING * tokens + (1 - COST_SMOOTHING) * _variant_cost)
+
+
+def variant_cost_estimate():
+    """
+    Tokens a variant is expected to cost, None before the first one.
+    """
+    return _variant_cost
+
+
+def _usage(usage, field='total_tokens'):
+    if usage is None:
+        return 0
+    if isinstance(usage, dict):
+        return int(usage.get(field, 0) or 0)
+    return int(getattr(usage, field, 0) or 0)
+
+
+def tokens_used(result):
+    """
+    Total LLM tokens of a crew run, from its CrewOutput usage metrics (0 when not reported).
+    """
+    return _usage(getattr(result, 'token_usage', None))
+
+
+def llm_requests(result):
+    """
+    LLM calls a crew run made (agent iterations and tool-use turns included), from its
+    CrewOutput usage metrics (0 when not reported).
+    """
+    return _usage(getattr(result, 'token_usage', None), 'successful_requests')
+
+
+def crew_tokens(crew):
+    """
+    LLM tokens a running crew has spent so far, from its agents' usage counters (0 when not reported).
+    """
+    calculate = getattr(crew, 'calculate_usage_metrics', None)
+    if calculate is None:
+        return 0
+    return _usage(calculate())
+
+
+def rank_candidates(variants, outputs, feedbacks, scores):
+    """
+    Candidates of the drafted variants, best score first (the earlier variant on ties).
+
+    Args:
+        variants (list): Indexes in VARIANT_BRIEFS of the drafts.
+        outputs (list): Task outputs of the drafts.
+        feedbacks (list): Feedback dicts of the drafts.
+        scores (list): Feedback scores of the drafts.
+
+    Returns:
+        list: Candidates, best first.
+    """
+    candidates = [
+        Candidate(variant, VARIANT_BRIEFS[variant], output, feedback, score)
+        for variant, output, feedback, score in zip(variants, outputs, feedbacks, scores)
+    ]
+    return sorted(candidates, key=lambda candidate: (-candidate.score, candidate.variant))
@@ -10,14 +10,33 @@
 # copies or substantial portions of the Software.
 # 
 # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, stream_with_context
 import logging
-from agents.crewai_orchestrator import CrewaiOrchestrator
+from agents.crewai_orchestrator import CrewaiOrchestrator, REFINEMENT_MODE
+from agents.session_store import create_session_store
+from agents.admission_control import AdmissionController
+from agents.application_history import create_history
+from agents.skill_matching import SkillMatchingReport
+from agents.cassette import Cassette, CASSETTE_RECORD_DIR
+from agents.job_profiles import (REFRESH_POLICIES, JOB_PROFILE_TOKEN, JOB_PROFILE_TOKEN_HEADER,
+                                 MAX_URLS_PER_REQUEST)
+from agents.profiling import start_request_profile, PROFILE_HEADER
+from agents.deadlines import CancellationToken, Cancelled, StageTimeout, client_disconnected
+from agents.document_export import DocumentRenderer, ExportDocument, EXPORT_FORMATS, MIMETYPES
+from agents.input_ingestion import (ingest_upload, bound_text, InputTooLarge, UnsupportedInput, MAX_UPLOAD_BYTES,
+                                    MAX_FIELD_CHARS)
 import pdfkit
+import io
 import os
+import time
+import secrets
+import tempfile
+from functools import wraps
 
 # Initialize the Flask application
 app = Flask(__name__)
+# Requests past this size are refused (413) before being read: an upload plus the form fields
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 8 * MAX_FIELD_CHARS + 64 * 1024
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -25,13 +44,88 @@ logger = logging.getLogger(__name__)
 
 # Initialize CrewAI Orchestrator (Custom Orchestrator class handling the logic)
 orchestrator = CrewaiOrchestrator()
+if CASSETTE_RECORD_DIR:
+    # Recorded runs always research the job posting, as their replays do
+    orchestrator.job_profiles = None
+
+# Server-side store of the generated documents, feedback and scores of each session
+session_store = create_session_store()
+
+# Searchable history of every generation and refinement round (None when disabled)
+history = create_history()
+
+# Per-client rate limiting and global concurrency cap for the LLM pipelines
+admission = AdmissionController()
+
+# Reusable PDF / DOCX / HTML / Markdown renderer for the exports
+renderer = DocumentRenderer()
+
+# Documents of a session that can be exported, with their titles
+EXPORTABLE_DOCUMENTS = {'resume': 'Resume', 'cover_letter': 'Cover Letter'}
 
 # URLs for content generation tips
 resume_tips_website = 'https://www.businessnewsdaily.com/3207-resume-writing-tips.html'
 coverLetter_tips_website = 'https://hbr.org/2022/05/how-to-write-a-cover-letter-that-sounds-like-you-and-gets-noticed'
 
 
+def recorded(view):
+    """
+    With CASSETTE_RECORD_DIR set, record the LLM and scraping traffic of each
+    pipeline run to a cassette that `python -m agents.cassette replay` can rerun offline.
+    Only the traffic of the request (and of the crew threads it starts) is recorded.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not CASSETTE_RECORD_DIR or request.method != 'POST':
+            return view(*args, **kwargs)
+        inputs = {
+            'job_posting_url': request.form.get('job_description'),
+            'user_website': request.form.get('user_website'),
+            'user_writeup': request.form.get('user_writeup'),
+            'edu': request.form.get('education'),
+            'work_experience': request.form.get('experience'),
+            'name': request.form.get('name'),
+            'resume_tips_website': resume_tips_website,
+            'coverLetter_tips_website': coverLetter_tips_website,
+        }
+        path = os.path.join(CASSETTE_RECORD_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}.jsonl.gz")
+        with Cassette(path, 'record', inputs=inputs) as cassette:
+            g.cassette = cassette
+            response = view(*args, **kwargs)
+        logger.info(f"Recorded {cassette.calls} HTTP exchanges to {cassette.path}")
+        return response
+    return wrapper
+
+
+@app.before_request
+def start_profile():
+    """
+    Profile the pipeline requests that ask for it (PROFILE_TOKEN in the X-Profile
+    header or `profile` query parameter) or are sampled (PROFILE_SAMPLE_RATE).
+    """
+    if request.method == 'POST' and request.endpoint in ('index', 'refine'):
+        g.profile = start_request_profile(request.endpoint, request.headers, request.args)
+
+
+@app.after_request
+def name_profile(response):
+    profile = g.get('profile')
+    if profile is not None:
+        response.headers[PROFILE_HEADER] = profile.name
+    return response
+
+
+@app.teardown_request
+def stop_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        folded, report = profile.stop(f"{request.method} {request.path}")
+        logger.info(f"Profile written to {folded} and {report}")
+
+
 @app.route('/', methods=['GET', 'POST'])
+@admission.limit
+@recorded
 def index():
     """
     Route: / (root)
@@ -47,54 +141,148 @@ def index():
         - HTML template populated with skill matching results, generated resume, and cover letter.
     """
     if request.method == 'POST':
-        # Extract user inputs from the form
-        user_writeup = request.form['user_writeup']
-        user_website = request.form['user_website']
+        # Extract user inputs from the form, each bounded to MAX_FIELD_CHARS
+        user_writeup = bound_text(request.form.get('user_writeup', ''))
+        user_website = request.form.get('user_website', '')
         job_description = request.form['job_description']
-        education = request.form['education']
+        education = bound_text(request.form.get('education', ''))
         name = request.form['name']
-        experience = request.form['experience']
+        experience = bound_text(request.form.get('experience', ''))
+        # Variants of each document to draft and rank (1: a single generation)
+        variants = request.form.get('variants', 1, type=int)
 
-        # Step 1: Perform Skill Matching
-        logger.info("Performing skill matching...")
-        try:
-            skill_matching_results, sm_score = orchestrator.execute_skill_matching(
-                job_posting_url=job_description,
-                user_website=user_website,
-                user_writeup=user_writeup,
-                edu=education,
-                work_experience=experience
-            )
-        except Exception as e:
-            logger.error(f"Error during skill matching: {e}")
-            return render_template('index.html', skill_matching_results=f"Error: {e}")
+        # An uploaded resume (text, PDF or DOCX) is streamed and sectioned; its sections
+        # fill the inputs left empty in the form
+        upload = request.files.get('resume_file')
+        if upload and upload.filename:
+            try:
+                ingested = ingest_upload(upload.stream, upload.filename, upload.mimetype)
+            except InputTooLarge as e:
+                return jsonify({"error": str(e)}), 413
+            except UnsupportedInput as e:
+                return jsonify({"error": str(e)}), 400
+            logger.info(f"Ingested {upload.filename}: {ingested.stats}")
+            fields = ingested.fields()
+            education = education or fields['edu']
+            experience = experience or fields['work_experience']
+            user_writeup = user_writeup or fields['user_writeup']
+        if not (education and experience and user_writeup):
+            return render_template('index.html', show_form=True,
+                                   notice="Please fill in your education, experience and write-up, "
+                                          "or upload a resume."), 400
+
+        inputs = {
+            'job_posting_url': job_description,
+            'user_website': user_website,
+            'user_writeup': user_writeup,
+            'edu': education,
+            'work_experience': experience,
+            'name': name,
+        }
+        timings = {}
+        # Running crews stop when the client goes away or a stage deadline passes
+        cancellation = CancellationToken(client_disconnected(request.environ))
+
+        # Step 1: Perform Skill Matching, or reuse the report of the same candidate for the same job
+        # A recorded run does its own skill matching, so that its replay has the traffic of every stage
+        warm_start = history.warm_start(inputs) if history and 'cassette' not in g else None
+        started = time.perf_counter()
+        if warm_start:
+            logger.info(f"Reusing the skill matching of generation {warm_start['generation_id']}.")
+            skill_matching_results = SkillMatchingReport.model_validate(warm_start['skill_matching'])
+            sm_score = warm_start['skill_matching_score']
+        else:
+            logger.info("Performing skill matching...")
+            try:
+                skill_matching_results, sm_score = orchestrator.execute_skill_matching(
+                    job_posting_url=job_description,
+                    user_website=user_website,
+                    user_writeup=user_writeup,
+                    edu=education,
+                    work_experience=experience,
+                    cancellation=cancellation
+                )
+            except Cancelled as e:
+                logger.info(f"Skill matching cancelled: {e}")
+                return jsonify({"error": "Request cancelled."}), 499
+            except Exception as e:
+                logger.error(f"Error during skill matching: {e}")
+                return render_template('index.html', skill_matching_results=f"Error: {e}")
+        timings['skill_matching'] = time.perf_counter() - started
 
-        if not skill_matching_results:
-            skill_matching_results = "Skill matching failed or returned no results."
+        if not skill_matching_results.skills:
+            logger.warning("Skill matching returned no skills.")
 
         logger.info("Skill matching completed.")
         
         # Step 2: Generate Resume and Cover Letter
         logger.info("Generating resume and cover letter...")
-        cv, cover = orchestrator.execute_content_generation(skill_matching_results, name, experience, education, resume_tips_website, coverLetter_tips_website)
+        started = time.perf_counter()
+        candidates = None
+        try:
+            if variants > 1:
+                # Drafted concurrently and scored in one batch; the best of each is kept
+                candidates = orchestrator.execute_variant_generation(
+                    skill_matching_results, name, experience, education, resume_tips_website, coverLetter_tips_website,
+                    variants=variants, cancellation=cancellation)
+                cv, cover = candidates[0][0].output, candidates[1][0].output
+            else:
+                cv, cover = orchestrator.execute_content_generation(skill_matching_results, name, experience, education, resume_tips_website, coverLetter_tips_website,
+                                                                    cancellation=cancellation)
+        except StageTimeout as e:
+            # Partial result: the skill matching is still worth returning
+            logger.warning(f"Content generation did not finish: {e}")
+            return render_template(
+                'index.html',
+                skill_matching_results=skill_matching_results.to_markdown(),
+                skill_matching_score=sm_score,
+                notice=f"The resume and cover letter could not be generated ({e}) "
+                       "Here is the skill matching; please try again.",
+                show_form=True
+            )
+        except Cancelled as e:
+            logger.info(f"Content generation cancelled: {e}")
+            return jsonify({"error": "Request cancelled."}), 499
+        timings['content_generation'] = time.perf_counter() - started
         if not cv or not cover:
             return jsonify({"error": "Content generation failed."}), 500
 
-        # Step 3: Calculate Feedback Score
-        _, rsc = orchestrator.calculate_feedback_score(cv, content_type="resume")
-        _, csc = orchestrator.calculate_feedback_score(cover, content_type="cover_letter")
+        # Step 3: Calculate Feedback Score (already done for the variants)
+        if candidates:
+            resumefb, rsc = candidates[0][0].feedback, candidates[0][0].score
+            coverfb, csc = candidates[1][0].feedback, candidates[1][0].score
+        else:
+            started = time.perf_counter()
+            resumefb, rsc = orchestrator.calculate_feedback_score(cv, content_type="resume")
+            coverfb, csc = orchestrator.calculate_feedback_score(cover, content_type="cover_letter")
+            timings['feedback'] = time.perf_counter() - started
+
+        # Keep the artifacts server-side; the page only carries the session id
+        session_id = session_store.create({
+            'resume': cv.raw,
+            'cover_letter': cover.raw,
+            'resume_feedback': resumefb,
+            'cover_feedback': coverfb,
+            'skill_matching': skill_matching_results.model_dump(),
+            'skill_matching_score': sm_score,
+        })
+        if history:
+            history.record_generation(session_id, inputs, skill_matching_results.model_dump(), sm_score,
+                                      cv.raw, cover.raw, resumefb, coverfb, timings)
 
         # Render the results back to the template
         return render_template(
             'index.html',
             resume=cv,
             cover_letter=cover,
-            skill_matching_results=skill_matching_results,
+            skill_matching_results=skill_matching_results.to_markdown(),
             skill_matching_score=sm_score,
             askuserfb=True,
             show_form=False,
             rsc=rsc,
-            csc=csc
+            csc=csc,
+            session_id=session_id,
+            variant_rankings=[('Resume', candidates[0]), ('Cover Letter', candidates[1])] if candidates else None
         )
     
     # On GET request, show an empty form
@@ -102,6 +290,7 @@ def index():
 
 
 @app.route('/refine', methods=['POST', 'GET'])
+@admission.limit
 def refine():
     """
     Route: /refine
@@ -111,21 +300,54 @@ def refine():
     
     Inputs:
         - User feedback
-        - Previously generated resume and cover letter
+        - Session id of the previously generated resume and cover letter
     
     Returns:
         - Updated HTML template with refined resume and cover letter.
     """
-    # Extract feedback and existing content
+    # Extract feedback and fetch the existing content of the session
     user_feedback = request.form['userfb']
-    resume = request.form['resume']
-    cover_letter = request.form['cover_letter']
+    session_id = request.form.get('session_id')
+    artifacts = session_store.get(session_id)
+    if artifacts is None:
+        return jsonify({"error": "Unknown or expired session."}), 404
 
     logger.info("Refining content based on user feedback...")
-    # Refine the content using the orchestrator
-    fb, refined_resume, refined_cover, rsc, csc = orchestrator.execute_feedback_refinement(resume, cover_letter, user_feedback)
+    started = time.perf_counter()
+    # Refine the content using the orchestrator, reusing the feedback of the previous round
+    refine_content = (orchestrator.execute_adaptive_refinement if REFINEMENT_MODE == 'adaptive'
+                      else orchestrator.execute_feedback_refinement)
+    try:
+        fb, refined_resume, refined_cover, resumefb, coverfb = refine_content(
+            artifacts['resume'],
+            artifacts['cover_letter'],
+            user_feedback,
+            resumefb=artifacts.get('resume_feedback'),
+            coverfb=artifacts.get('cover_feedback'),
+            cancellation=CancellationToken(client_disconnected(request.environ))
+        )
+    except StageTimeout as e:
+        # The session keeps its previous documents
+        logger.warning(f"Refinement timed out: {e}")
+        return jsonify({"error": str(e)}), 504
+    except Cancelled as e:
+        logger.info(f"Refinement cancelled: {e}")
+        return jsonify({"error": "Request cancelled."}), 499
     if not fb or not refined_resume or not refined_cover:
         return jsonify({"error": "Refinement failed."}), 500
+    elapsed = time.perf_counter() - started
+
+    session_store.update(
+        session_id,
+        resume=refined_resume.raw,
+        cover_letter=refined_cover.raw,
+        resume_feedback=resumefb,
+        cover_feedback=coverfb,
+        compiled_feedback=fb.raw
+    )
+    if history:
+        history.record_refinement(session_id, user_feedback, fb.raw, refined_resume.raw, refined_cover.raw,
+                                  resumefb, coverfb, {'refinement': elapsed})
 
     return render_template(
         'index.html',
@@ -133,42 +355,143 @@ def refine():
         cover_letter=refined_cover,
         askuserfb=True,
         fb=fb,
-        rsc=rsc,
-        csc=csc
+        rsc=resumefb['score'],
+        csc=coverfb['score'],
+        session_id=session_id
     )
 
 
+@app.route('/job-profiles', methods=['GET', 'POST'])
+def job_profiles():
+    """
+    Route: /job-profiles
+    Methods: GET, POST
+
+    Both methods need the JOB_PROFILE_TOKEN (X-Job-Profile-Token header), checked before
+    anything else. The route is not admitted as a pipeline request: it does no LLM work
+    itself, and ingestion has its own limits (JOB_INGEST_MAX_PENDING).
+
+    - On POST: Queues job postings for background ingestion of their requirement profiles.
+      Each one costs a fetch and an LLM extraction, so at most MAX_URLS_PER_REQUEST URLs
+      are accepted.
+    - On GET: Returns the stored profile and status of a job posting.
+
+    Inputs:
+        - POST: JSON {"urls": [...], "refresh": "stale" | "always" | "never"}, or a
+          plain text body / `urls` form field with one URL per line
+        - GET: url
+
+    Returns:
+        - 403 without the token.
+        - POST: 202 with the queued URLs; 400 for invalid URLs.
+        - GET: The stored entry, or 404 when the posting is unknown.
+    """
+    token = request.headers.get(JOB_PROFILE_TOKEN_HEADER, '')
+    if not JOB_PROFILE_TOKEN or not secrets.compare_digest(token.encode(), JOB_PROFILE_TOKEN.encode()):
+        return jsonify({"error": "Job profiles need the job profile token."}), 403
+
+    ingestor = orchestrator.job_profiles
+    if ingestor is None:
+        return jsonify({"error": "Job profiles are disabled."}), 404
+
+    if request.method == 'GET':
+        entry = ingestor.store.get(request.args.get('url', ''))
+        if entry is None:
+            return jsonify({"error": "Unknown job posting."}), 404
+        return jsonify(entry)
+
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        payload = payload if isinstance(payload, dict) else {}
+        urls, refresh = payload.get('urls'), payload.get('refresh', 'stale')
+    else:
+        text = request.form.get('urls') if request.form else request.get_data(as_text=True)
+        urls, refresh = (text or '').split(), request.args.get('refresh', 'stale')
+    if (not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url.startswith(('http://', 'https://')) for url in urls)
+            or refresh not in REFRESH_POLICIES):
+        return jsonify({"error": "Invalid ingestion request: `urls` must be a list of URLs."}), 400
+    if len(urls) > MAX_URLS_PER_REQUEST:
+        return jsonify({"error": f"At most {MAX_URLS_PER_REQUEST} URLs per request."}), 400
+
+    queued = ingestor.submit(urls, refresh)
+    return jsonify({"queued": list(queued), "skipped": len(urls) - len(queued)}), 202
+
+
 @app.route('/download-pdf', methods=['POST'])
 def download_pdf():
     """
     Route: /download-pdf
     Methods: POST
     
-    - Generates a PDF containing the resume and cover letter provided in the form.
+    - Generates a PDF containing the resume and cover letter of the session.
     
     Inputs:
-        - Resume and cover letter text
+        - Session id of the resume and cover letter
     
     Returns:
         - A downloadable PDF file.
     """
-    # Extract resume and cover letter content from form
-    resume = request.form.get('resume')
-    cover_letter = request.form.get('cover_letter')
+    artifacts = session_store.get(request.form.get('session_id'))
+    if artifacts is None:
+        return jsonify({"error": "Unknown or expired session."}), 404
 
     # Generate HTML content for PDF generation
-    html_content = render_template('pdf_template.html', resume=resume, cover_letter=cover_letter)
+    html_content = render_template(
+        'pdf_template.html',
+        resume_content=artifacts['resume'],
+        cover_letter_content=artifacts['cover_letter']
+    )
 
     # Convert the HTML content to PDF using pdfkit
     pdf = pdfkit.from_string(html_content, False)
 
-    # Save PDF to a temporary file
-    pdf_path = "static/generated_resume_coverletter.pdf"
-    with open(pdf_path, "wb") as f:
-        f.write(pdf)
+    # Send the generated PDF to the user as a download
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True, download_name="Resume_and_Cover_Letter.pdf")
+
+
+@app.route('/export', methods=['POST'])
+def export():
+    """
+    Route: /export
+    Methods: POST
+
+    - Exports the documents of one or more sessions as PDF, DOCX, HTML and/or Markdown.
+
+    Inputs:
+        - session_id: one or more session ids
+        - formats: one or more of pdf, docx, html, md (default pdf)
+        - documents: resume and/or cover_letter (default both)
+
+    Returns:
+        - The file itself for a single document in a single format, otherwise a zip
+          archive streamed while it is being rendered.
+    """
+    session_ids = request.form.getlist('session_id')
+    formats = request.form.getlist('formats') or ['pdf']
+    names = request.form.getlist('documents') or list(EXPORTABLE_DOCUMENTS)
+    if not session_ids or any(fmt not in EXPORT_FORMATS for fmt in formats) \
+            or any(name not in EXPORTABLE_DOCUMENTS for name in names):
+        return jsonify({"error": "Invalid export request."}), 400
+
+    documents = []
+    for session_id in session_ids:
+        artifacts = session_store.get(session_id)
+        if artifacts is None:
+            return jsonify({"error": "Unknown or expired session."}), 404
+        # One folder per session when several are exported together
+        prefix = f"{session_id}/" if len(session_ids) > 1 else ''
+        documents.extend(ExportDocument(prefix + name, EXPORTABLE_DOCUMENTS[name], artifacts[name]) for name in names)
+
+    if len(documents) == 1 and len(formats) == 1:
+        output = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+        renderer.write(documents[0], formats[0], output)
+        output.seek(0)
+        return send_file(output, mimetype=MIMETYPES[formats[0]], as_attachment=True,
+                         download_name=f"{documents[0].name}.{formats[0]}")
 
-    # Send the generated PDF file to the user as a download
-    return send_file(pdf_path, as_attachment=True, download_name="Resume_and_Cover_Letter.pdf")
+    response = Response(stream_with_context(renderer.stream_archive(documents, formats)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="job_application.zip"'
+    return response
 
 
 if __name__ == '__main__':
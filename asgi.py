@@ -0,0 +1,304 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+"""
+ASGI front end of the pipelines, for many pipelines in flight per process:
+
+    hypercorn asgi:app    (or: uvicorn asgi:app)
+
+It serves the JSON API below; the web pages stay on the Flask app (app.py).
+Both can share sessions and history through SESSION_STORE and HISTORY_DB.
+"""
+from quart import Quart, g, request, jsonify
+from functools import wraps
+import asyncio
+import logging
+import math
+import os
+import time
+from agents.crewai_orchestrator import CrewaiOrchestrator, REFINEMENT_MODE
+from agents.async_orchestrator import AsyncCrewaiOrchestrator, ASYNC_CREW_THREADS
+from agents.session_store import create_session_store
+from agents.admission_control import AsyncAdmissionController, AdmissionRejected, TRUST_PROXY
+from agents.application_history import create_history
+from agents.skill_matching import SkillMatchingReport
+from agents.deadlines import StageTimeout
+from agents.profiling import start_request_profile, PROFILE_HEADER
+from agents.input_ingestion import bound_text
+
+# Initialize the Quart application
+app = Quart(__name__)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Blocking orchestrator; its async wrapper is created in the server's event loop (see startup)
+crewai_orchestrator = CrewaiOrchestrator()
+orchestrator = None
+
+session_store = create_session_store()
+history = create_history()
+
+# Pipelines running at once: by default one per crew thread
+admission = AsyncAdmissionController(max_active=int(os.getenv('ASGI_MAX_ACTIVE', ASYNC_CREW_THREADS)))
+
+resume_tips_website = 'https://www.businessnewsdaily.com/3207-resume-writing-tips.html'
+coverLetter_tips_website = 'https://hbr.org/2022/05/how-to-write-a-cover-letter-that-sounds-like-you-and-gets-noticed'
+
+
+@app.before_serving
+async def startup():
+    global orchestrator
+    orchestrator = AsyncCrewaiOrchestrator(crewai_orchestrator)
+
+
+@app.after_serving
+async def shutdown():
+    await orchestrator.aclose()
+
+
+@app.before_request
+async def start_profile():
+    # Same opt-in profiling as the Flask app; the event loop thread is sampled while
+    # the request is served, so concurrent requests show in its stacks too
+    if request.method == 'POST' and request.endpoint in ('generate', 'refine'):
+        g.profile = start_request_profile(request.endpoint, request.headers, request.args)
+
+
+@app.after_request
+async def name_profile(response):
+    profile = g.get('profile')
+    if profile is not None:
+        response.headers[PROFILE_HEADER] = profile.name
+    return response
+
+
+@app.teardown_request
+async def stop_profile(exc):
+    # Teardown also runs when the request task is cancelled (client gone), which
+    # after_request does not: the sampler thread and tracemalloc are always stopped
+    profile = g.pop('profile', None)
+    if profile is not None:
+        folded, report = profile.stop(f"{request.method} {request.path}")
+        logger.info(f"Profile written to {folded} and {report}")
+
+
+def admitted(view):
+    """
+    Admission control of the Flask app (agents.admission_control), without blocking
+    the event loop: queued requests wait for a slot in the loop, not in a thread.
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+            client_id = request.headers['X-Forwarded-For'].split(',')[0].strip()
+        else:
+            client_id = request.remote_addr or 'unknown'
+        try:
+            await admission.acquire(client_id)
+        except AdmissionRejected as e:
+            retry_after = max(1, math.ceil(e.retry_after)) if math.isfinite(e.retry_after) else 3600
+            return jsonify({"error": e.reason, "retry_after": retry_after}), 429, {'Retry-After': str(retry_after)}
+
+        started = time.monotonic()
+        try:
+            return await view(*args, **kwargs)
+        finally:
+            await admission.release(time.monotonic() - started)
+    return wrapper
+
+
+async def _request_data():
+    if request.is_json:
+        return await request.get_json()
+    return await request.form
+
+
+@app.route('/api/generate', methods=['POST'])
+@admitted
+async def generate():
+    """
+    Route: /api/generate
+    Methods: POST
+
+    - Runs skill matching, content generation and feedback scoring, as / does.
+
+    Inputs (JSON or form):
+        - name, education, experience, user_website, user_writeup, job_description
+          (education, experience and user_writeup are bounded to MAX_FIELD_CHARS)
+        - variants (optional): drafts of each document to generate concurrently and rank (default 1)
+
+    Returns:
+        - JSON with the session id, skill matching report and score, documents and scores.
+          With variants, the best drafts are kept and "variants" ranks every draft by score.
+          When content generation times out, the skill matching alone with "partial": true.
+    """
+    data = await _request_data()
+    try:
+        inputs = {
+            'job_posting_url': data['job_description'],
+            'user_website': data.get('user_website', ''),
+            'user_writeup': bound_text(data['user_writeup']),
+            'edu': bound_text(data['education']),
+            'work_experience': bound_text(data['experience']),
+            'name': data['name'],
+        }
+        variants = int(data.get('variants', 1))
+    except KeyError as e:
+        return jsonify({"error": f"Missing field: {e.args[0]}"}), 400
+    except ValueError:
+        return jsonify({"error": "variants must be a number."}), 400
+    timings = {}
+
+    # Step 1: Skill Matching, or the report of the same candidate for the same job
+    # The session store and history are blocking (SQLite), so they are called in threads
+    warm_start = await asyncio.to_thread(history.warm_start, inputs) if history else None
+    started = time.perf_counter()
+    if warm_start:
+        skill_matching_results = SkillMatchingReport.model_validate(warm_start['skill_matching'])
+        sm_score = warm_start['skill_matching_score']
+    else:
+        try:
+            skill_matching_results, sm_score = await orchestrator.execute_skill_matching(
+                inputs['job_posting_url'], inputs['user_website'], inputs['user_writeup'],
+                inputs['edu'], inputs['work_experience'])
+        except Exception as e:
+            logger.error(f"Error during skill matching: {e}")
+            return jsonify({"error": f"Skill matching failed: {e}"}), 504 if isinstance(e, StageTimeout) else 500
+    timings['skill_matching'] = time.perf_counter() - started
+
+    # Step 2: Generate Resume and Cover Letter
+    started = time.perf_counter()
+    candidates = None
+    try:
+        if variants > 1:
+            candidates = await orchestrator.execute_variant_generation(
+                skill_matching_results, inputs['name'], inputs['work_experience'], inputs['edu'],
+                resume_tips_website, coverLetter_tips_website, variants=variants)
+            cv, cover = candidates[0][0].output, candidates[1][0].output
+        else:
+            cv, cover = await orchestrator.execute_content_generation(
+                skill_matching_results, inputs['name'], inputs['work_experience'], inputs['edu'],
+                resume_tips_website, coverLetter_tips_website)
+    except StageTimeout as e:
+        logger.warning(f"Content generation did not finish: {e}")
+        return jsonify({
+            "partial": True,
+            "error": str(e),
+            "skill_matching": skill_matching_results.to_markdown(),
+            "skill_matching_score": sm_score,
+        })
+    timings['content_generation'] = time.perf_counter() - started
+
+    # Step 3: Feedback Scores of both documents, in parallel (already done for the variants)
+    if candidates:
+        (resumefb, rsc), (coverfb, csc) = [(ranking[0].feedback, ranking[0].score) for ranking in candidates]
+    else:
+        started = time.perf_counter()
+        (resumefb, rsc), (coverfb, csc) = await asyncio.gather(
+            orchestrator.calculate_feedback_score(cv, content_type="resume"),
+            orchestrator.calculate_feedback_score(cover, content_type="cover_letter"))
+        timings['feedback'] = time.perf_counter() - started
+
+    session_id = await asyncio.to_thread(session_store.create, {
+        'resume': cv.raw,
+        'cover_letter': cover.raw,
+        'resume_feedback': resumefb,
+        'cover_feedback': coverfb,
+        'skill_matching': skill_matching_results.model_dump(),
+        'skill_matching_score': sm_score,
+    })
+    if history:
+        await asyncio.to_thread(history.record_generation, session_id, inputs, skill_matching_results.model_dump(),
+                                sm_score, cv.raw, cover.raw, resumefb, coverfb, timings)
+
+    response = {
+        "session_id": session_id,
+        "skill_matching": skill_matching_results.to_markdown(),
+        "skill_matching_score": sm_score,
+        "resume": cv.raw,
+        "cover_letter": cover.raw,
+        "resume_score": rsc,
+        "cover_score": csc,
+        "timings": timings,
+    }
+    if candidates:
+        response["variants"] = {
+            document: [{"variant": candidate.variant, "brief": candidate.brief, "score": candidate.score,
+                        "text": candidate.output.raw} for candidate in ranking]
+            for document, ranking in zip(('resume', 'cover_letter'), candidates)
+        }
+    return jsonify(response)
+
+
+@app.route('/api/refine', methods=['POST'])
+@admitted
+async def refine():
+    """
+    Route: /api/refine
+    Methods: POST
+
+    - Refines the documents of a session based on user feedback, as /refine does.
+
+    Inputs (JSON or form):
+        - session_id, userfb
+
+    Returns:
+        - JSON with the feedback report, refined documents and their scores.
+    """
+    data = await _request_data()
+    session_id = data.get('session_id')
+    artifacts = await asyncio.to_thread(session_store.get, session_id)
+    if artifacts is None:
+        return jsonify({"error": "Unknown or expired session."}), 404
+    user_feedback = data.get('userfb', '')
+
+    started = time.perf_counter()
+    refine_content = (orchestrator.execute_adaptive_refinement if REFINEMENT_MODE == 'adaptive'
+                      else orchestrator.execute_feedback_refinement)
+    try:
+        fb, refined_resume, refined_cover, resumefb, coverfb = await refine_content(
+            artifacts['resume'],
+            artifacts['cover_letter'],
+            user_feedback,
+            resumefb=artifacts.get('resume_feedback'),
+            coverfb=artifacts.get('cover_feedback')
+        )
+    except StageTimeout as e:
+        logger.warning(f"Refinement timed out: {e}")
+        return jsonify({"error": str(e)}), 504
+    elapsed = time.perf_counter() - started
+
+    await asyncio.to_thread(
+        session_store.update,
+        session_id,
+        resume=refined_resume.raw,
+        cover_letter=refined_cover.raw,
+        resume_feedback=resumefb,
+        cover_feedback=coverfb,
+        compiled_feedback=fb.raw
+    )
+    if history:
+        await asyncio.to_thread(history.record_refinement, session_id, user_feedback, fb.raw, refined_resume.raw,
+                                refined_cover.raw, resumefb, coverfb, {'refinement': elapsed})
+
+    return jsonify({
+        "feedback": fb.raw,
+        "resume": refined_resume.raw,
+        "cover_letter": refined_cover.raw,
+        "resume_score": resumefb['score'],
+        "cover_score": coverfb['score'],
+    })
+
+
+if __name__ == '__main__':
+    app.run()
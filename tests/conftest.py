@@ -0,0 +1,52 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+import sys
+import types
+import importlib.util
+
+# No background ingestion or history writes from the orchestrators under test
+os.environ.setdefault('JOB_PROFILE_DB', '')
+os.environ.setdefault('HISTORY_DB', '')
+
+
+class FakeComponent:
+    """
+    Stands for a CrewAI Agent, Task or tool: keeps its keyword arguments as attributes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeCrew(FakeComponent):
+    def kickoff(self, inputs=None):
+        raise RuntimeError("Patch Crew in the test to run a crew without crewai.")
+
+
+def _placeholder_module(name, **attributes):
+    # Lets the agents import a heavy dependency that is not installed; tests patch what they run
+    if importlib.util.find_spec(name) is None:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+def _pipeline(*args, **kwargs):
+    raise RuntimeError("transformers is not installed.")
+
+
+_placeholder_module('crewai', Agent=FakeComponent, Task=FakeComponent, Crew=FakeCrew)
+_placeholder_module('crewai_tools', ScrapeWebsiteTool=FakeComponent, SerperDevTool=FakeComponent)
+_placeholder_module('transformers', pipeline=_pipeline)
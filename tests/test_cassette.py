@@ -0,0 +1,71 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from agents.cassette import Cassette, CassetteMiss
+from agents.deadlines import run_with_deadline
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_only_the_run_context_is_recorded(server, tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    background_started, background_done = threading.Event(), threading.Event()
+
+    def background():
+        # A thread started outside the run, e.g. the job posting ingestion
+        background_started.wait()
+        requests.get(f"{server}/background")
+        background_done.set()
+
+    threading.Thread(target=background, daemon=True).start()
+    with Cassette(path, 'record', inputs={}) as cassette:
+        requests.get(f"{server}/request")
+        background_started.set()
+        # Crew threads run in a copy of the run's context
+        run_with_deadline(lambda: requests.get(f"{server}/crew"), 'content_generation')
+        background_done.wait(5)
+    assert cassette.calls == 2
+
+    with Cassette(path, 'replay') as replay:
+        assert requests.get(f"{server}/request").text == '/request'
+        assert requests.get(f"{server}/crew").text == '/crew'
+        with pytest.raises(CassetteMiss):
+            requests.get(f"{server}/background")
+    assert replay.calls == 2
+    # Outside the cassette's context the traffic passes through
+    assert requests.get(f"{server}/background").text == '/background'
@@ -0,0 +1,34 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import pytest
+
+from agents.feedback_refinement import FeedbackRefinement
+
+
+@pytest.mark.parametrize('content, corrected, errors', [
+    ("I has went to the store.", "I have gone to the store.", 2),
+    ("He go to school every days.", "He goes to school every day.", 2),
+    ("This is fine.", "This is fine.", 0),
+    ("We was very very happy", "We were very happy", 2),
+    ("Managed team", "Managed the team", 1),
+])
+def test_error_count_counts_changed_words(content, corrected, errors):
+    feedback = FeedbackRefinement._grammar_feedback(content, corrected)
+    assert feedback['error_count'] == errors
+
+
+def test_adjacent_changes_are_one_edit():
+    feedback = FeedbackRefinement._grammar_feedback("I has went home.", "I have gone home.")
+    assert len(feedback['edits']) == 1
+    assert feedback['error_count'] == 2
@@ -0,0 +1,60 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import pytest
+
+from agents.input_ingestion import MAX_FIELD_CHARS, bound_text, cut_text
+
+ENTRY = "- Led a team of engineers building data pipelines for project {i}, cutting costs by 10%.\n"
+
+
+def entries(count):
+    return ''.join(ENTRY.format(i=i) for i in range(count))
+
+
+def text_of_length(length):
+    text = entries(length // len(ENTRY) + 1)
+    return text[:length]
+
+
+@pytest.mark.parametrize('length', [MAX_FIELD_CHARS - 1, MAX_FIELD_CHARS])
+def test_short_field_is_kept(length):
+    text = text_of_length(length)
+    assert bound_text(text) == text
+
+
+@pytest.mark.parametrize('length', [MAX_FIELD_CHARS + 1, MAX_FIELD_CHARS + 600, MAX_FIELD_CHARS * 3])
+def test_field_without_headings_is_cut(length):
+    text = text_of_length(length)
+    bounded = bound_text(text)
+    assert MAX_FIELD_CHARS - len(ENTRY) <= len(bounded) <= MAX_FIELD_CHARS
+    assert text.startswith(bounded)
+
+
+def test_field_with_headings_shares_the_budget():
+    text = ("EXPERIENCE:\n" + entries(70) + "\nEDUCATION:\n- PhD in Computer Science\n- MSc in Physics\n\n"
+            "SKILLS:\nPython, SQL, Docker\n")
+    bounded = bound_text(text)
+    assert MAX_FIELD_CHARS * 0.9 <= len(bounded) <= MAX_FIELD_CHARS
+    # The short sections are kept whole, the long one is summarized
+    assert "- PhD in Computer Science\n- MSc in Physics" in bounded
+    assert "Python, SQL, Docker" in bounded
+    assert bounded.count("more entries") == 1
+
+
+def test_cut_text_adds_no_marker():
+    text = "word " * 5000
+    cut = cut_text(text, 1000)
+    assert len(cut) <= 1000
+    assert text.startswith(cut)
+    assert cut_text("short", 1000) == "short"
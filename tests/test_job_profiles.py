@@ -0,0 +1,25 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+from agents.job_profiles import normalize_url
+
+
+def test_tracking_parameters_are_removed():
+    assert (normalize_url('HTTPS://Jobs.Example.com/view?id=7&utm_source=x&UTM_campaign=y&gclid=1&fbclid=2#apply')
+            == 'https://jobs.example.com/view?id=7')
+
+
+def test_posting_parameters_are_kept():
+    # Some job boards select the posting with ref or refid
+    assert normalize_url('https://jobs.example.com/view?ref=123') == 'https://jobs.example.com/view?ref=123'
+    assert normalize_url('https://jobs.example.com/view?refid=abc&utm_medium=mail') == 'https://jobs.example.com/view?refid=abc'
@@ -0,0 +1,127 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import agents.content_generation as content_generation
+import agents.crewai_orchestrator as crewai_orchestrator
+import agents.skill_matching as skill_matching
+from agents.skill_matching import SkillMatchingReport
+
+REQUESTS = 32
+
+
+class Agent:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.crew = None
+
+
+class Task:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.output = None
+
+
+class Crew:
+    """
+    Stands for the CrewAI Crew run by run_crew: like CrewAI, it writes its state
+    (the running crew, task outputs) onto the Agent and Task objects it was given,
+    and answers from its kickoff inputs after a random LLM-like delay.
+    """
+
+    lock = threading.Lock()
+    owners = {}
+    shared = []
+
+    def __init__(self, agents, tasks, step_callback=None, **options):
+        self.agents = agents
+        self.tasks = tasks
+        self.step_callback = step_callback
+
+    def kickoff(self, inputs):
+        with Crew.lock:
+            for component in self.agents + self.tasks:
+                owner = Crew.owners.setdefault(id(component), (component, self))[1]
+                if owner is not self:
+                    Crew.shared.append(component)
+        for agent in self.agents:
+            agent.crew = self
+        outputs = []
+        for task in self.tasks:
+            time.sleep(random.uniform(0, 0.005))
+            task.output = SimpleNamespace(raw=self.answer(task, inputs))
+            outputs.append(task.output)
+            if self.step_callback is not None:
+                self.step_callback(SimpleNamespace())
+        # Another crew running on the same objects would have overwritten them
+        for agent in self.agents:
+            assert agent.crew is self
+        for task, output in zip(self.tasks, outputs):
+            assert task.output is output
+
+        if 'user_writeup' in inputs:
+            report = SkillMatchingReport(
+                skills=[{'name': 'Python', 'status': 'MATCHING', 'importance': 'HIGH'}],
+                suggestions=[inputs['user_writeup']])
+            return SimpleNamespace(pydantic=report, raw=report.model_dump_json(), tasks_output=outputs)
+        return SimpleNamespace(pydantic=None, raw=outputs[-1].raw, tasks_output=outputs)
+
+    @staticmethod
+    def answer(task, inputs):
+        if 'skill_matching_output' not in inputs:
+            return task.description
+        # The suggestion of the request's own report must reach its content generation
+        suggestion = inputs['skill_matching_output'].splitlines()[-1]
+        kind = 'Cover letter' if 'cover letter' in task.description.lower() else 'Resume'
+        return f"{kind} of {inputs['name']} {suggestion}"
+
+    def calculate_usage_metrics(self):
+        return {'total_tokens': 0, 'successful_requests': len(self.tasks)}
+
+
+@pytest.fixture
+def crews(monkeypatch):
+    for module in (skill_matching, content_generation):
+        monkeypatch.setattr(module, 'Agent', Agent)
+        monkeypatch.setattr(module, 'Task', Task)
+    monkeypatch.setattr(crewai_orchestrator, 'Crew', Crew)
+    monkeypatch.setattr(Crew, 'owners', {})
+    monkeypatch.setattr(Crew, 'shared', [])
+    return Crew
+
+
+def test_concurrent_requests_do_not_cross_talk(crews):
+    orchestrator = crewai_orchestrator.CrewaiOrchestrator()
+    orchestrator.job_profiles = None
+
+    def request(number):
+        report, _ = orchestrator.execute_skill_matching(
+            f'https://example.com/jobs/{number}', '', f'writeup {number}', 'BSc', f'{number} years')
+        cv, cover = orchestrator.execute_content_generation(report, f'Candidate {number}', f'{number} years', 'BSc', '', '')
+        return report, cv, cover
+
+    with ThreadPoolExecutor(max_workers=REQUESTS) as pool:
+        results = list(pool.map(request, range(REQUESTS)))
+
+    for number, (report, cv, cover) in enumerate(results):
+        assert report.suggestions == [f'writeup {number}']
+        assert cv.raw == f'Resume of Candidate {number} - writeup {number}'
+        assert cover.raw == f'Cover letter of Candidate {number} - writeup {number}'
+    assert crews.shared == []
@@ -0,0 +1,37 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import tracemalloc
+
+from agents.profiling import RequestProfile
+
+
+def profile_once(tmp_path):
+    profile = RequestProfile('test', directory=str(tmp_path)).start()
+    sum(range(1000))
+    return profile.stop()
+
+
+def test_stops_the_tracing_it_started(tmp_path):
+    assert not tracemalloc.is_tracing()
+    profile_once(tmp_path)
+    assert not tracemalloc.is_tracing()
+
+
+def test_keeps_tracing_started_elsewhere(tmp_path):
+    tracemalloc.start()
+    try:
+        profile_once(tmp_path)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,76 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+from types import SimpleNamespace
+
+import pytest
+
+import agents.crewai_orchestrator as crewai_orchestrator
+from conftest import FakeComponent
+
+# LLM calls each refinement task makes in the fake crews (agent iterations)
+CALLS_PER_TASK = 3
+
+
+class Crew:
+    def __init__(self, agents, tasks, step_callback=None, **options):
+        self.tasks = tasks
+
+    def kickoff(self, inputs):
+        outputs = [SimpleNamespace(raw=f"refined {task.description}") for task in self.tasks]
+        usage = {'total_tokens': 100 * len(self.tasks), 'successful_requests': CALLS_PER_TASK * len(self.tasks)}
+        return SimpleNamespace(raw=outputs[-1].raw, tasks_output=outputs, token_usage=usage)
+
+
+class FakeFeedback:
+    """
+    Scores drafts 50 and refined documents 99, so the adaptive refinement stops after one round.
+    """
+
+    def __init__(self):
+        for name in ('feedback_compiling', 'feedback_refinement', 'resume_refiner', 'cover_letter_refiner'):
+            setattr(self, name, FakeComponent())
+        self.feedback_generation_task = FakeComponent(description='feedback')
+
+    def evaluate_content(self, text, content_type):
+        score = 99.0 if text.startswith('refined') else 50.0
+        return {'score': score}, score
+
+    def actionable_points(self, feedback):
+        return []
+
+    def _create_resume_refinement_task(self):
+        return FakeComponent(description='resume')
+
+    def _create_cover_letter_refinement_task(self):
+        return FakeComponent(description='cover letter')
+
+    _create_targeted_resume_refinement_task = _create_resume_refinement_task
+    _create_targeted_cover_letter_refinement_task = _create_cover_letter_refinement_task
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setattr(crewai_orchestrator, 'Crew', Crew)
+    monkeypatch.setattr(crewai_orchestrator, 'FeedbackRefinement', FakeFeedback)
+    return crewai_orchestrator.CrewaiOrchestrator()
+
+
+def test_adaptive_refinement_logs_the_crew_calls(orchestrator, capsys):
+    orchestrator.execute_adaptive_refinement('resume draft', 'cover draft', 'Shorter, please.')
+    assert f"Adaptive refinement: {2 * CALLS_PER_TASK} LLM call(s), 200 tokens in 1 round(s)." in capsys.readouterr().out
+
+
+def test_full_refinement_logs_the_same_measure(orchestrator, capsys):
+    orchestrator.execute_feedback_refinement('resume draft', 'cover draft', 'Shorter, please.')
+    assert f"Feedback refinement: {3 * CALLS_PER_TASK} LLM call(s), 300 tokens." in capsys.readouterr().out
@@ -0,0 +1,65 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+import os
+
+import pytest
+import spacy
+from textblob import TextBlob
+
+from agents.analyzed_document import AnalyzedDocument
+from agents.sentiment import get_sentiment_lexicon
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'salima_live.txt')
+
+TEXTS = [
+    "I didn't like it. I don't hate it.",
+    "It isn't bad at all! Not a good fit :(",
+    "I can't say it wasn't really not great.",
+    "We haven't been very happy, but it's wonderful.",
+    "He won't stop; she wouldn’t say it’s terrible.",
+    "A well-known, risk-free and state-of-the-art tool, not a full-time job.",
+    "The results were not \n great.",
+    "- Built a   great team\n- Not    happy with\n  poor results\n",
+    "I was not\n\n  happy",
+    "URL: (google scholar) is great",
+    "Great work :-)\n\nNot bad",
+    "Python (8) great, XD",
+]
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    # Sentiment only reads tokens and sentences: the English tokenizer is that of the full models
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def sample_text():
+    with open(SAMPLE_PATH, encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('text', TEXTS + [sample_text()])
+def test_matches_textblob(nlp, text):
+    scores = get_sentiment_lexicon().score_document(AnalyzedDocument.build(text, nlp))
+    reference = TextBlob(text).sentiment
+    assert scores.polarity == pytest.approx(reference.polarity, abs=1e-9)
+    assert scores.subjectivity == pytest.approx(reference.subjectivity, abs=1e-9)
+
+
+def test_sentence_scores(nlp):
+    doc = AnalyzedDocument.build("I didn't like it. I don't hate it.", nlp)
+    scores = get_sentiment_lexicon().score_document(doc)
+    assert list(scores.sentence_polarity) == pytest.approx([0.0, -0.8])
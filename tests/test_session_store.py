@@ -0,0 +1,42 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agents.session_store import FileSessionStore, SessionStore, SQLiteSessionStore
+
+UPDATES = 40
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'file'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    if request.param == 'file':
+        return FileSessionStore(str(tmp_path / 'sessions'))
+    return SessionStore()
+
+
+def test_concurrent_updates_are_all_kept(store):
+    session_id = store.create({'resume': 'draft'})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda number: store.update(session_id, **{f'round_{number}': number}), range(UPDATES)))
+    artifacts = store.get(session_id)
+    assert artifacts['resume'] == 'draft'
+    assert all(artifacts[f'round_{number}'] == number for number in range(UPDATES))
+
+
+def test_update_of_unknown_session(store):
+    assert store.update(SessionStore.new_session_id(), resume='draft') is None
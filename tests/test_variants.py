@@ -0,0 +1,91 @@
+# MIT License
+#
+# Copyright (c) 2024 mattc-try (GitHub)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND.
+
+from types import SimpleNamespace
+
+import pytest
+
+import agents.crewai_orchestrator as crewai_orchestrator
+from agents.deadlines import BudgetSpent, StageTimeout
+from agents.skill_matching import SkillMatchingReport
+
+STEPS = 10
+
+
+def crew_spending(tokens_per_step):
+    """
+    A Crew class whose kickoff makes STEPS agent steps of `tokens_per_step(brief)` tokens each.
+    """
+
+    class Crew:
+        def __init__(self, agents, tasks, step_callback=None, **options):
+            self.tasks = tasks
+            self.step_callback = step_callback
+            self.spent = 0
+
+        def calculate_usage_metrics(self):
+            return {'total_tokens': self.spent}
+
+        def kickoff(self, inputs):
+            per_step = tokens_per_step(self.tasks[0].description)
+            for _ in range(STEPS):
+                self.spent += per_step
+                self.step_callback(SimpleNamespace())
+            outputs = [SimpleNamespace(raw=task.description) for task in self.tasks]
+            return SimpleNamespace(token_usage={'total_tokens': self.spent}, tasks_output=outputs)
+
+    return Crew
+
+
+class FakeFeedback:
+    def evaluate_batch(self, texts, content_type):
+        return [{} for _ in texts], [float(len(text)) for text in texts]
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setattr(crewai_orchestrator, 'FeedbackRefinement', FakeFeedback)
+    # Start every requested variant, whatever the previous tests cost
+    monkeypatch.setattr(crewai_orchestrator, 'variant_cost_estimate', lambda: None)
+    return crewai_orchestrator.CrewaiOrchestrator()
+
+
+def generate(orchestrator, token_budget):
+    report = SkillMatchingReport(skills=[{'name': 'Python', 'status': 'MATCHING', 'importance': 'HIGH'}])
+    return orchestrator.execute_variant_generation(report, 'Jane Doe', '5 years', 'BSc', '', '',
+                                                   variants=4, token_budget=token_budget)
+
+
+def test_variant_over_its_share_is_stopped(orchestrator, monkeypatch):
+    # The regular variant spends 10 x 1000 tokens, the others 10 x 3000, over their share of 15000
+    brief = crewai_orchestrator.VARIANT_BRIEFS[1]
+    monkeypatch.setattr(crewai_orchestrator, 'Crew', crew_spending(
+        lambda description: 3000 if any(b and b in description for b in crewai_orchestrator.VARIANT_BRIEFS) else 1000))
+    resumes, covers = generate(orchestrator, 60000)
+    assert [candidate.variant for candidate in resumes] == [0]
+    assert [candidate.variant for candidate in covers] == [0]
+    assert brief not in resumes[0].output.raw
+
+
+def test_every_variant_over_its_share(orchestrator, monkeypatch):
+    monkeypatch.setattr(crewai_orchestrator, 'Crew', crew_spending(lambda description: 3000))
+    with pytest.raises(BudgetSpent) as raised:
+        generate(orchestrator, 60000)
+    # Handled by the routes as a stage that did not finish
+    assert isinstance(raised.value, StageTimeout)
+
+
+def test_no_budget(orchestrator, monkeypatch):
+    monkeypatch.setattr(crewai_orchestrator, 'Crew', crew_spending(lambda description: 3000))
+    resumes, covers = generate(orchestrator, 0)
+    assert sorted(candidate.variant for candidate in resumes) == [0, 1, 2, 3]